@@ -0,0 +1,537 @@
+import os
+import mmap
+import time
+import struct
+import logging
+import threading
+
+import numpy as np
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+class AudioRingBuffer:
+    def __init__(self, capacity_frames, channels=1):
+        """
+        Preallocated circular buffer holding the most recent audio frames
+
+        :param capacity_frames: Number of frames kept
+        :param channels: Number of audio channels
+        """
+        self.capacity = int(capacity_frames)
+        self.channels = int(channels)
+        self._data = np.zeros((self.capacity, self.channels), dtype=np.float32)
+        self._total = 0  # Frames written since the buffer was created
+        self._lock = threading.Lock()
+        self._written = threading.Condition(self._lock)
+
+    @property
+    def total_frames(self):
+        return self._total
+
+    def available_frames(self):
+        return min(self._total, self.capacity)
+
+    def write(self, block):
+        """
+        Append a (frames, channels) block, overwriting the oldest frames
+        """
+        block = np.asarray(block, dtype=np.float32).reshape(-1, self.channels)
+        # Frames that would be overwritten within this same block are skipped but still counted
+        skipped = max(0, len(block) - self.capacity)
+        block = block[skipped:]
+        with self._written:
+            start = (self._total + skipped) % self.capacity
+            first = min(len(block), self.capacity - start)
+            self._data[start:start + first] = block[:first]
+            self._data[:len(block) - first] = block[first:]
+            self._total += skipped + len(block)
+            self._written.notify_all()
+
+    def wait_for(self, total_frames, timeout=None):
+        """
+        Block until at least total_frames have been written since creation
+
+        :return: True if they were, False on timeout
+        """
+        with self._written:
+            return self._written.wait_for(lambda: self._total >= total_frames, timeout)
+
+    def read(self, frames, end_frame=None):
+        """
+        Copy frames ending at end_frame (default: the newest frame)
+
+        :param frames: Number of frames to return
+        :param end_frame: Absolute frame index (as counted by total_frames) the slice ends at
+        :return: float32 array of shape (frames, channels)
+        """
+        with self._lock:
+            end = self._total if end_frame is None else min(int(end_frame), self._total)
+            if frames > self.capacity or end - frames < self._total - self.capacity or end - frames < 0:
+                raise ValueError(
+                    f"Requested {frames} frames ending at {end}, but only frames "
+                    f"{max(0, self._total - self.capacity)}-{self._total} are buffered"
+                )
+            indices = np.arange(end - frames, end) % self.capacity
+            return self._data[indices]
+
+# Shared buffer file layout: a 64-byte header followed by float32 frames.
+# The header is magic, layout version, sample rate, channels, device index
+# (-1: default), writer pid, padding, capacity in frames, frames written so
+# far and the writer's last heartbeat. Only the frame counter and heartbeat
+# change after creation; both are single aligned 8-byte stores. The oldest
+# second (at most a tenth of the buffer) is never read, since the writer may
+# be overwriting it before it advances the counter.
+SHARED_MAGIC = b'BEEMORB1'
+SHARED_HEADER = struct.Struct('<8sIIIiiiQQd')
+SHARED_HEADER_SIZE = 64
+_TOTAL_OFFSET = 40
+_HEARTBEAT_OFFSET = 48
+
+class SharedAudioRingBuffer:
+    def __init__(self, path, mapping, header):
+        """
+        Ring buffer in a memory-mapped file, written by one capture process and
+        read by any number of others. Use create() or attach().
+        """
+        _, _, sample_rate, channels, device, pid, _, capacity, _, _ = header
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.device = None if device < 0 else device
+        self.writer_pid = pid
+        self.capacity = capacity
+        self.guard_frames = min(capacity // 10, sample_rate)
+        self._mmap = mapping
+        # Zero-copy views of the frame counter, heartbeat and samples
+        self._total = np.ndarray((1,), dtype='<u8', buffer=mapping, offset=_TOTAL_OFFSET)
+        self._heartbeat = np.ndarray((1,), dtype='<f8', buffer=mapping, offset=_HEARTBEAT_OFFSET)
+        self.data = np.ndarray((capacity, channels), dtype='<f4', buffer=mapping, offset=SHARED_HEADER_SIZE)
+
+    @classmethod
+    def create(cls, path, capacity_frames, channels, sample_rate, device=None):
+        """
+        Create (or replace) the buffer file and map it for writing
+        """
+        capacity_frames, channels = int(capacity_frames), int(channels)
+        size = SHARED_HEADER_SIZE + capacity_frames * channels * 4
+        header = (SHARED_MAGIC, 1, int(sample_rate), channels, -1 if device is None else int(device),
+                  os.getpid(), 0, capacity_frames, 0, time.time())
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.truncate(size)
+            f.write(SHARED_HEADER.pack(*header))
+        # Replace atomically so readers never map a half-initialized file
+        os.replace(tmp_path, path)
+        with open(path, 'r+b') as f:
+            mapping = mmap.mmap(f.fileno(), size)
+        return cls(path, mapping, header)
+
+    @classmethod
+    def attach(cls, path):
+        """
+        Map an existing buffer file read-only
+
+        :raises FileNotFoundError: if no capture process has created it
+        :raises ValueError: if the file is not a capture buffer
+        """
+        with open(path, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = SHARED_HEADER.unpack_from(mapping)
+        if header[0] != SHARED_MAGIC or len(mapping) < SHARED_HEADER_SIZE + header[7] * header[3] * 4:
+            mapping.close()
+            raise ValueError(f"{path} is not an audio capture buffer")
+        return cls(path, mapping, header)
+
+    @property
+    def total_frames(self):
+        return int(self._total[0])
+
+    @property
+    def heartbeat(self):
+        return float(self._heartbeat[0])
+
+    def available_frames(self):
+        return min(self.total_frames, self.capacity)
+
+    def write(self, block):
+        """
+        Append a (frames, channels) block; only the capture process calls this
+        """
+        block = np.asarray(block, dtype=np.float32).reshape(-1, self.channels)
+        skipped = max(0, len(block) - self.capacity)
+        block = block[skipped:]
+        total = self.total_frames + skipped
+        start = total % self.capacity
+        first = min(len(block), self.capacity - start)
+        self.data[start:start + first] = block[:first]
+        self.data[:len(block) - first] = block[first:]
+        # Publish the samples by advancing the counter last
+        self._total[0] = total + len(block)
+        self._heartbeat[0] = time.time()
+
+    def wait_for(self, total_frames, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.total_frames < total_frames:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def read(self, frames, end_frame=None):
+        """
+        Copy frames ending at end_frame (default: the newest frame)
+
+        The copy is checked against the frame counter afterwards, so a slice
+        the writer overwrote while it was being copied is never returned.
+        """
+        for _ in range(3):
+            total = self.total_frames
+            end = total if end_frame is None else min(int(end_frame), total)
+            oldest = max(0, total - self.capacity + self.guard_frames)
+            if end - frames < oldest or end - frames < 0:
+                raise ValueError(
+                    f"Requested {frames} frames ending at {end}, but only frames "
+                    f"{oldest}-{total} can be read"
+                )
+            samples = self.data[np.arange(end - frames, end) % self.capacity]
+            if end - frames >= self.total_frames - self.capacity + self.guard_frames:
+                return samples
+        raise RuntimeError("Capture buffer was overwritten while reading; requested interval is too close to its end")
+
+    def close(self):
+        self.data = self._total = self._heartbeat = None
+        self._mmap.close()
+
+class _Snapshots:
+    """
+    snapshot() shared by the capture service and the shared buffer client
+    """
+    def snapshot(self, duration, offset=0.0, wait=True, mono=True, fresh=False):
+        """
+        Return recent audio from the buffer
+
+        :param duration: Seconds of audio to return
+        :param offset: Seconds before now the snapshot ends
+        :param wait: If fewer seconds have been captured since start, wait for them
+            instead of raising
+        :param mono: Average the channels into a 1-D array
+        :param fresh: Wait for `duration` seconds captured after this call,
+            like a new recording, instead of returning buffered audio.
+            Successive fresh snapshots never overlap.
+        :return: float32 array of samples, 1-D when mono else (frames, channels)
+        """
+        if not self.running:
+            raise RuntimeError("Audio capture is not running")
+        frames = int(round(duration * self.sample_rate))
+        offset_frames = int(round(offset * self.sample_rate))
+        if frames > self.ring.capacity:
+            raise ValueError(f"Cannot snapshot {duration}s from a {self.ring.capacity / self.sample_rate:.0f}s capture buffer")
+
+        if fresh:
+            end_frame = self.ring.total_frames + frames
+            if not self.ring.wait_for(end_frame, duration + 5):
+                raise RuntimeError("Timed out waiting for captured audio; is the input device delivering data?")
+            samples = self.ring.read(frames, end_frame=end_frame)
+            return samples.mean(axis=1) if mono else samples
+
+        if wait and self.ring.total_frames < frames + offset_frames:
+            # Only just started: wait until enough audio exists
+            timeout = (frames + offset_frames - self.ring.total_frames) / self.sample_rate + 5
+            if not self.ring.wait_for(frames + offset_frames, timeout):
+                raise RuntimeError("Timed out waiting for captured audio; is the input device delivering data?")
+
+        samples = self.ring.read(frames, end_frame=self.ring.total_frames - offset_frames)
+        return samples.mean(axis=1) if mono else samples
+
+class CaptureService(_Snapshots):
+    def __init__(self, device=None, sample_rate=44100, channels=1, buffer_seconds=300, blocksize=1024, shared_path=None):
+        """
+        Keep an input device open and record continuously into a ring buffer
+
+        Views and analysis jobs take snapshots of recent audio instead of
+        opening the device and waiting for a new recording each time.
+
+        :param device: Input device index (None: system default)
+        :param sample_rate: Sampling rate in Hz
+        :param channels: Number of channels captured
+        :param buffer_seconds: Seconds of audio kept in memory
+        :param blocksize: Frames per sounddevice callback
+        :param shared_path: Write the buffer to this memory-mapped file so other
+            processes can read it (see SharedCaptureClient)
+        """
+        self.device = device
+        self.sample_rate = int(sample_rate)
+        self.channels = int(channels)
+        self.buffer_seconds = float(buffer_seconds)
+        self.blocksize = int(blocksize)
+        capacity = int(self.buffer_seconds * self.sample_rate)
+        if shared_path:
+            self.ring = SharedAudioRingBuffer.create(shared_path, capacity, self.channels, self.sample_rate, device)
+        else:
+            self.ring = AudioRingBuffer(capacity, self.channels)
+        self.shared_path = shared_path or None
+        self._stream = None
+        self._lock = threading.Lock()
+        self._started_at = None
+        self._overflows = 0
+
+    def _callback(self, indata, frames, time_info, status):
+        if status:
+            self._overflows += 1
+            logger.warning(f"Audio capture status: {status}")
+        self.ring.write(indata)
+
+    def start(self):
+        """
+        Open the input stream once; later calls are no-ops while it is running
+        """
+        import sounddevice as sd
+
+        with self._lock:
+            if self._stream is not None:
+                return
+            stream = sd.InputStream(
+                device=self.device,
+                samplerate=self.sample_rate,
+                channels=self.channels,
+                dtype='float32',
+                blocksize=self.blocksize,
+                callback=self._callback
+            )
+            stream.start()
+            self._stream = stream
+            self._started_at = time.time()
+        logger.info(
+            f"Audio capture started on device {self.device if self.device is not None else 'default'} "
+            f"({self.sample_rate} Hz, {self.channels} channel(s), {self.buffer_seconds:.0f}s buffer)"
+        )
+
+    def stop(self):
+        with self._lock:
+            stream, self._stream = self._stream, None
+        if stream is not None:
+            stream.stop()
+            stream.close()
+            logger.info("Audio capture stopped")
+
+    @property
+    def running(self):
+        return self._stream is not None
+
+    def status(self):
+        return {
+            'running': self.running,
+            'device': self.device,
+            'sample_rate': self.sample_rate,
+            'channels': self.channels,
+            'buffer_seconds': self.buffer_seconds,
+            'buffered_seconds': round(self.ring.available_frames() / self.sample_rate, 3),
+            'uptime_seconds': round(time.time() - self._started_at, 1) if self._started_at else None,
+            'overflows': self._overflows,
+            'shared_path': self.shared_path
+        }
+
+class SharedCaptureClient(_Snapshots):
+    def __init__(self, path, stale_seconds=5.0):
+        """
+        Read the buffer of a capture process running 'manage.py run_capture_service'
+
+        Nothing is recorded here: the samples are read from the memory-mapped
+        buffer file, so every web worker and the hourly command see the same
+        audio without opening the device.
+
+        :param path: Buffer file written by the capture process
+        :param stale_seconds: Treat the capture as stopped when it has not
+            written for this long
+        """
+        self.path = path
+        self.stale_seconds = stale_seconds
+        self.ring = None
+        self._inode = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Map the buffer file (again if the capture process recreated it)
+        """
+        with self._lock:
+            inode = os.stat(self.path).st_ino
+            if self.ring is not None and inode == self._inode:
+                return
+            if self.ring is not None:
+                self.ring.close()
+            self.ring = SharedAudioRingBuffer.attach(self.path)
+            self._inode = inode
+
+    @property
+    def device(self):
+        return self.ring.device if self.ring is not None else None
+
+    @property
+    def sample_rate(self):
+        return self.ring.sample_rate
+
+    @property
+    def running(self):
+        return self.ring is not None and time.time() - self.ring.heartbeat < self.stale_seconds
+
+    def status(self):
+        if self.ring is None:
+            try:
+                self.start()
+            except (OSError, ValueError) as e:
+                return {'running': False, 'shared_path': self.path, 'error': str(e)}
+        return {
+            'running': self.running,
+            'device': self.ring.device,
+            'sample_rate': self.ring.sample_rate,
+            'channels': self.ring.channels,
+            'buffer_seconds': round(self.ring.capacity / self.ring.sample_rate, 3),
+            'buffered_seconds': round(self.ring.available_frames() / self.ring.sample_rate, 3),
+            'seconds_since_write': round(time.time() - self.ring.heartbeat, 3),
+            'writer_pid': self.ring.writer_pid,
+            'shared_path': self.path
+        }
+
+def configured_hives():
+    """
+    Return {hive id: input device index} from settings.HIVE_DEVICES
+    """
+    return dict(getattr(settings, 'HIVE_DEVICES', {}) or {})
+
+def hive_buffer_path(shared_path, hive_id):
+    """
+    Return the shared buffer file of one hive, e.g. capture.buf -> capture.hive-1.buf
+    """
+    stem, ext = os.path.splitext(shared_path)
+    return f"{stem}.{hive_id}{ext}"
+
+_services = {}  # Hive id (None: the default device) -> capture service or client
+_service_lock = threading.Lock()
+
+def get_capture_service(start=True, hive=None):
+    """
+    Return the process-wide capture service, or None if AUDIO_CAPTURE_ENABLED is off
+
+    With AUDIO_CAPTURE_SHARED_PATH set this is a SharedCaptureClient reading
+    the buffer of 'manage.py run_capture_service'; otherwise the process opens
+    the device itself.
+
+    :param start: Open the input stream (or map the shared buffer) if not done yet
+    :param hive: Hive id from settings.HIVE_DEVICES to capture from its own device
+    """
+    if not getattr(settings, 'AUDIO_CAPTURE_ENABLED', False):
+        return None
+    hives = configured_hives()
+    if hive is not None and hive not in hives:
+        raise ValueError(f"Unknown hive: {hive}")
+
+    shared_path = getattr(settings, 'AUDIO_CAPTURE_SHARED_PATH', '')
+    with _service_lock:
+        service = _services.get(hive)
+        if service is None and shared_path:
+            service = SharedCaptureClient(hive_buffer_path(shared_path, hive) if hive is not None else shared_path)
+        elif service is None:
+            service = CaptureService(
+                device=hives[hive] if hive is not None else getattr(settings, 'AUDIO_CAPTURE_DEVICE', None),
+                sample_rate=getattr(settings, 'AUDIO_CAPTURE_SAMPLE_RATE', 44100),
+                channels=getattr(settings, 'AUDIO_CAPTURE_CHANNELS', 1),
+                buffer_seconds=getattr(settings, 'AUDIO_CAPTURE_BUFFER_SECONDS', 300)
+            )
+        _services[hive] = service
+    if start:
+        service.start()
+    return service
+
+def record_hives(duration, sample_rate, hives=None):
+    """
+    Return a clip of every hive, captured from all devices at the same time
+
+    Every hive's stream is opened before any clip is read, so the waits
+    overlap and N hives take about as long as one recording. Hives with a
+    running capture service return their most recent audio; the others are
+    recorded through a capture service or, failing that, a short-lived
+    recorder on their device. Streams opened here are stopped again.
+
+    :param duration: Clip length in seconds
+    :param sample_rate: Sampling rate used when recording directly
+    :param hives: {hive id: device index} (default: settings.HIVE_DEVICES)
+    :return: {hive id: (1-D float32 samples, sample rate)}; hives that failed are left out
+    """
+    hives = configured_hives() if hives is None else hives
+    clips = {}
+    sources = {}  # Hive id -> capture service, shared buffer client or recorder
+    started = []  # Streams opened by this call
+    try:
+        for hive_id, device in hives.items():
+            try:
+                service = get_capture_service(start=False, hive=hive_id)
+                if service is not None:
+                    was_running = service.running
+                    service.start()
+                    if not was_running and isinstance(service, CaptureService):
+                        started.append(service)
+                    if service.running:
+                        sources[hive_id] = service
+                        continue
+            except Exception as e:
+                logger.warning(f"No capture buffer for hive {hive_id}, recording directly: {e}")
+            try:
+                # A buffer one second longer than the clip, so the whole clip stays readable
+                recorder = CaptureService(device=device, sample_rate=sample_rate, buffer_seconds=duration + 1)
+                recorder.start()
+                started.append(recorder)
+                sources[hive_id] = recorder
+            except Exception as e:
+                logger.error(f"Could not open the input device {device} of hive {hive_id}: {e}")
+
+        # All streams are running: collect the clips
+        for hive_id, source in sources.items():
+            try:
+                clips[hive_id] = (source.snapshot(duration), source.sample_rate)
+            except Exception as e:
+                logger.error(f"Recording hive {hive_id} failed: {e}")
+    finally:
+        for stream in started:
+            stream.stop()
+    return clips
+
+def record_clip(duration, sample_rate, device_index=None, fresh=False):
+    """
+    Return a mono clip of the given length, from the capture buffer when possible
+
+    Uses the running capture service (the most recent `duration` seconds,
+    resampled if its rate differs) unless a different input device is
+    requested or capture is disabled; then records with sd.rec as before.
+
+    :param duration: Clip length in seconds
+    :param sample_rate: Sampling rate in Hz of the returned clip
+    :param device_index: Input device index, defaults to the capture/system default
+    :param fresh: Take the clip from audio captured after the call (see
+        snapshot), so successive clips are separate takes rather than the
+        same buffered audio
+    :return: 1-D float array of samples
+    """
+    try:
+        service = get_capture_service()
+        if service is not None and (device_index is None or device_index == service.device):
+            samples = service.snapshot(duration, fresh=fresh)
+            if service.sample_rate != sample_rate:
+                import librosa
+                samples = librosa.resample(samples, orig_sr=service.sample_rate, target_sr=sample_rate)
+            return samples
+    except Exception as e:
+        logger.error(f"Audio capture service unavailable, recording directly: {e}")
+
+    import sounddevice as sd
+    recording = sd.rec(
+        int(duration * sample_rate),
+        samplerate=sample_rate,
+        channels=1,
+        dtype='float64',
+        device=device_index
+    )
+    sd.wait()  # Wait for recording to complete
+    return recording.flatten()
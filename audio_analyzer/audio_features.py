@@ -0,0 +1,82 @@
+import logging
+import numpy as np
+import librosa
+
+from .spectrogram_utils import compute_stft_magnitude
+
+logger = logging.getLogger(__name__)
+
+# Frequencies below this are treated as noise when looking for the dominant frequency
+MIN_FREQUENCY = 20
+
+# Frequency bands (Hz) reported as fractions of the total power
+BAND_EDGES = {
+    'below_100': (0, 100),
+    'hum_100_300': (100, 300),
+    'hum_300_500': (300, 500),
+    'piping_500_1000': (500, 1000),
+    'tooting_1000_2000': (1000, 2000),
+    'above_2000': (2000, None)
+}
+
+def compute_spectral_features(samples, sample_rate, magnitude=None, n_fft=2048, hop_length=512, rolloff_percent=0.85):
+    """
+    Derive every spectral statistic from one STFT
+
+    Centroid, bandwidth and rolloff follow librosa.feature's definitions
+    (per frame on the magnitude, then averaged), without each of them
+    computing its own STFT.
+
+    :param samples: 1-D array of audio samples (used for the RMS; may be None
+        when magnitude is given)
+    :param sample_rate: Sampling rate of the samples
+    :param magnitude: Precomputed spectrogram_utils.compute_stft_magnitude(samples) to reuse
+    :param n_fft: FFT size the magnitude was (or will be) computed with
+    :param hop_length: Hop length the magnitude was (or will be) computed with
+    :param rolloff_percent: Energy fraction for the rolloff frequency
+    :return: Dictionary of features in Hz (band energies as fractions of the total power)
+    """
+    if magnitude is None:
+        magnitude = compute_stft_magnitude(samples, n_fft=n_fft, hop_length=hop_length)
+    freqs = librosa.fft_frequencies(sr=sample_rate, n_fft=(magnitude.shape[0] - 1) * 2)
+    power = magnitude ** 2
+
+    # Per-frame centroid, bandwidth (p=2) and rolloff on the magnitude, as librosa does
+    frame_totals = magnitude.sum(axis=0)
+    valid = frame_totals > 0
+    weights = np.divide(magnitude, frame_totals, out=np.zeros_like(magnitude), where=valid)
+    centroid = freqs @ weights
+    bandwidth = np.sqrt(np.sum(weights * (freqs[:, np.newaxis] - centroid) ** 2, axis=0))
+    cumulative = np.cumsum(magnitude, axis=0)
+    rolloff = freqs[np.argmax(cumulative >= rolloff_percent * cumulative[-1], axis=0)]
+
+    # Long-term spectrum: mean power per bin over all frames
+    spectrum = power.mean(axis=1)
+    audible = freqs >= MIN_FREQUENCY
+    audible_power = spectrum[audible].sum()
+    dominant = float(freqs[audible][np.argmax(spectrum[audible])]) if audible.any() else 0.0
+    mean_frequency = float(freqs[audible] @ spectrum[audible] / audible_power) if audible_power > 0 else 0.0
+
+    total_power = spectrum.sum()
+    band_energies = {}
+    for name, (low, high) in BAND_EDGES.items():
+        in_band = (freqs >= low) & (freqs < (high if high is not None else np.inf))
+        band_energies[name] = float(spectrum[in_band].sum() / total_power) if total_power > 0 else 0.0
+
+    if samples is not None:
+        rms = float(np.sqrt(np.mean(np.square(samples, dtype=np.float64))))
+    else:
+        # Parseval on the STFT frames (exact up to the analysis window's gain)
+        rms = float(np.sqrt(np.mean(librosa.feature.rms(S=magnitude, frame_length=(magnitude.shape[0] - 1) * 2) ** 2)))
+
+    return {
+        'sample_rate': int(sample_rate),
+        'spectral_centroid': float(centroid[valid].mean()) if valid.any() else 0.0,
+        'spectral_bandwidth': float(bandwidth[valid].mean()) if valid.any() else 0.0,
+        'spectral_rolloff': float(rolloff[valid].mean()) if valid.any() else 0.0,
+        'dominant_frequency': dominant,
+        'mean_frequency': mean_frequency,
+        'frequency_range': (float(freqs[1]), float(freqs[-1])),
+        'band_energies': band_energies,
+        'rms': rms
+    }
@@ -0,0 +1,147 @@
+import logging
+import numpy as np
+import soundfile as sf
+from scipy.signal import get_window
+
+logger = logging.getLogger(__name__)
+
+# Frequencies below this are treated as noise
+MIN_FREQUENCY = 20
+
+# Welch segment length; memory and per-segment cost do not depend on the recording length
+SEGMENT_SIZE = 4096
+
+# Samples read from a file at a time
+BLOCK_SIZE = 65536
+
+class WelchAccumulator:
+    def __init__(self, sample_rate, segment_size=SEGMENT_SIZE):
+        """
+        Welch power spectral density built up block by block
+
+        Equivalent to scipy.signal.welch with a Hann window, 50% overlap and
+        constant detrending, but fed incrementally: only the partial segment
+        at the end of each block is kept between updates.
+
+        :param sample_rate: Sampling rate of the samples
+        :param segment_size: Samples per segment (the real FFT size)
+        """
+        self.sample_rate = sample_rate
+        self.segment_size = int(segment_size)
+        self.hop = self.segment_size // 2
+        self.window = get_window('hann', self.segment_size)
+        self._carry = np.zeros(0)
+        self._power_sum = np.zeros(self.segment_size // 2 + 1)
+        self._segments = 0
+        self._sum_squares = 0.0
+        self._samples = 0
+
+    def update(self, samples):
+        """
+        Add a block of mono samples
+        """
+        samples = np.asarray(samples, dtype=np.float64).ravel()
+        self._sum_squares += float(np.dot(samples, samples))
+        self._samples += len(samples)
+
+        data = np.concatenate([self._carry, samples]) if len(self._carry) else samples
+        if len(data) < self.segment_size:
+            self._carry = data
+            return
+
+        segments = np.lib.stride_tricks.sliding_window_view(data, self.segment_size)[::self.hop]
+        segments = segments - segments.mean(axis=1, keepdims=True)
+        self._power_sum += np.sum(np.abs(np.fft.rfft(segments * self.window, axis=1)) ** 2, axis=0)
+        self._segments += len(segments)
+        self._carry = data[len(segments) * self.hop:].copy()
+
+    def psd(self):
+        """
+        Return (frequencies, one-sided power spectral density) like scipy.signal.welch
+        """
+        if self._segments == 0:
+            # Shorter than one segment: a single periodogram of the whole clip, as welch does
+            if len(self._carry) == 0:
+                return np.zeros(0), np.zeros(0)
+            window = get_window('hann', len(self._carry))
+            power = np.abs(np.fft.rfft((self._carry - self._carry.mean()) * window)) ** 2
+            return self._scale(power, window, len(self._carry))
+        return self._scale(self._power_sum / self._segments, self.window, self.segment_size)
+
+    def _scale(self, power, window, size):
+        psd = power / (self.sample_rate * np.sum(window ** 2))
+        # Fold the negative frequencies in (DC and, for even sizes, Nyquist appear once)
+        psd[1:-1 if size % 2 == 0 else None] *= 2
+        return np.fft.rfftfreq(size, 1 / self.sample_rate), psd
+
+    @property
+    def rms(self):
+        return float(np.sqrt(self._sum_squares / self._samples)) if self._samples else 0.0
+
+def classify_activity(avg_freq, rms_amplitude):
+    """
+    Describe hive activity from the average frequency and the RMS amplitude (full scale = 1.0)
+    """
+    # Classify activity level based on frequency
+    if avg_freq < 100:
+        base_level = "Low"
+    elif 100 <= avg_freq <= 300:
+        base_level = "Normal"
+    elif 300 < avg_freq <= 500:
+        base_level = "High"
+    else:
+        base_level = "Chaotic"
+
+    # Amplitude-based refinement
+    if rms_amplitude < 0.1:
+        return f"Very {base_level}"
+    elif 0.1 <= rms_amplitude < 0.3:
+        return f"{base_level}"
+    elif 0.3 <= rms_amplitude < 0.6:
+        return f"Intense {base_level}"
+    return f"Extremely {base_level}"
+
+def _summarize(accumulator):
+    freqs, psd = accumulator.psd()
+    audible = freqs >= MIN_FREQUENCY
+    if not audible.any() or psd[audible].sum() <= 0:
+        return None
+    peak_freq = float(freqs[audible][np.argmax(psd[audible])])
+    avg_freq = float(freqs[audible] @ psd[audible] / psd[audible].sum())
+    rms_amplitude = accumulator.rms
+    return {
+        'peak_frequency': round(peak_freq, 2),
+        'average_frequency': round(avg_freq, 2),
+        'rms_amplitude': round(rms_amplitude, 5),
+        'activity': classify_activity(avg_freq, rms_amplitude)
+    }
+
+def compute_frequency_stats(samples, sample_rate, segment_size=SEGMENT_SIZE):
+    """
+    Peak and average frequency, RMS and activity level of a recording in memory
+
+    :param samples: Samples in full scale [-1, 1], mono or (frames, channels)
+    :param sample_rate: Sampling rate of the samples
+    :return: Dictionary with peak_frequency, average_frequency (power-weighted,
+        above MIN_FREQUENCY), rms_amplitude and activity, or None for silence
+    """
+    samples = np.asarray(samples)
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    accumulator = WelchAccumulator(sample_rate, segment_size)
+    for start in range(0, len(samples), BLOCK_SIZE):
+        accumulator.update(samples[start:start + BLOCK_SIZE])
+    return _summarize(accumulator)
+
+def frequency_stats_from_file(audio_path, segment_size=SEGMENT_SIZE):
+    """
+    compute_frequency_stats for an audio file, read in fixed-size blocks
+
+    :param audio_path: Path to the audio file
+    :return: Same dictionary as compute_frequency_stats
+    """
+    with sf.SoundFile(audio_path) as audio:
+        accumulator = WelchAccumulator(audio.samplerate, segment_size)
+        for block in audio.blocks(blocksize=BLOCK_SIZE, dtype='float64', always_2d=True):
+            accumulator.update(block.mean(axis=1))
+    return _summarize(accumulator)
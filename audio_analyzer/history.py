@@ -0,0 +1,216 @@
+import os
+import base64
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import FeatureVector, Prediction, Recording
+
+logger = logging.getLogger(__name__)
+
+# Page size of the history endpoints (the limit parameter is capped at MAX_PAGE_SIZE)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def _as_datetime(unix_time):
+    return datetime.fromtimestamp(float(unix_time), tz=dt_timezone.utc)
+
+def _prediction_rows(analysis_results):
+    """
+    (model, entry, window) for every stored prediction of an analysis
+
+    Windowed analyses give one row per window; failed predictions are not stored.
+    """
+    for model_name, result in analysis_results.items():
+        if 'error' in result:
+            continue
+        if result.get('per_window'):
+            for entry in result['per_window']:
+                yield model_name, entry, (entry['start_seconds'], entry['end_seconds'])
+        else:
+            yield model_name, result, (None, None)
+
+def _media_path(path):
+    """
+    Path relative to MEDIA_ROOT with forward slashes, as stored in Recording
+    """
+    if not path:
+        return ''
+    if os.path.isabs(path):
+        path = os.path.relpath(path, settings.MEDIA_ROOT)
+    return path.replace(os.sep, '/')
+
+def _find_recording(spectrogram_path):
+    """
+    Match an analysed spectrogram file to an existing Recording or a stored recording
+
+    :return: (Recording or None, recording_store record or None)
+    """
+    from .recording_store import get_recording_store
+
+    row = Recording.objects.filter(spectrogram_path=_media_path(spectrogram_path)).first()
+    if row is not None:
+        return row, None
+    store = get_recording_store()
+    absolute_path = spectrogram_path if os.path.isabs(spectrogram_path) else os.path.join(settings.MEDIA_ROOT, spectrogram_path)
+    store_path = os.path.relpath(absolute_path, store.root).replace(os.sep, '/')
+    if store_path.startswith('../'):
+        return None, None
+    return None, store.find_by_spectrogram(store_path)
+
+def save_analysis(analysis_results, hive=None, recording=None, features=None, spectrogram_path=None):
+    """
+    Store an analysis as Predictions (and a FeatureVector) of its Recording
+
+    There is one Recording per stored recording: it is created the first
+    time the recording is analysed and reused afterwards, e.g. when the
+    frontend posts its spectrogram to /analyze/ once per predictor. A new
+    analysis replaces the Predictions of the models it ran. Analyses that
+    cannot be tied to a stored recording are not saved.
+
+    All predictions of the analysis are written with a single bulk_create
+    inside one transaction.
+
+    :param analysis_results: analysis_results of views.analyze_audio
+    :param hive: Hive the audio was recorded at (default: the recording's
+        hive, else settings.RECORDING_DEFAULT_HIVE)
+    :param recording: recording_store record of the analysed audio, if known
+    :param features: audio_features.compute_spectral_features of the recording
+    :param spectrogram_path: Analysed spectrogram file (absolute or relative
+        to MEDIA_ROOT), used to find the recording when none is given
+    :return: The Recording, or None if the analysis was not saved
+    """
+    from .recording_store import get_recording_store
+
+    row = None
+    if recording is None and spectrogram_path:
+        row, recording = _find_recording(spectrogram_path)
+    if row is None and recording is None:
+        logger.debug('Analysis not saved to the history: no stored recording')
+        return None
+
+    with transaction.atomic():
+        if row is None:
+            store = get_recording_store()
+            row, _ = Recording.objects.get_or_create(store_id=recording['id'], defaults={
+                'hive': hive or recording.get('hive') or getattr(settings, 'RECORDING_DEFAULT_HIVE', 'default'),
+                'recorded_at': _as_datetime(recording['recorded_at']),
+                'duration': recording['duration'],
+                'sample_rate': recording['sample_rate'],
+                'audio_path': _media_path(store.path(recording['audio_path'])),
+                'audio_sha256': recording['audio_sha256'],
+                'spectrogram_path': _media_path(store.path(recording['spectrogram_path'])) if recording.get('spectrogram_path') else ''
+            })
+            if recording.get('spectrogram_path') and not row.spectrogram_path:
+                row.spectrogram_path = _media_path(store.path(recording['spectrogram_path']))
+                row.save(update_fields=['spectrogram_path'])
+
+        rows = list(_prediction_rows(analysis_results))
+        row.predictions.filter(model__in={model_name for model_name, _, _ in rows}).delete()
+        Prediction.objects.bulk_create([
+            Prediction(
+                recording=row,
+                hive=row.hive,
+                recorded_at=row.recorded_at,
+                model=model_name,
+                predicted_class=int(entry['predicted_class']),
+                label=entry['label'],
+                confidence=float(entry['confidence']),
+                skipped=bool(entry.get('skipped', False)),
+                window_start=window_start,
+                window_end=window_end
+            )
+            for model_name, entry, (window_start, window_end) in rows
+        ])
+        if features is not None:
+            FeatureVector.objects.update_or_create(recording=row, defaults={
+                'hive': row.hive,
+                'recorded_at': row.recorded_at,
+                'spectral_centroid': features['spectral_centroid'],
+                'spectral_bandwidth': features['spectral_bandwidth'],
+                'spectral_rolloff': features['spectral_rolloff'],
+                'dominant_frequency': features['dominant_frequency'],
+                'mean_frequency': features['mean_frequency'],
+                'rms': features['rms'],
+                'band_energies': features.get('band_energies', {})
+            })
+    return row
+
+def parse_time(value):
+    """
+    Parse a time filter given as ISO 8601 or Unix seconds
+
+    :return: Aware datetime (naive ISO times are taken as UTC)
+    :raises ValueError: If the value is neither
+    """
+    try:
+        return _as_datetime(value)
+    except (ValueError, OverflowError, OSError):
+        pass
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:  # Well formed but out of range, e.g. month 13
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"Invalid time '{value}': expected ISO 8601 or Unix seconds")
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed, dt_timezone.utc)
+
+def encode_cursor(row):
+    """
+    Opaque cursor pointing just past a row in (recorded_at, id) descending order
+    """
+    return base64.urlsafe_b64encode(f"{row.recorded_at.isoformat()}|{row.pk}".encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """
+    :return: (recorded_at, id) of the last row of the previous page
+    :raises ValueError: If the cursor is malformed
+    """
+    try:
+        recorded_at, pk = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(recorded_at), int(pk)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def filter_history(queryset, hive=None, start=None, end=None, model=None):
+    """
+    Restrict a Recording, Prediction or FeatureVector queryset to a hive, model and time range
+
+    :param start: Earliest recorded_at (inclusive)
+    :param end: Latest recorded_at (exclusive)
+    """
+    if hive:
+        queryset = queryset.filter(hive=hive)
+    if model:
+        queryset = queryset.filter(model=model)
+    if start is not None:
+        queryset = queryset.filter(recorded_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(recorded_at__lt=end)
+    return queryset
+
+def history_page(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of a queryset, newest first, by keyset pagination on (recorded_at, id)
+
+    Every page is a range scan of the (..., recorded_at, id) indexes that
+    starts where the previous page ended, so late pages cost the same as
+    the first one (unlike OFFSET, which reads every skipped row).
+
+    :param queryset: Filtered queryset of a history model
+    :param cursor: next_cursor of the previous page, or None for the first page
+    :param limit: Rows per page
+    :return: (rows, next_cursor); next_cursor is None on the last page
+    """
+    if cursor:
+        recorded_at, pk = decode_cursor(cursor)
+        # Written as a bound on recorded_at so it seeks into the index (an OR does not)
+        queryset = queryset.filter(recorded_at__lte=recorded_at).exclude(recorded_at=recorded_at, id__gte=pk)
+    rows = list(queryset.order_by('-recorded_at', '-id')[:limit + 1])
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
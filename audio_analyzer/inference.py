@@ -0,0 +1,283 @@
+import os
+import sys
+import logging
+import threading
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+
+from .sheets_utils import save_prediction_to_sheets
+from .spectrogram_utils import load_spectrogram_batch
+from .model_registry import model_registry
+from .prediction_cache import content_hash, get_prediction_cache
+
+sys.path.append(os.path.join(settings.BASE_DIR, 'predictors'))
+import BNBpredictor
+import QNQpredictor
+import TOOTpredictor
+import FUSEDpredictor
+
+logger = logging.getLogger(__name__)
+
+# Predictors run on every analysis, in order
+PREDICTOR_SPECS = [
+    {
+        'name': 'BNQ',
+        'sheet_type': 'bnb',
+        'model': BNBpredictor.MODEL_NAME,
+        'labels': ['No Bees Detected', 'Bees Detected']
+    },
+    {
+        'name': 'QNQ',
+        'sheet_type': 'qnq',
+        'model': QNQpredictor.MODEL_NAME,
+        'labels': ['No Queen Detected', 'Queen Detected'],
+        # Cascade: not run when BNQ predicts "No Bees Detected" confidently
+        'skip_if': {'predictor': 'BNQ', 'predicted_class': 0}
+    },
+    {
+        'name': 'TOOT',
+        'sheet_type': 'toot',
+        'model': TOOTpredictor.MODEL_NAME,
+        'labels': ['No Tooting', 'Tooting'],
+        'skip_if': {'predictor': 'BNQ', 'predicted_class': 0}
+    }
+]
+
+# Per-predictor counts of rows requested, run through a model, answered
+# from the cache and skipped by the cascade
+_stage_counters = {spec['name']: Counter() for spec in PREDICTOR_SPECS}
+_stage_counters_lock = threading.Lock()
+
+def _count(name, **counts):
+    with _stage_counters_lock:
+        _stage_counters[name].update(counts)
+
+def stage_metrics():
+    """
+    Report how often each predictor stage ran, hit the cache or was skipped
+    """
+    with _stage_counters_lock:
+        metrics = {
+            name: {key: counter.get(key, 0) for key in ('requested', 'run', 'cached', 'skipped')}
+            for name, counter in _stage_counters.items()
+        }
+    return {
+        'cascade_enabled': getattr(settings, 'INFERENCE_CASCADE', False),
+        'skip_confidence': getattr(settings, 'INFERENCE_CASCADE_SKIP_CONFIDENCE', 0.9),
+        'stages': metrics
+    }
+
+def build_input_batch(spectrogram_paths=None, input_arrays=None):
+    """
+    Assemble one model input batch shared by all predictors
+
+    :param spectrogram_paths: Absolute spectrogram image paths to decode
+    :param input_arrays: Preprocessed (1, 224, 224, 3) or (N, 224, 224, 3) arrays;
+        used instead of decoding when given
+    :return: float32 array of shape (N, 224, 224, 3)
+    """
+    if input_arrays:
+        return np.concatenate([np.asarray(arr, dtype=np.float32) for arr in input_arrays], axis=0)
+    return load_spectrogram_batch(spectrogram_paths or [])
+
+def interpret_prediction(pred_row):
+    """
+    Turn one row of model output into (predicted_class, confidence, f1, precision)
+
+    Uses the same rules as the per-predictor functions: argmax for softmax
+    outputs, a 0.5 threshold for a single sigmoid output.
+    """
+    pred_row = np.ravel(pred_row)
+    if pred_row.size > 1:
+        # Multi-class prediction (softmax output)
+        confidence = float(np.max(pred_row))
+        predicted_class = int(np.argmax(pred_row))
+    else:
+        # Binary classification
+        confidence = float(pred_row[0])
+        predicted_class = 1 if confidence > 0.5 else 0
+
+    # Ensure confidence is between 0 and 1
+    confidence = max(0.0, min(1.0, confidence))
+
+    # Placeholder metrics, as in the predictor modules
+    return predicted_class, confidence, confidence, confidence
+
+def aggregate_window_results(rows):
+    """
+    Summarize one predictor's results over the windows of a recording
+
+    Each window's positive-class probability is its confidence when it
+    predicted class 1 and one minus it otherwise. Windows skipped by the
+    cascade count as negative.
+
+    :param rows: List of (predicted_class, confidence, f1, precision) tuples or None
+    :return: Dictionary with the max and mean positive probability, the
+        fraction of positive windows and the index of the strongest window
+    """
+    positive = np.array([
+        0.0 if row is None else (row[1] if row[0] == 1 else 1.0 - row[1])
+        for row in rows
+    ], dtype=np.float64)
+    if positive.size == 0:
+        return {'windows': 0, 'max': 0.0, 'mean': 0.0, 'fraction_positive': 0.0, 'peak_window': None}
+    return {
+        'windows': int(positive.size),
+        'max': float(positive.max()),
+        'mean': float(positive.mean()),
+        'fraction_positive': float(np.mean([row is not None and row[0] == 1 for row in rows])),
+        'peak_window': int(positive.argmax())
+    }
+
+def use_fused_model():
+    """
+    Return True if analyses should run the fused multi-head model (settings.PREDICTOR_FUSED)
+    """
+    return getattr(settings, 'PREDICTOR_FUSED', False) and FUSEDpredictor.is_available()
+
+def predict_batch(batch, source_names=None, record_to_sheets=False):
+    """
+    Run every predictor over a batch with a single compiled call per model,
+    or a single call in total when the fused multi-head model is enabled
+
+    :param batch: float32 array of shape (N, 224, 224, 3)
+    :param source_names: Optional list of N names used for logging and Sheets
+    :param record_to_sheets: Append each row's prediction to the predictor's
+        sheet. Off by default: windows and micro-batches would write one row
+        each, so views.analyze_audio records one row per recording instead.
+    :return: Dictionary mapping predictor name to a list of N result tuples
+        (predicted_class, confidence, f1, precision), or to an Exception if
+        the predictor could not run. With INFERENCE_CASCADE set, rows a
+        predictor was skipped for are None.
+    """
+    source_names = [
+        (source_names[i] if source_names and i < len(source_names) else None) or f'spectrogram_{i+1}'
+        for i in range(len(batch))
+    ]
+    results = {}
+
+    # Repeat analyses of an unchanged spectrogram are answered from the cache
+    cache = get_prediction_cache()
+    input_hashes = [content_hash(row) for row in batch] if cache is not None else None
+
+    # One forward pass of the shared backbone serves every predictor
+    fused = use_fused_model() and FUSEDpredictor.get_model() is not None
+    fused_rows = {}  # Row index -> {head: output row}, filled for rows not cached
+
+    # The fused model computes every head in the same pass, so skipping saves nothing
+    cascade = getattr(settings, 'INFERENCE_CASCADE', False) and not fused
+    skip_confidence = getattr(settings, 'INFERENCE_CASCADE_SKIP_CONFIDENCE', 0.9)
+
+    # Long recordings split into many windows are scored in bounded chunks
+    chunk_size = max(1, getattr(settings, 'INFERENCE_MODEL_BATCH_SIZE', 64))
+
+    def model_outputs(spec, indices):
+        if fused:
+            todo = [i for i in indices if i not in fused_rows]
+            for start in range(0, len(todo), chunk_size):
+                chunk = todo[start:start + chunk_size]
+                heads = FUSEDpredictor.predict_heads(batch[chunk])
+                for j, i in enumerate(chunk):
+                    fused_rows[i] = {head: output[j] for head, output in heads.items()}
+            return [fused_rows[i][spec['model']] for i in indices]
+
+        # Served with settings.PREDICTOR_BACKEND (Keras or TFLite)
+        model = model_registry.get(spec['model'])
+        if model is None:
+            raise RuntimeError(f"No model available for {spec['name']}")
+
+        # One call per chunk of rows not cached, without predict()'s per-call setup
+        if len(indices) == len(batch) and len(batch) <= chunk_size:
+            preds = np.asarray(model.predict_on_batch(batch))
+        else:
+            preds = np.concatenate([
+                np.asarray(model.predict_on_batch(batch[indices[start:start + chunk_size]]))
+                for start in range(0, len(indices), chunk_size)
+            ])
+        return preds.reshape(len(indices), -1)
+
+    for spec in PREDICTOR_SPECS:
+        try:
+            active = list(range(len(batch)))
+            gate = spec.get('skip_if') if cascade else None
+            if gate and isinstance(results.get(gate['predictor']), list):
+                gate_rows = results[gate['predictor']]
+                active = [
+                    i for i in active
+                    if gate_rows[i] is None
+                    or gate_rows[i][0] != gate['predicted_class']
+                    or gate_rows[i][1] < skip_confidence
+                ]
+
+            rows = [None] * len(batch)
+            cache_keys = None
+            if cache is not None and active:
+                model_name = FUSEDpredictor.MODEL_NAME if fused else spec['model']
+                version = model_registry.model_version(model_name)
+                if version is not None:
+                    cache_keys = {i: cache.make_key(f"{model_name}.{spec['model']}", version, input_hashes[i]) for i in active}
+                    for i in active:
+                        rows[i] = cache.get(cache_keys[i])
+
+            missing = [i for i in active if rows[i] is None]
+            if missing:
+                for i, pred_row in zip(missing, model_outputs(spec, missing)):
+                    rows[i] = interpret_prediction(pred_row)
+                    if cache_keys is not None:
+                        cache.put(cache_keys[i], rows[i])
+
+            _count(
+                spec['name'], requested=len(batch), run=len(missing),
+                cached=len(active) - len(missing), skipped=len(batch) - len(active)
+            )
+            results[spec['name']] = rows
+        except Exception as e:
+            logger.error(f"{spec['name']} batch prediction error: {e}")
+            results[spec['name']] = e
+            continue
+
+        for source_name, row in zip(source_names, results[spec['name']]):
+            if row is None:
+                logger.info(f"{spec['name']} File: {source_name}, skipped by the inference cascade")
+                continue
+            predicted_class, confidence = row[0], row[1]
+            logger.info(f"{spec['name']} File: {source_name}, "
+                        f"Predicted: {spec['labels'][predicted_class]}, "
+                        f"Confidence: {confidence * 100:.2f}%")
+            if record_to_sheets:
+                save_prediction_to_sheets(spec['sheet_type'], {
+                    'model': spec['name'],
+                    'filename': source_name,
+                    'prediction': spec['labels'][predicted_class],
+                    'confidence': confidence
+                })
+
+    return results
+
+def run_predictors(batch, source_names=None):
+    """
+    Run every predictor over a batch using the configured execution path
+
+    Tries the shared model server when MODEL_SERVER_ENABLED is set and falls
+    back to in-process models if it cannot be reached. In-process inference
+    goes through the micro-batch scheduler when INFERENCE_MICRO_BATCHING is set.
+
+    :return: Same structure as predict_batch
+    """
+    if getattr(settings, 'MODEL_SERVER_ENABLED', False):
+        from .model_server import get_model_server_client
+        try:
+            return get_model_server_client().predict(batch, source_names)
+        except Exception as e:
+            logger.warning(f"Model server unavailable, predicting in-process: {e}")
+
+    if getattr(settings, 'INFERENCE_MICRO_BATCHING', False):
+        from .inference_scheduler import get_inference_scheduler
+        # Share model calls with other requests in this worker
+        return get_inference_scheduler().predict(
+            batch, source_names, timeout=getattr(settings, 'INFERENCE_TIMEOUT_SECONDS', 30)
+        )
+
+    return predict_batch(batch, source_names)
@@ -0,0 +1,178 @@
+import time
+import queue
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+class MicroBatchScheduler:
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=20):
+        """
+        Queue model inputs from concurrent requests and run them in micro-batches
+
+        :param predict_fn: Callable(batch, source_names) returning a dict of
+            predictor name -> list of per-row results (or an Exception),
+            e.g. inference.predict_batch
+        :param max_batch_size: Maximum number of rows per model call
+        :param max_wait_ms: Longest time the first queued item waits for others
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._pending = None  # Item taken off the queue that did not fit the last batch
+        self._worker = None
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._batch_sizes = Counter()
+        self._queue_depths = Counter()
+        self._batches_run = 0
+        self._items_processed = 0
+        self._max_queue_depth = 0
+
+    def start(self):
+        """
+        Start the background worker thread if it is not running
+        """
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run,
+                    name='inference-micro-batcher',
+                    daemon=True
+                )
+                self._worker.start()
+                logger.info(f"Micro-batch scheduler started "
+                            f"(max_batch_size={self.max_batch_size}, max_wait_ms={self.max_wait * 1000:.0f})")
+
+    def submit(self, input_array, source_names=None):
+        """
+        Queue a model input and return a Future for its predictions
+
+        :param input_array: float32 array of shape (224, 224, 3) or (N, 224, 224, 3)
+        :param source_names: Optional list of N names used for logging
+        :return: Future resolving to {predictor name: [N result tuples] or Exception}
+        """
+        batch = np.asarray(input_array, dtype=np.float32)
+        if batch.ndim == 3:
+            batch = batch[np.newaxis, ...]
+
+        future = Future()
+        self.start()
+        self._queue.put((batch, source_names, future))
+
+        depth = self._queue.qsize()
+        self._max_queue_depth = max(self._max_queue_depth, depth)
+        return future
+
+    def predict(self, input_array, source_names=None, timeout=None):
+        """
+        Submit a model input and block until its predictions are ready
+        """
+        return self.submit(input_array, source_names).result(timeout=timeout)
+
+    def _next_item(self, timeout=None):
+        if self._pending is not None:
+            item, self._pending = self._pending, None
+            return item
+        return self._queue.get(timeout=timeout)
+
+    def _collect_batch(self):
+        """
+        Block for the first item, then gather more until full or the wait expires
+        """
+        items = [self._next_item()]
+        rows = len(items[0][0])
+        deadline = time.monotonic() + self.max_wait
+
+        while rows < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._next_item(timeout=remaining)
+            except queue.Empty:
+                break
+            if rows + len(item[0]) > self.max_batch_size:
+                # Keep it for the next batch rather than exceed the limit
+                self._pending = item
+                break
+            items.append(item)
+            rows += len(item[0])
+
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect_batch()
+            self._queue_depths[self._queue.qsize()] += 1
+
+            batch = np.concatenate([item[0] for item in items], axis=0)
+            source_names = []
+            for item_batch, names, _ in items:
+                if names and len(names) == len(item_batch):
+                    source_names.extend(names)
+                else:
+                    source_names.extend([None] * len(item_batch))
+
+            try:
+                results = self.predict_fn(batch, source_names)
+            except Exception as e:
+                logger.error(f"Micro-batch prediction error: {e}")
+                for _, _, future in items:
+                    future.set_exception(e)
+                continue
+
+            self._batch_sizes[len(batch)] += 1
+            self._batches_run += 1
+            self._items_processed += len(items)
+
+            # Hand each caller back only its own rows
+            offset = 0
+            for item_batch, _, future in items:
+                rows = len(item_batch)
+                future.set_result({
+                    name: result if isinstance(result, Exception) else result[offset:offset + rows]
+                    for name, result in results.items()
+                })
+                offset += rows
+
+    def metrics(self):
+        """
+        Report queue depth and batch size histograms
+        """
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'queue_depth': self._queue.qsize() + (1 if self._pending is not None else 0),
+            'max_queue_depth': self._max_queue_depth,
+            'batches_run': self._batches_run,
+            'items_processed': self._items_processed,
+            'batch_size_histogram': dict(sorted(self._batch_sizes.items())),
+            'queue_depth_histogram': dict(sorted(self._queue_depths.items()))
+        }
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_inference_scheduler():
+    """
+    Return the process-wide scheduler, configured from settings on first use
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from .inference import predict_batch
+            _scheduler = MicroBatchScheduler(
+                predict_batch,
+                max_batch_size=getattr(settings, 'INFERENCE_MAX_BATCH_SIZE', 8),
+                max_wait_ms=getattr(settings, 'INFERENCE_MAX_WAIT_MS', 20)
+            )
+        return _scheduler
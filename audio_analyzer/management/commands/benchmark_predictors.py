@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import logging
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from audio_analyzer.inference import PREDICTOR_SPECS, interpret_prediction
+from audio_analyzer.model_registry import model_registry, _current_rss_bytes
+from audio_analyzer.spectrogram_utils import MODEL_INPUT_SIZE, load_spectrogram_batch
+from audio_analyzer.tflite_utils import CALIBRATION_GLOB, TFLitePredictor, find_spectrograms, tflite_path_for
+
+logger = logging.getLogger(__name__)
+
+# Benchmark variants: name -> .tflite suffix (None for the Keras reference)
+VARIANTS = {
+    'keras': None,
+    'tflite': '',
+    'int8': '_int8',
+}
+
+def _load_variant(keras_path, variant):
+    if VARIANTS[variant] is None:
+        from tensorflow.keras.models import load_model
+        return load_model(keras_path), keras_path
+    tflite_path = tflite_path_for(keras_path, VARIANTS[variant])
+    if not os.path.exists(tflite_path):
+        raise FileNotFoundError(f"{tflite_path} not found")
+    return TFLitePredictor(tflite_path), tflite_path
+
+class Command(BaseCommand):
+    help = 'Compare latency, memory and prediction agreement of the Keras, TFLite and int8 predictor backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--models',
+            nargs='+',
+            default=[spec['model'] for spec in PREDICTOR_SPECS],
+            help='Models to benchmark (default: BNB QNQ TOOT)'
+        )
+        parser.add_argument(
+            '--variants',
+            nargs='+',
+            choices=list(VARIANTS),
+            default=list(VARIANTS),
+            help='Backends to compare; agreement is measured against keras'
+        )
+        parser.add_argument(
+            '--spectrograms',
+            type=str,
+            default=None,
+            help=f'Glob of spectrogram images to use as inputs, relative to MEDIA_ROOT, '
+                 f'e.g. "{CALIBRATION_GLOB}" (default: random inputs)'
+        )
+        parser.add_argument(
+            '--holdout',
+            action='store_true',
+            help='Only use spectrograms held out of int8 calibration'
+        )
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=20,
+            help='Number of inputs (default: 20)'
+        )
+        parser.add_argument(
+            '--report',
+            type=str,
+            default=None,
+            help='Also write the results as JSON to this path'
+        )
+
+    def _inputs(self, options):
+        if options['spectrograms']:
+            split = 'holdout' if options['holdout'] else None
+            paths = find_spectrograms(options['spectrograms'], split=split)[:options['samples']]
+            if not paths:
+                raise CommandError(f"No spectrograms match {options['spectrograms']}")
+            return load_spectrogram_batch(paths)
+
+        height, width = MODEL_INPUT_SIZE
+        rng = np.random.default_rng(0)
+        return rng.random((options['samples'], height, width, 3), dtype=np.float32)
+
+    def _benchmark(self, model, batch):
+        """
+        Time single-sample and whole-batch calls
+
+        :return: (outputs, per-sample latencies in ms, batch latency in ms)
+        """
+        # Warm-up call so one-off allocation is not timed
+        model.predict_on_batch(batch[:1])
+        latencies = []
+        outputs = []
+        for i in range(len(batch)):
+            start = time.perf_counter()
+            outputs.append(np.asarray(model.predict_on_batch(batch[i:i + 1]))[0])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        model.predict_on_batch(batch)
+        batch_ms = (time.perf_counter() - start) * 1000
+        return np.stack(outputs).astype(np.float32), latencies, batch_ms
+
+    def handle(self, *args, **options):
+        """
+        Load each variant, time single-sample and batched calls, and compare outputs
+        """
+        import tensorflow as tf  # Import up front so TF startup is not charged to one model
+
+        batch = self._inputs(options)
+        self.stdout.write(f"Benchmarking {len(batch)} inputs, TensorFlow {tf.__version__}")
+
+        report = {'samples': len(batch), 'spectrograms': options['spectrograms'], 'models': {}}
+        for name in options['models']:
+            keras_path = model_registry.model_path(name)
+            reference = None
+            report['models'][name] = {}
+
+            for variant in options['variants']:
+                rss_before = _current_rss_bytes()
+                start = time.perf_counter()
+                try:
+                    model, path = _load_variant(keras_path, variant)
+                except Exception as e:
+                    self.stderr.write(f"{name} [{variant}]: could not load ({e})")
+                    continue
+                load_ms = (time.perf_counter() - start) * 1000
+
+                outputs, latencies, batch_ms = self._benchmark(model, batch)
+                row = {
+                    'file_bytes': os.path.getsize(path),
+                    'load_ms': round(load_ms, 2),
+                    'rss_delta_bytes': max(0, _current_rss_bytes() - rss_before),
+                    'latency_mean_ms': round(float(np.mean(latencies)), 3),
+                    'latency_p50_ms': round(float(np.percentile(latencies, 50)), 3),
+                    'latency_p95_ms': round(float(np.percentile(latencies, 95)), 3),
+                    'batch_ms': round(batch_ms, 3),
+                }
+                line = (
+                    f"{name} [{variant}]: {row['file_bytes'] / 1024:.0f} KiB, load {load_ms:.0f} ms, "
+                    f"RSS +{row['rss_delta_bytes'] / (1024 * 1024):.1f} MiB, "
+                    f"latency mean {row['latency_mean_ms']:.2f} ms / p50 {row['latency_p50_ms']:.2f} ms / "
+                    f"p95 {row['latency_p95_ms']:.2f} ms, batch of {len(batch)} {batch_ms:.1f} ms"
+                )
+
+                if variant == 'keras':
+                    reference = outputs
+                elif reference is not None:
+                    reference_preds = [interpret_prediction(r) for r in reference]
+                    variant_preds = [interpret_prediction(o) for o in outputs]
+                    row['agreement'] = float(np.mean([
+                        a[0] == b[0] for a, b in zip(reference_preds, variant_preds)
+                    ]))
+                    row['confidence_mae'] = float(np.mean([
+                        abs(a[1] - b[1]) for a, b in zip(reference_preds, variant_preds)
+                    ]))
+                    row['output_max_abs_diff'] = float(np.max(np.abs(reference - outputs)))
+                    line += (
+                        f", agreement {row['agreement'] * 100:.1f}%, "
+                        f"confidence MAE {row['confidence_mae']:.4f}, "
+                        f"max |diff| {row['output_max_abs_diff']:.4f}"
+                    )
+
+                report['models'][name][variant] = row
+                self.stdout.write(line)
+                del model
+
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['report']}")
+
+        self.stdout.write(self.style.SUCCESS('Predictor benchmark completed'))
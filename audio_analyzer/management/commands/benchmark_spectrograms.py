@@ -0,0 +1,146 @@
+import json
+import time
+import logging
+import numpy as np
+import librosa
+from django.core.management.base import BaseCommand
+from audio_analyzer.spectrogram_renderer import (
+    SpectrogramRenderer,
+    draw_spectrogram_figure,
+    encode_image
+)
+from audio_analyzer.spectrogram_utils import compute_spectrogram_db, rgb_to_model_input
+
+logger = logging.getLogger(__name__)
+
+def _timed(function, repeats):
+    """
+    Call function repeats times
+
+    :return: (last result, per-call latencies in ms)
+    """
+    latencies = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return result, latencies
+
+class Command(BaseCommand):
+    help = 'Compare the lookup-table spectrogram renderer with the matplotlib rendering'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--audio',
+            type=str,
+            default=None,
+            help='Audio file to render (default: 10 seconds of synthetic hive-like audio)'
+        )
+        parser.add_argument(
+            '--sample-rate',
+            type=int,
+            default=22050,
+            help='Sample rate for synthetic audio (default: 22050)'
+        )
+        parser.add_argument(
+            '--figsize',
+            type=float,
+            nargs=2,
+            default=[10, 4],
+            help='Figure size in inches (default: 10 4)'
+        )
+        parser.add_argument(
+            '--repeats',
+            type=int,
+            default=10,
+            help='Renders per variant (default: 10)'
+        )
+        parser.add_argument(
+            '--report',
+            type=str,
+            default=None,
+            help='Also write the results as JSON to this path'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Render the same spectrogram both ways, time render and encode, and compare pixels
+        """
+        if options['audio']:
+            samples, sample_rate = librosa.load(options['audio'], sr=None, mono=True)
+        else:
+            sample_rate = options['sample_rate']
+            t = np.arange(10 * sample_rate) / sample_rate
+            rng = np.random.default_rng(0)
+            samples = (0.3 * np.sin(2 * np.pi * 250 * t) + 0.05 * rng.standard_normal(t.size)).astype(np.float32)
+
+        spectrogram_db = compute_spectrogram_db(samples)
+        figsize = tuple(options['figsize'])
+        repeats = max(1, options['repeats'])
+        title = 'Spectrogram'
+
+        def render_matplotlib():
+            fig, canvas, _, _ = draw_spectrogram_figure(spectrogram_db, sample_rate, title, figsize)
+            canvas.draw()
+            return np.asarray(canvas.buffer_rgba())[..., :3].copy()
+
+        renderer = SpectrogramRenderer()
+
+        def render_fast():
+            return renderer.render(spectrogram_db, sample_rate, title, figsize)
+
+        reference, matplotlib_ms = _timed(render_matplotlib, repeats)
+        # First call draws and caches the overlay
+        _, first_ms = _timed(render_fast, 1)
+        rgb, fast_ms = _timed(render_fast, repeats)
+        _, plain_ms = _timed(lambda: renderer.render(spectrogram_db, axes=False), repeats)
+        _, png_ms = _timed(lambda: encode_image(rgb, 'PNG'), repeats)
+        webp, webp_ms = _timed(lambda: encode_image(rgb, 'WEBP', quality=90), repeats)
+        png = encode_image(rgb, 'PNG')
+
+        diff = np.abs(reference.astype(np.int16) - rgb.astype(np.int16))
+        input_diff = np.abs(rgb_to_model_input(reference) - rgb_to_model_input(rgb))
+
+        report = {
+            'spectrogram_shape': list(spectrogram_db.shape),
+            'image_shape': list(rgb.shape),
+            'matplotlib_ms': round(float(np.median(matplotlib_ms)), 2),
+            'fast_first_ms': round(first_ms[0], 2),
+            'fast_ms': round(float(np.median(fast_ms)), 2),
+            'plain_ms': round(float(np.median(plain_ms)), 2),
+            'png_encode_ms': round(float(np.median(png_ms)), 2),
+            'webp_encode_ms': round(float(np.median(webp_ms)), 2),
+            'png_bytes': len(png),
+            'webp_bytes': len(webp),
+            'pixels_different': float(np.mean(diff.max(axis=-1) > 0)),
+            'pixel_max_abs_diff': int(diff.max()),
+            'model_input_max_abs_diff': float(input_diff.max())
+        }
+
+        self.stdout.write(
+            f"Spectrogram {spectrogram_db.shape[0]}x{spectrogram_db.shape[1]} -> image {rgb.shape[1]}x{rgb.shape[0]}, "
+            f"{repeats} renders each (median)"
+        )
+        self.stdout.write(f"  matplotlib: {report['matplotlib_ms']:.1f} ms")
+        self.stdout.write(
+            f"  lookup table: {report['fast_ms']:.1f} ms (first call with overlay {report['fast_first_ms']:.1f} ms), "
+            f"{report['matplotlib_ms'] / max(report['fast_ms'], 1e-6):.1f}x faster"
+        )
+        self.stdout.write(f"  lookup table without axes: {report['plain_ms']:.2f} ms")
+        self.stdout.write(
+            f"  encode: PNG {report['png_encode_ms']:.1f} ms ({report['png_bytes'] / 1024:.0f} KiB), "
+            f"WebP {report['webp_encode_ms']:.1f} ms ({report['webp_bytes'] / 1024:.0f} KiB)"
+        )
+        self.stdout.write(
+            f"  pixels different: {report['pixels_different'] * 100:.2f}%, "
+            f"max |diff| {report['pixel_max_abs_diff']}/255, "
+            f"model input max |diff| {report['model_input_max_abs_diff']:.4f}"
+        )
+
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['report']}")
+
+        self.stdout.write(self.style.SUCCESS('Spectrogram renderer benchmark completed'))
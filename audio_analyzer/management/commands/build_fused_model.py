@@ -0,0 +1,215 @@
+import os
+import random
+import logging
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from audio_analyzer.inference import FUSEDpredictor, PREDICTOR_SPECS, interpret_prediction
+from audio_analyzer.model_registry import model_registry
+from audio_analyzer.model_versions import publish_model_version
+from audio_analyzer.retraining import get_retraining_queue
+from audio_analyzer.spectrogram_utils import load_spectrogram_batch
+from audio_analyzer.tflite_utils import CALIBRATION_GLOB, find_spectrograms
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Build the fused multi-head model (one shared backbone, a head per predictor) from the trained models'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backbone',
+            choices=[spec['model'] for spec in PREDICTOR_SPECS],
+            default=PREDICTOR_SPECS[0]['model'],
+            help='Model whose layers become the shared backbone; its own head is kept as is (default: BNB)'
+        )
+        parser.add_argument(
+            '--spectrograms',
+            type=str,
+            default=CALIBRATION_GLOB,
+            help=f'Archived spectrograms to distill on, relative to MEDIA_ROOT (default: {CALIBRATION_GLOB})'
+        )
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=500,
+            help='Maximum number of archived spectrograms to train on (default: 500)'
+        )
+        parser.add_argument(
+            '--epochs',
+            type=int,
+            default=5,
+            help='Epochs training the heads on a frozen backbone (default: 5)'
+        )
+        parser.add_argument(
+            '--fine-tune-epochs',
+            type=int,
+            default=0,
+            help='Further epochs with the backbone unfrozen at a tenth of the learning rate (default: 0)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=32,
+            help='Training batch size (default: 32)'
+        )
+        parser.add_argument(
+            '--learning-rate',
+            type=float,
+            default=0.001,
+            help='Adam learning rate (default: 0.001)'
+        )
+        parser.add_argument(
+            '--feedback-weight',
+            type=float,
+            default=3.0,
+            help='Sample weight of user feedback labels relative to distilled targets (default: 3.0)'
+        )
+
+    def _build(self, teachers, backbone_name):
+        """
+        Return (training model with one output per head, serving model with a single concatenated output, head layout)
+        """
+        import tensorflow as tf
+
+        source = teachers[backbone_name]
+        backbone = tf.keras.Model(source.inputs, source.layers[-1].input, name='backbone')
+
+        inputs = tf.keras.Input(shape=source.input_shape[1:], name='spectrogram')
+        features = backbone(inputs)
+
+        outputs = []
+        layout = {}
+        column = 0
+        for name, teacher in teachers.items():
+            last_layer = teacher.layers[-1]
+            units = int(teacher.output_shape[-1])
+            if name == backbone_name:
+                # The backbone's own classifier works on these features unchanged
+                config = dict(last_layer.get_config(), name=name)
+                head = last_layer.__class__.from_config(config)
+                output = head(features)
+                head.set_weights(last_layer.get_weights())
+            else:
+                activation = last_layer.get_config().get('activation', 'softmax' if units > 1 else 'sigmoid')
+                hidden = tf.keras.layers.Dense(64, activation='relu', name=f'{name}_hidden')(features)
+                output = tf.keras.layers.Dense(units, activation=activation, name=name)(hidden)
+            outputs.append(output)
+            layout[name] = [column, column + units]
+            column += units
+
+        training_model = tf.keras.Model(inputs, outputs, name='fused_training')
+        serving_model = tf.keras.Model(inputs, tf.keras.layers.Concatenate(name='heads')(outputs), name='fused')
+        return training_model, serving_model, backbone, layout
+
+    def _targets(self, teachers, inputs, paths, feedback, feedback_weight):
+        """
+        Distill each teacher's predictions, replacing them with feedback labels where available
+        """
+        targets, weights = [], []
+        index = {path: i for i, path in enumerate(paths)}
+        for name, teacher in teachers.items():
+            target = np.asarray(teacher.predict(inputs, batch_size=32, verbose=0), dtype=np.float32)
+            weight = np.ones(len(inputs), dtype=np.float32)
+            for model_name, path, label in feedback:
+                if model_name != name or path not in index:
+                    continue
+                row = index[path]
+                if target.shape[1] > 1:
+                    target[row] = np.eye(target.shape[1], dtype=np.float32)[label]
+                else:
+                    target[row] = label
+                weight[row] = feedback_weight
+            targets.append(target)
+            weights.append(weight)
+        return targets, weights
+
+    def _agreement(self, serving_model, layout, inputs, teacher_outputs):
+        """
+        Fraction of held-out spectrograms where each head predicts the same class as its teacher
+        """
+        if len(inputs) == 0:
+            return {}
+        fused_output = np.asarray(serving_model.predict(inputs, batch_size=32, verbose=0))
+        agreement = {}
+        for name, teacher_output in teacher_outputs.items():
+            start, end = layout[name]
+            agreement[name] = float(np.mean([
+                interpret_prediction(a)[0] == interpret_prediction(b)[0]
+                for a, b in zip(teacher_output, fused_output[:, start:end])
+            ]))
+        return agreement
+
+    def handle(self, *args, **options):
+        """
+        Distill the BNB, QNQ and TOOT models into one multi-head model and publish it
+        """
+        import tensorflow as tf
+
+        teachers = {}
+        for spec in PREDICTOR_SPECS:
+            teacher = model_registry.get(spec['model'], backend='keras')
+            if teacher is None:
+                raise CommandError(f"Could not load the {spec['model']} model")
+            teachers[spec['model']] = teacher
+
+        # Archived spectrograms (calibration split) plus every spectrogram with feedback
+        paths = find_spectrograms(options['spectrograms'], split='calibration')
+        if len(paths) > options['samples']:
+            paths = sorted(random.Random(0).sample(paths, options['samples']))
+        feedback = [item for item in get_retraining_queue().feedback_labels() if os.path.exists(item[1])]
+        paths += sorted({path for _, path, _ in feedback} - set(paths))
+        if not paths:
+            raise CommandError(f"No spectrograms match {options['spectrograms']} and no feedback is stored")
+        self.stdout.write(f"Training on {len(paths)} spectrograms ({len(feedback)} feedback labels)")
+
+        inputs = load_spectrogram_batch(paths)
+        targets, weights = self._targets(teachers, inputs, paths, feedback, options['feedback_weight'])
+
+        # Teacher outputs on held-out spectrograms, taken before fine-tuning can touch the shared layers
+        holdout = find_spectrograms(options['spectrograms'], split='holdout')[:options['samples']]
+        holdout_inputs = load_spectrogram_batch(holdout)
+        holdout_outputs = {
+            name: np.asarray(teacher.predict(holdout_inputs, batch_size=32, verbose=0))
+            for name, teacher in teachers.items()
+        } if holdout else {}
+
+        training_model, serving_model, backbone, layout = self._build(teachers, options['backbone'])
+        losses = [
+            'categorical_crossentropy' if target.shape[1] > 1 else 'binary_crossentropy'
+            for target in targets
+        ]
+
+        backbone.trainable = False
+        training_model.compile(optimizer=tf.keras.optimizers.Adam(options['learning_rate']), loss=losses)
+        training_model.fit(
+            inputs, targets, sample_weight=weights,
+            epochs=options['epochs'], batch_size=options['batch_size'], shuffle=True, verbose=2
+        )
+
+        if options['fine_tune_epochs'] > 0:
+            backbone.trainable = True
+            training_model.compile(optimizer=tf.keras.optimizers.Adam(options['learning_rate'] / 10), loss=losses)
+            training_model.fit(
+                inputs, targets, sample_weight=weights,
+                epochs=options['fine_tune_epochs'], batch_size=options['batch_size'], shuffle=True, verbose=2
+            )
+
+        agreement = self._agreement(serving_model, layout, holdout_inputs, holdout_outputs)
+        for name, value in agreement.items():
+            self.stdout.write(f"{name}: {value * 100:.1f}% agreement with the single-task model on {len(holdout)} held-out spectrograms")
+
+        manifest = publish_model_version(
+            FUSEDpredictor.model_path, model=serving_model, source='build_fused_model',
+            metadata={
+                'heads': layout,
+                'backbone': options['backbone'],
+                'teacher_versions': {name: model_registry.model_version(name, 'keras') for name in teachers},
+                'training_samples': len(paths),
+                'feedback_labels': len(feedback),
+                'holdout_agreement': agreement
+            }
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Fused model {manifest['version']} published to {FUSEDpredictor.model_path}; "
+            f"set PREDICTOR_FUSED=True to serve it"
+        ))
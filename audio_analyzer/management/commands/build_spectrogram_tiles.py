@@ -0,0 +1,76 @@
+import os
+import time
+import logging
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from audio_analyzer.spectrogram_tiles import ensure_tile_pyramid, tile_root
+from audio_analyzer.views import RECORDING_EXTENSIONS, find_recording
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Build the zoomable spectrogram tile pyramids of stored recordings ahead of viewing'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'recordings',
+            nargs='*',
+            help='Recording ids: audio paths under MEDIA_ROOT without extension (e.g. recordings/hive-1/2025-03-13/15/3f2a9c1e7b4d8a60)'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Tile every recording under MEDIA_ROOT'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild pyramids that are already up to date'
+        )
+
+    def _all_recordings(self):
+        media_root = str(settings.MEDIA_ROOT)
+        # Tiles and cached images hold no recordings
+        skip = {os.path.realpath(tile_root()),
+                os.path.realpath(str(getattr(settings, 'SPECTROGRAM_CACHE_DIR', os.path.join(media_root, 'spectrogram_cache'))))}
+        recording_ids = []
+        for directory, subdirectories, files in os.walk(media_root):
+            subdirectories[:] = [d for d in subdirectories if os.path.realpath(os.path.join(directory, d)) not in skip]
+            for name in files:
+                stem, extension = os.path.splitext(name)
+                if extension in RECORDING_EXTENSIONS:
+                    relative = os.path.relpath(os.path.join(directory, stem), media_root)
+                    recording_ids.append(relative.replace(os.sep, '/'))
+        return sorted(recording_ids)
+
+    def handle(self, *args, **options):
+        """
+        Build (or refresh) the pyramid of each recording
+        """
+        recording_ids = self._all_recordings() if options['all'] else options['recordings']
+        if not recording_ids:
+            raise CommandError('Name at least one recording or pass --all')
+
+        failed = 0
+        for recording_id in recording_ids:
+            audio_path = find_recording(recording_id)
+            if audio_path is None:
+                self.stderr.write(f"{recording_id}: recording not found")
+                failed += 1
+                continue
+            start = time.perf_counter()
+            try:
+                manifest = ensure_tile_pyramid(recording_id, audio_path, force=options['force'])
+            except Exception as e:
+                logger.error(f"Tile pyramid build failed for {recording_id}: {e}")
+                self.stderr.write(f"{recording_id}: {e}")
+                failed += 1
+                continue
+            self.stdout.write(
+                f"{recording_id}: {manifest['duration']:.1f} s, {len(manifest['levels'])} levels "
+                f"({time.perf_counter() - start:.1f} s)"
+            )
+
+        if failed:
+            raise CommandError(f"{failed} recording(s) could not be tiled")
+        self.stdout.write(self.style.SUCCESS(f"Tiled {len(recording_ids)} recording(s)"))
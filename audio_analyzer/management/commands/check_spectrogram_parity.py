@@ -0,0 +1,90 @@
+import os
+import time
+import logging
+import tempfile
+import numpy as np
+import librosa
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from audio_analyzer.spectrogram_utils import (
+    compute_spectrogram_db,
+    save_spectrogram_image,
+    spectrogram_to_model_input,
+)
+
+# The fast renderer only differs from matplotlib on anti-aliased spine edges
+DEFAULT_TOLERANCE = 3 / 255
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Check that the fast in-memory spectrogram tensor matches the matplotlib PNG render + decode path'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--audio',
+            type=str,
+            default=None,
+            help='WAV file to render (default: 5 seconds of synthetic hive-like audio)'
+        )
+        parser.add_argument(
+            '--sample-rate',
+            type=int,
+            default=44100,
+            help='Sample rate for synthetic audio (default: 44100)'
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=DEFAULT_TOLERANCE,
+            help=f'Maximum allowed absolute difference per pixel (default: 3/255 = {DEFAULT_TOLERANCE:.4f})'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Render the same audio through both paths and compare the model inputs
+
+        The reference is always drawn by matplotlib, whatever
+        SPECTROGRAM_RENDERER is set to, and the in-memory input by the fast
+        lookup-table renderer.
+        """
+        from tensorflow.keras.preprocessing import image
+
+        if options['audio']:
+            samples, sample_rate = librosa.load(options['audio'], sr=None, mono=True)
+        else:
+            sample_rate = options['sample_rate']
+            t = np.arange(5 * sample_rate) / sample_rate
+            rng = np.random.default_rng(0)
+            samples = 0.3 * np.sin(2 * np.pi * 250 * t) + 0.05 * rng.standard_normal(t.size)
+
+        spectrogram_db = compute_spectrogram_db(samples)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            png_path = os.path.join(tmp_dir, 'parity_spectrogram.png')
+
+            # Original path: render PNG with matplotlib, then decode like the predictors do
+            start = time.perf_counter()
+            with override_settings(SPECTROGRAM_RENDERER='matplotlib'):
+                save_spectrogram_image(spectrogram_db, sample_rate, 'Spectrogram', png_path)
+            img = image.load_img(png_path, target_size=(224, 224))
+            png_input = np.expand_dims(image.img_to_array(img), axis=0) / 255.0
+            png_ms = (time.perf_counter() - start) * 1000
+
+        # In-memory path with the lookup-table renderer
+        start = time.perf_counter()
+        with override_settings(SPECTROGRAM_RENDERER='fast'):
+            memory_input = spectrogram_to_model_input(spectrogram_db, sample_rate, 'Spectrogram')
+        memory_ms = (time.perf_counter() - start) * 1000
+
+        if png_input.shape != memory_input.shape:
+            raise CommandError(f"Shape mismatch: PNG {png_input.shape} vs in-memory {memory_input.shape}")
+
+        max_diff = float(np.max(np.abs(png_input - memory_input)))
+        self.stdout.write(f"PNG path: {png_ms:.1f} ms, in-memory path: {memory_ms:.1f} ms")
+        self.stdout.write(f"Max absolute difference: {max_diff}")
+
+        if max_diff > options['tolerance']:
+            raise CommandError(f"Parity check failed: {max_diff} > {options['tolerance']}")
+
+        self.stdout.write(self.style.SUCCESS('Spectrogram tensor parity check passed'))
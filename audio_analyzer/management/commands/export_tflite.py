@@ -0,0 +1,100 @@
+import os
+import logging
+from django.core.management.base import BaseCommand, CommandError
+from audio_analyzer.inference import PREDICTOR_SPECS
+from audio_analyzer.model_registry import model_registry
+from audio_analyzer.tflite_utils import (
+    CALIBRATION_GLOB, QUANTIZATION_MODES, QUANTIZATION_SUFFIXES,
+    convert_keras_to_tflite, load_calibration_batch, tflite_path_for
+)
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Convert training_models/*_model.keras to .tflite for the TFLite predictor backend'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--models', 
+            nargs='+', 
+            default=[spec['model'] for spec in PREDICTOR_SPECS], 
+            help='Models to export (default: BNB QNQ TOOT)'
+        )
+        parser.add_argument(
+            '--quantize', 
+            choices=QUANTIZATION_MODES, 
+            default='none', 
+            help='Post-training quantization: none, dynamic (int8 weights), float16 or int8 (full integer) (default: none)'
+        )
+        parser.add_argument(
+            '--calibration', 
+            type=str, 
+            default=CALIBRATION_GLOB, 
+            help=f'Spectrogram glob used to calibrate int8 models, relative to MEDIA_ROOT (default: {CALIBRATION_GLOB})'
+        )
+        parser.add_argument(
+            '--calibration-samples', 
+            type=int, 
+            default=200, 
+            help='Maximum number of calibration spectrograms (default: 200)'
+        )
+        parser.add_argument(
+            '--output-dir', 
+            type=str, 
+            default=None, 
+            help='Directory for .tflite copies to inspect or deploy elsewhere. The registry only '
+                 'serves (and re-exports on publish) files next to each .keras file, the default'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Export each requested model and report the file sizes
+        """
+        calibration_data = None
+        if options['quantize'] == 'int8':
+            calibration_data = load_calibration_batch(options['calibration'], options['calibration_samples'])
+            if len(calibration_data) == 0:
+                raise CommandError(f"No calibration spectrograms match {options['calibration']}")
+            self.stdout.write(f"Calibrating int8 models with {len(calibration_data)} spectrograms")
+
+        if options['output_dir']:
+            self.stdout.write(self.style.WARNING(
+                f"Writing to {options['output_dir']}: these files are not served by PREDICTOR_BACKEND "
+                f"and are not refreshed when a new model version is published"
+            ))
+
+        failures = []
+        for name in options['models']:
+            if name not in model_registry.registered_names():
+                raise CommandError(f"Unknown model '{name}', expected one of {model_registry.registered_names()}")
+
+            keras_path = model_registry.model_path(name)
+            if not os.path.exists(keras_path):
+                self.stderr.write(f"{name}: model file not found at {keras_path}")
+                failures.append(name)
+                continue
+
+            output_path = tflite_path_for(keras_path, QUANTIZATION_SUFFIXES.get(options['quantize'], ''))
+            if options['output_dir']:
+                os.makedirs(options['output_dir'], exist_ok=True)
+                output_path = os.path.join(options['output_dir'], os.path.basename(output_path))
+
+            try:
+                convert_keras_to_tflite(
+                    keras_path, output_path,
+                    quantization=options['quantize'],
+                    calibration_data=calibration_data
+                )
+            except Exception as e:
+                logger.error(f"TFLite export failed for {name}: {e}", exc_info=True)
+                failures.append(name)
+                continue
+
+            self.stdout.write(
+                f"{name}: {os.path.getsize(keras_path) / 1024:.1f} KiB -> "
+                f"{os.path.getsize(output_path) / 1024:.1f} KiB ({output_path})"
+            )
+
+        if failures:
+            raise CommandError(f"Export failed for: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS('TFLite export completed'))
@@ -0,0 +1,71 @@
+import os
+import glob
+import json
+import logging
+from django.core.management.base import BaseCommand, CommandError
+from audio_analyzer.inference import PREDICTOR_SPECS
+from audio_analyzer.model_registry import model_registry
+from audio_analyzer.model_versions import publish_model_version, read_current, versions_dir
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Publish a new version of a predictor model, roll back to an earlier one, or list versions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'model', 
+            choices=[spec['model'] for spec in PREDICTOR_SPECS], 
+            help='Model to publish'
+        )
+        group = parser.add_mutually_exclusive_group(required=True)
+        group.add_argument(
+            '--file', 
+            type=str, 
+            help='Trained .keras file to publish as the next version'
+        )
+        group.add_argument(
+            '--rollback', 
+            type=str, 
+            metavar='VERSION', 
+            help='Republish an earlier version (e.g. v0003) as the next version'
+        )
+        group.add_argument(
+            '--list', 
+            action='store_true', 
+            help='List published versions'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Running workers pick the new version up within MODEL_RELOAD_INTERVAL_SECONDS
+        """
+        model_path = model_registry.model_path(options['model'])
+        stem = os.path.splitext(os.path.basename(model_path))[0]
+
+        if options['list']:
+            current = read_current(model_path)
+            for manifest_path in sorted(glob.glob(os.path.join(versions_dir(model_path), f"{stem}.v*.manifest.json"))):
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+                marker = '*' if current and current['version'] == manifest['version'] else ' '
+                self.stdout.write(
+                    f"{marker} {manifest['version']}  {manifest['sha256'][:12]}  "
+                    f"{manifest['size_bytes'] / 1024:.0f} KiB  {manifest['source']}"
+                )
+            return
+
+        if options['file']:
+            source_path = options['file']
+            source = f"file {os.path.basename(source_path)}"
+        else:
+            source_path = os.path.join(versions_dir(model_path), f"{stem}.{options['rollback']}.keras")
+            source = f"rollback to {options['rollback']}"
+
+        if not os.path.exists(source_path):
+            raise CommandError(f"Model file not found: {source_path}")
+
+        manifest = publish_model_version(model_path, source_path=source_path, source=source)
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['model']} {manifest['version']} published ({manifest['sha256'][:12]}, {source})"
+        ))
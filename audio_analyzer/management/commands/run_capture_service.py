@@ -0,0 +1,89 @@
+import time
+import logging
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from audio_analyzer.audio_capture import CaptureService, configured_hives, hive_buffer_path
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Record continuously into the shared audio buffer read by the web workers and the hourly analysis'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', 
+            type=str, 
+            default=None, 
+            help='Buffer file (default: settings.AUDIO_CAPTURE_SHARED_PATH)'
+        )
+        parser.add_argument(
+            '--device', 
+            type=int, 
+            default=None, 
+            help='Audio input device index (default: settings.AUDIO_CAPTURE_DEVICE)'
+        )
+        parser.add_argument(
+            '--sample-rate', 
+            type=int, 
+            default=None, 
+            help='Sample rate (default: settings.AUDIO_CAPTURE_SAMPLE_RATE)'
+        )
+        parser.add_argument(
+            '--channels', 
+            type=int, 
+            default=None, 
+            help='Number of audio channels (default: settings.AUDIO_CAPTURE_CHANNELS)'
+        )
+        parser.add_argument(
+            '--buffer-seconds', 
+            type=float, 
+            default=None, 
+            help='Seconds of audio kept (default: settings.AUDIO_CAPTURE_BUFFER_SECONDS)'
+        )
+        parser.add_argument(
+            '--hives', 
+            action='store_true', 
+            help='Capture every hive in settings.HIVE_DEVICES, each device into its own buffer'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Own the input device and keep the shared buffer filled until interrupted
+        """
+        path = options['path'] or getattr(settings, 'AUDIO_CAPTURE_SHARED_PATH', '')
+        if not path:
+            raise CommandError('Set AUDIO_CAPTURE_SHARED_PATH or pass --path')
+
+        # Buffer file -> input device; every device gets its own input stream
+        if options['hives']:
+            targets = {hive_buffer_path(path, hive_id): device for hive_id, device in configured_hives().items()}
+            if not targets:
+                raise CommandError('No hives configured; set HIVE_DEVICES')
+        else:
+            device = options['device'] if options['device'] is not None else getattr(settings, 'AUDIO_CAPTURE_DEVICE', None)
+            targets = {path: device}
+
+        services = []
+        for buffer_path, device in targets.items():
+            service = CaptureService(
+                device=device,
+                sample_rate=options['sample_rate'] or getattr(settings, 'AUDIO_CAPTURE_SAMPLE_RATE', 44100),
+                channels=options['channels'] or getattr(settings, 'AUDIO_CAPTURE_CHANNELS', 1),
+                buffer_seconds=options['buffer_seconds'] or getattr(settings, 'AUDIO_CAPTURE_BUFFER_SECONDS', 300),
+                shared_path=buffer_path
+            )
+            service.start()
+            services.append(service)
+            self.stdout.write(self.style.SUCCESS(f'Capturing device {device} into {buffer_path}'))
+
+        try:
+            while True:
+                time.sleep(60)
+                for service in services:
+                    status = service.status()
+                    logger.info(f"Capture buffer {service.shared_path}: {status['buffered_seconds']}s buffered, "
+                                f"{status['overflows']} overflow(s)")
+        except KeyboardInterrupt:
+            for service in services:
+                service.stop()
+            self.stdout.write('Capture service stopped')
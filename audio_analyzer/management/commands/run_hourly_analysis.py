@@ -1,11 +1,22 @@
-import os
+import json
 import logging
 import sounddevice as sd
-import soundfile as sf
 import numpy as np
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from audio_analyzer.views import analyze_audio
+from audio_analyzer.inference import run_predictors
+from audio_analyzer.audio_features import compute_spectral_features
+from audio_analyzer.audio_capture import configured_hives, get_capture_service, record_hives
+from audio_analyzer.recording_store import get_recording_store
+from audio_analyzer.spectrogram_utils import (
+    compute_spectrogram_db,
+    compute_stft_magnitude,
+    compute_window_spectrograms_db,
+    decimate,
+    spectrogram_to_model_input,
+    windows_to_model_inputs
+)
 from django.http import HttpRequest
 
 logger = logging.getLogger(__name__)
@@ -38,6 +49,149 @@ class Command(BaseCommand):
             default=1, 
             help='Number of audio channels (default: 1)'
         )
+        parser.add_argument(
+            '--window-seconds',
+            type=float,
+            default=None,
+            help='Analyse the recording in windows of this length; 0 analyses it as one spectrogram '
+                 '(default: settings.ANALYSIS_WINDOW_SECONDS)'
+        )
+        parser.add_argument(
+            '--hop-seconds',
+            type=float,
+            default=None,
+            help='Distance between window starts (default: settings.ANALYSIS_WINDOW_HOP_SECONDS)'
+        )
+        parser.add_argument(
+            '--hive',
+            action='append',
+            default=None,
+            help='Hive id from settings.HIVE_DEVICES to analyse (repeatable; default: every configured hive)'
+        )
+
+    def _model_inputs(self, samples, sample_rate, window_seconds, hop_seconds):
+        """
+        Build the model inputs in memory
+
+        :return: (input batch, window spans or None, spectral features)
+        """
+        samples, sample_rate = decimate(samples, sample_rate, getattr(settings, 'ANALYSIS_SAMPLE_RATE', 0))
+        # One STFT of the clip feeds the spectrogram(s) and the spectral features
+        magnitude = compute_stft_magnitude(samples)
+        features = compute_spectral_features(samples, sample_rate, magnitude=magnitude)
+        if window_seconds > 0:
+            windows_db, windows = compute_window_spectrograms_db(
+                samples, sample_rate, window_seconds, hop_seconds, magnitude=magnitude
+            )
+            logger.info(f"Analysing {len(windows)} window(s) of {window_seconds} seconds")
+            return windows_to_model_inputs(windows_db, sample_rate), windows, features
+        input_batch = spectrogram_to_model_input(
+            compute_spectrogram_db(samples, magnitude=magnitude), sample_rate, 'Spectrogram'
+        )
+        return input_batch, None, features
+
+    def _analyze(self, input_batch, windows, features=None, hive_id=None, predictions=None, recording=None):
+        """
+        Run analyze_audio on in-memory inputs and log its results
+        """
+        # Create a mock HttpRequest for the analyze_audio function
+        request = HttpRequest()
+        request.method = 'POST'
+        request._body = json.dumps({'spectrograms': []}).encode('utf-8')
+
+        # Perform analysis
+        response = analyze_audio(
+            request, input_arrays=[input_batch], windows=windows, hive_id=hive_id,
+            predictions=predictions, features=features, recording=recording
+        )
+
+        # Log analysis results
+        if hasattr(response, 'content'):
+            logger.info(f"Hourly analysis completed successfully{f' for hive {hive_id}' if hive_id else ''}")
+            
+            # Parse and log the response content for more details
+            response_data = {}
+            try:
+                response_data = json.loads(response.content.decode('utf-8'))
+                analysis_results = response_data.get('analysis_results', {})
+                
+                # Log specific details from the response
+                logger.info("Analysis Details:")
+                for predictor in ['BNQ', 'QNQ', 'TOOT']:
+                    if predictor in analysis_results:
+                        result = analysis_results[predictor]
+                        logger.info(f"{predictor} Prediction:")
+                        logger.info(f"  Predicted Class: {result.get('predicted_class', 'N/A')}")
+                        logger.info(f"  Confidence: {result.get('confidence', 'N/A')}%")
+                        logger.info(f"  Label: {result.get('label', 'N/A')}")
+                        aggregate = result.get('aggregate')
+                        if aggregate:
+                            logger.info(
+                                f"  Windows: {aggregate['windows']}, "
+                                f"Max: {aggregate['max'] * 100:.1f}%, "
+                                f"Mean: {aggregate['mean'] * 100:.1f}%, "
+                                f"Positive: {aggregate['fraction_positive'] * 100:.0f}%"
+                            )
+            except Exception as parse_error:
+                logger.warning(f"Could not parse response content: {parse_error}")
+            
+            # Verify Blynk and Discord notification status
+            if 'blynk_notification_sent' in response_data:
+                logger.info("Blynk Notification: Sent Successfully")
+            else:
+                logger.warning("Blynk Notification: Not Sent")
+            
+            if 'discord_notification_sent' in response_data:
+                logger.info("Discord Notification: Sent Successfully")
+            else:
+                logger.warning("Discord Notification: Not Sent")
+        
+        else:
+            logger.warning("Hourly analysis did not return a valid response")
+
+    def _analyze_hives(self, hives, duration, sample_rate, window_seconds, hop_seconds):
+        """
+        Record every hive at once, predict all their inputs as one batch and report each hive
+        """
+        logger.info(f"Recording {len(hives)} hive(s) for {duration} seconds: {', '.join(hives)}")
+        clips = record_hives(duration, sample_rate, hives)
+        for hive_id in hives:
+            if hive_id not in clips:
+                logger.error(f"No audio recorded for hive {hive_id}")
+
+        # Save each hive's clip and build its inputs
+        inputs = {}
+        records = {}
+        store = get_recording_store()
+        for hive_id, (samples, clip_rate) in clips.items():
+            records[hive_id] = store.add(samples, clip_rate, hive=hive_id)
+            audio_path = store.path(records[hive_id]['audio_path'])
+            logger.info(f"Hive {hive_id} audio recorded to {audio_path}")
+            inputs[hive_id] = self._model_inputs(samples, clip_rate, window_seconds, hop_seconds)
+        if not inputs:
+            return
+
+        # One shared batch: each model runs once for all hives
+        hive_ids = list(inputs)
+        batch = np.concatenate([inputs[hive_id][0] for hive_id in hive_ids], axis=0)
+        source_names = [
+            f"{hive_id}_window_{i + 1}"
+            for hive_id in hive_ids for i in range(len(inputs[hive_id][0]))
+        ]
+        results = run_predictors(batch, source_names)
+
+        offset = 0
+        for hive_id in hive_ids:
+            input_batch, windows, features = inputs[hive_id]
+            rows = len(input_batch)
+            predictions = {
+                name: result if isinstance(result, Exception) else result[offset:offset + rows]
+                for name, result in results.items()
+            }
+            offset += rows
+            self._analyze(
+                input_batch, windows, features, hive_id=hive_id, predictions=predictions, recording=records[hive_id]
+            )
 
     def handle(self, *args, **options):
         """
@@ -52,13 +206,31 @@ class Command(BaseCommand):
             device = options['device']
             sample_rate = options['sample_rate'] or getattr(settings, 'SAMPLE_RATE', 44100)
             channels = options['channels']
+            window_seconds = options['window_seconds']
+            if window_seconds is None:
+                window_seconds = getattr(settings, 'ANALYSIS_WINDOW_SECONDS', 10)
+            hop_seconds = options['hop_seconds'] or getattr(settings, 'ANALYSIS_WINDOW_HOP_SECONDS', 5)
 
             # Log selected recording parameters
             logger.info(f"Recording Configuration:")
             logger.info(f"  Duration: {duration} seconds")
             logger.info(f"  Sample Rate: {sample_rate} Hz")
             logger.info(f"  Channels: {channels}")
+            if window_seconds > 0:
+                logger.info(f"  Windows: {window_seconds} seconds every {hop_seconds} seconds")
             
+            # One microphone per hive: record them all together
+            hives = configured_hives()
+            if options['hive']:
+                unknown = [hive_id for hive_id in options['hive'] if hive_id not in hives]
+                if unknown:
+                    raise ValueError(f"Unknown hives {unknown}; configured: {list(hives)}")
+                hives = {hive_id: hives[hive_id] for hive_id in options['hive']}
+            if hives and device is None:
+                self._analyze_hives(hives, duration, sample_rate, window_seconds, hop_seconds)
+                self.stdout.write(self.style.SUCCESS('Hourly audio analysis completed'))
+                return
+
             # List available devices if no specific device is selected
             if device is None:
                 devices = sd.query_devices()
@@ -74,74 +246,44 @@ class Command(BaseCommand):
                 except Exception as e:
                     logger.warning(f"Could not select default input device: {e}")
 
-            # Create a mock HttpRequest for the analyze_audio function
-            request = HttpRequest()
-            request.method = 'POST'
-
-            # Create media directory if it doesn't exist
-            os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
-
-            # Generate unique filename for this recording
-            audio_filename = "hourly_recording_.wav"
-            audio_path = os.path.join(settings.MEDIA_ROOT, audio_filename)
+            # Take the last `duration` seconds from the shared capture buffer when
+            # 'manage.py run_capture_service' is running
+            recording = None
+            if getattr(settings, 'AUDIO_CAPTURE_SHARED_PATH', ''):
+                try:
+                    capture = get_capture_service()
+                    if capture is not None:
+                        recording = capture.snapshot(duration, mono=False)
+                        sample_rate = capture.sample_rate
+                        logger.info(f"Using the last {duration} seconds from the shared capture buffer")
+                except Exception as capture_error:
+                    logger.warning(f"Shared capture buffer unavailable, recording directly: {capture_error}")
 
             # Record audio
-            logger.info(f"Recording audio for {duration} seconds")
-            try:
-                recording = sd.rec(
-                    int(duration * sample_rate), 
-                    samplerate=sample_rate, 
-                    channels=channels, 
-                    dtype='float32',
-                    device=device
-                )
-                sd.wait()  # Wait until recording is finished
-                sf.write(audio_path, recording, sample_rate)
-            except Exception as recording_error:
-                logger.error(f"Audio recording failed: {recording_error}")
-                raise
+            if recording is None:
+                logger.info(f"Recording audio for {duration} seconds")
+                try:
+                    recording = sd.rec(
+                        int(duration * sample_rate), 
+                        samplerate=sample_rate, 
+                        channels=channels, 
+                        dtype='float32',
+                        device=device
+                    )
+                    sd.wait()  # Wait until recording is finished
+                except Exception as recording_error:
+                    logger.error(f"Audio recording failed: {recording_error}")
+                    raise
+            store = get_recording_store()
+            record = store.add(recording, sample_rate)
+            audio_path = store.path(record['audio_path'])
 
             logger.info(f"Audio recorded to {audio_path}")
 
-            # Set the audio file in the request
-            request.FILES['audio'] = audio_path
-
-            # Perform analysis
-            response = analyze_audio(request)
-
-            # Log analysis results
-            if hasattr(response, 'content'):
-                logger.info("Hourly analysis completed successfully")
-                
-                # Parse and log the response content for more details
-                try:
-                    import json
-                    response_data = json.loads(response.content.decode('utf-8'))
-                    
-                    # Log specific details from the response
-                    logger.info("Analysis Details:")
-                    for predictor in ['BNQ', 'QNQ', 'TOOT']:
-                        if predictor in response_data:
-                            logger.info(f"{predictor} Prediction:")
-                            logger.info(f"  Predicted Class: {response_data[predictor].get('predicted_class', 'N/A')}")
-                            logger.info(f"  Confidence: {response_data[predictor].get('confidence', 'N/A')}%")
-                            logger.info(f"  Label: {response_data[predictor].get('label', 'N/A')}")
-                except Exception as parse_error:
-                    logger.warning(f"Could not parse response content: {parse_error}")
-                
-                # Verify Blynk and Discord notification status
-                if 'blynk_notification_sent' in response_data:
-                    logger.info("Blynk Notification: Sent Successfully")
-                else:
-                    logger.warning("Blynk Notification: Not Sent")
-                
-                if 'discord_notification_sent' in response_data:
-                    logger.info("Discord Notification: Sent Successfully")
-                else:
-                    logger.warning("Discord Notification: Not Sent")
-            
-            else:
-                logger.warning("Hourly analysis did not return a valid response")
+            # Build the model inputs in memory from a mono mix of the recording
+            samples = recording.mean(axis=1) if recording.ndim > 1 else recording
+            input_batch, windows, features = self._model_inputs(samples, sample_rate, window_seconds, hop_seconds)
+            self._analyze(input_batch, windows, features, recording=record)
 
         except Exception as e:
             logger.error(f"Error during hourly audio analysis: {e}", exc_info=True)
@@ -0,0 +1,39 @@
+import logging
+from django.core.management.base import BaseCommand
+from audio_analyzer.model_server import ModelServer, get_socket_path
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Run the shared model server that owns the BNB, QNQ and TOOT models'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--socket', 
+            type=str, 
+            default=None, 
+            help='Unix socket path (default: settings.MODEL_SERVER_SOCKET)'
+        )
+        parser.add_argument(
+            '--no-warm', 
+            action='store_true', 
+            help='Load models on the first request instead of at startup'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Load the models once and serve predictions until interrupted
+        """
+        server = ModelServer(socket_path=options['socket'] or get_socket_path())
+
+        if not options['no_warm']:
+            from audio_analyzer.model_registry import model_registry
+            logger.info("Warming models before accepting requests")
+            model_registry.warm()
+            self.stdout.write(f"Models loaded: {list(model_registry.status()['models'])}")
+
+        self.stdout.write(self.style.SUCCESS(f'Model server listening on {server.socket_path}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write('Model server stopped')
@@ -0,0 +1,36 @@
+import logging
+from django.core.management.base import BaseCommand
+from audio_analyzer.retraining import get_retraining_queue
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Fine-tune the predictor models on queued feedback labels'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', 
+            action='store_true', 
+            help='Train on every pending label and exit instead of running on a schedule'
+        )
+
+    def handle(self, *args, **options):
+        """
+        Run the retraining worker until interrupted (set RETRAIN_IN_PROCESS=False for the web workers)
+        """
+        retraining_queue = get_retraining_queue()
+
+        if options['once']:
+            trained = retraining_queue.run_once(force=True)
+            self.stdout.write(self.style.SUCCESS(f'Retraining pass completed: {trained}'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Retraining worker running ({retraining_queue.pending_count()} labels pending)'
+        ))
+        retraining_queue.start()
+        try:
+            retraining_queue._worker.join()
+        except KeyboardInterrupt:
+            retraining_queue.stop()
+            self.stdout.write('Retraining worker stopped')
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recording',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hive', models.CharField(max_length=64)),
+                ('recorded_at', models.DateTimeField()),
+                ('duration', models.FloatField(default=0.0)),
+                ('sample_rate', models.PositiveIntegerField(default=0)),
+                ('audio_path', models.CharField(blank=True, max_length=255)),
+                ('audio_sha256', models.CharField(blank=True, max_length=64)),
+                ('spectrogram_path', models.CharField(blank=True, max_length=255)),
+                ('store_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-recorded_at', '-id'],
+                'indexes': [models.Index(fields=['hive', 'recorded_at', 'id'], name='recording_hive_time'), models.Index(fields=['recorded_at', 'id'], name='recording_time')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Prediction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hive', models.CharField(max_length=64)),
+                ('recorded_at', models.DateTimeField()),
+                ('model', models.CharField(max_length=16)),
+                ('predicted_class', models.SmallIntegerField()),
+                ('label', models.CharField(max_length=128)),
+                ('confidence', models.FloatField()),
+                ('skipped', models.BooleanField(default=False)),
+                ('window_start', models.FloatField(blank=True, null=True)),
+                ('window_end', models.FloatField(blank=True, null=True)),
+                ('recording', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='predictions', to='audio_analyzer.recording')),
+            ],
+            options={
+                'ordering': ['-recorded_at', '-id'],
+                'indexes': [models.Index(fields=['hive', 'recorded_at', 'model', 'id'], name='prediction_hive_time_model'), models.Index(fields=['hive', 'model', 'recorded_at', 'id'], name='prediction_hive_model_time'), models.Index(fields=['model', 'recorded_at', 'id'], name='prediction_model_time')],
+            },
+        ),
+        migrations.CreateModel(
+            name='FeatureVector',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hive', models.CharField(max_length=64)),
+                ('recorded_at', models.DateTimeField()),
+                ('spectral_centroid', models.FloatField()),
+                ('spectral_bandwidth', models.FloatField()),
+                ('spectral_rolloff', models.FloatField()),
+                ('dominant_frequency', models.FloatField()),
+                ('mean_frequency', models.FloatField()),
+                ('rms', models.FloatField()),
+                ('band_energies', models.JSONField(default=dict)),
+                ('recording', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='features', to='audio_analyzer.recording')),
+            ],
+            options={
+                'ordering': ['-recorded_at', '-id'],
+                'indexes': [models.Index(fields=['hive', 'recorded_at', 'id'], name='features_hive_time')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audio_analyzer', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recording',
+            name='store_id',
+            field=models.BigIntegerField(blank=True, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,471 @@
+import os
+import gc
+import time
+import logging
+import threading
+
+from .model_versions import manifest_file_path, read_current, sha256_file, verify_manifest
+
+logger = logging.getLogger(__name__)
+
+# Directory holding the trained .keras files
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+TRAINING_MODELS_DIR = os.path.join(project_root, 'training_models')
+
+def _current_rss_bytes():
+    """
+    Return the resident set size of this process in bytes (0 if unknown)
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+            # ru_maxrss is in kilobytes on Linux (peak, not current)
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except Exception:
+            return 0
+
+def _weights_nbytes(model):
+    """
+    Return the total size of a model's weights in bytes
+    """
+    try:
+        if hasattr(model, 'model_path'):
+            # TFLite flatbuffers hold their weights in the file
+            return os.path.getsize(model.model_path)
+        return int(sum(weight.nbytes for weight in model.get_weights()))
+    except Exception:
+        return 0
+
+def _file_version(path):
+    """
+    Return a version tag for a model file (changes whenever it is rewritten)
+    """
+    try:
+        st = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+_file_hashes = {}
+
+def _content_version(path):
+    """
+    Return a version tag from a file's SHA-256 (hashed again only when the file changes)
+    """
+    tag = _file_version(path)
+    if tag is None:
+        return None
+    cached = _file_hashes.get(path)
+    if cached is None or cached[0] != tag:
+        cached = (tag, sha256_file(path)[:16])
+        _file_hashes[path] = cached
+    return cached[1]
+
+# Backends a registered model can be served with
+BACKENDS = ['keras', 'tflite', 'tflite_int8']
+
+# .tflite file suffix per interpreter backend
+TFLITE_SUFFIXES = {'tflite': '', 'tflite_int8': '_int8'}
+
+def _default_backend():
+    """
+    Return the configured inference backend (settings.PREDICTOR_BACKEND)
+    """
+    try:
+        from django.conf import settings
+        return getattr(settings, 'PREDICTOR_BACKEND', 'keras')
+    except Exception:
+        return 'keras'
+
+def _reload_interval():
+    """
+    Return how often loaded models are checked for new versions (0 disables it)
+    """
+    try:
+        from django.conf import settings
+        return float(getattr(settings, 'MODEL_RELOAD_INTERVAL_SECONDS', 10))
+    except Exception:
+        return 0.0
+
+def _load_retry_interval():
+    """
+    Return how long a model that failed to load is served as unavailable before retrying
+    """
+    try:
+        from django.conf import settings
+        return float(getattr(settings, 'MODEL_LOAD_RETRY_SECONDS', 30))
+    except Exception:
+        return 30.0
+
+class ModelRegistry:
+    def __init__(self):
+        """
+        Per-process registry of predictor models.
+
+        Models are registered by name with their file path and are only
+        loaded (importing TensorFlow) the first time they are requested.
+        Each model can be held once per backend: 'keras' for the .keras file
+        (needed for retraining), 'tflite' for the exported interpreter and
+        'tflite_int8' for the full-integer quantized export.
+
+        A watcher thread checks the loaded models for new versions and swaps
+        them in once loaded; predictions already running keep the old object.
+        """
+        self._specs = {}
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.RLock()
+        self._reloading = set()
+        self._fallback_warned = set()
+        self._watcher = None
+        self._watcher_pid = None
+
+    def register(self, name, model_path, placeholder_factory=None):
+        """
+        Register a model without loading it
+
+        :param name: Registry key, e.g. 'BNB'
+        :param model_path: Path to the .keras file
+        :param placeholder_factory: Optional callable building a placeholder
+            model when the file does not exist yet
+        """
+        with self._lock:
+            self._specs[name] = {
+                'path': model_path,
+                'placeholder_factory': placeholder_factory
+            }
+
+    def registered_names(self):
+        """
+        Return the names of all registered models
+        """
+        return list(self._specs)
+
+    def model_path(self, name):
+        """
+        Return the .keras path a model was registered with
+        """
+        return self._specs[name]['path']
+
+    def is_loaded(self, name, backend=None):
+        if backend is None:
+            return any(key[0] == name for key in self._models)
+        return (name, backend) in self._models
+
+    def _source(self, name, backend):
+        """
+        Locate the file a backend would load and its version
+
+        :return: Dictionary with 'path', 'version' and 'manifest' (published
+            Keras versions only), or None if a TFLite export does not exist
+        """
+        model_path = self._specs[name]['path']
+
+        if backend in TFLITE_SUFFIXES:
+            from .tflite_utils import tflite_path_for
+            tflite_path = tflite_path_for(model_path, TFLITE_SUFFIXES[backend])
+            if not os.path.exists(tflite_path):
+                return None
+            # Versioned by content: an export made from a new Keras version gets a new tag
+            return {'path': tflite_path, 'version': _content_version(tflite_path), 'manifest': None}
+
+        manifest = read_current(model_path)
+        if manifest is not None:
+            return {
+                'path': manifest_file_path(manifest, model_path),
+                'version': manifest['version'],
+                'manifest': manifest
+            }
+        # Never published: the live file's mtime and size stand in for a version
+        return {'path': model_path, 'version': _file_version(model_path), 'manifest': None}
+
+    def get(self, name, backend=None):
+        """
+        Return the named model, loading it on first use
+
+        :param name: Registry key
+        :param backend: 'keras', 'tflite' or 'tflite_int8' (default: settings.PREDICTOR_BACKEND)
+        :return: Keras model or TFLitePredictor, or None if it could not be loaded
+        """
+        key = (name, backend or _default_backend())
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        if key[1] in TFLITE_SUFFIXES and self._source(*key) is None:
+            # Not exported yet; serve the Keras model instead
+            if key not in self._fallback_warned:
+                self._fallback_warned.add(key)
+                logger.warning(f"TFLite model for {name} ({key[1]}) not found. "
+                               f"Run 'manage.py export_tflite'. Using the Keras model for {name}.")
+            return self.get(name, 'keras')
+
+        with self._lock:
+            # Another thread may have loaded it while we waited
+            if key not in self._models or self._retry_due(key):
+                self._models[key], self._stats[key] = self._load(*key)
+            self.start_watcher()
+            return self._models[key]
+
+    def _retry_due(self, key):
+        """
+        Whether a model that failed to load should be loaded again
+
+        Failures are not permanent: the load is retried once
+        MODEL_LOAD_RETRY_SECONDS have passed, or as soon as the file changes.
+        """
+        if self._models.get(key) is not None:
+            return False
+        stats = self._stats.get(key, {})
+        if time.time() >= stats.get('retry_at', 0):
+            return True
+        source = self._source(*key)
+        return (source['version'] if source else None) != stats.get('failed_version')
+
+    def _load(self, name, backend, fallback_to_live=True):
+        """
+        Load (or create a placeholder for) a registered model
+
+        :param fallback_to_live: Load the live .keras file if the current
+            version fails its checksum
+        :return: (model or None, stats dictionary)
+        """
+        if name not in self._specs:
+            raise KeyError(f"Model '{name}' is not registered")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+
+        spec = self._specs[name]
+        source = self._source(name, backend)
+        rss_before = _current_rss_bytes()
+        start = time.perf_counter()
+
+        try:
+            if backend in TFLITE_SUFFIXES:
+                from .tflite_utils import TFLitePredictor
+                model = TFLitePredictor(source['path'])
+            elif not os.path.exists(source['path']) and spec['placeholder_factory'] is not None:
+                logger.warning(f"Model file not found at {source['path']}. Creating a placeholder model.")
+                model = spec['placeholder_factory']()
+
+                # Save the placeholder model
+                os.makedirs(os.path.dirname(source['path']), exist_ok=True)
+                model.save(source['path'])
+                logger.info(f"Placeholder model saved to {source['path']}")
+                source['version'] = _file_version(source['path'])
+            else:
+                if source['manifest'] is not None:
+                    try:
+                        verify_manifest(source['manifest'], spec['path'])
+                    except ValueError as e:
+                        if not fallback_to_live:
+                            raise
+                        # Nothing served yet: the live file is better than no model
+                        logger.error(f"{e}. Loading {spec['path']} instead.")
+                        source = {'path': spec['path'], 'version': _file_version(spec['path']), 'manifest': None}
+                from tensorflow.keras.models import load_model
+                model = load_model(source['path'])
+        except Exception as e:
+            logger.error(f"Error creating/loading {backend} model {name}: {e}")
+            model = None
+
+        load_time_ms = (time.perf_counter() - start) * 1000
+        stats = {
+            'path': source['path'],
+            'load_time_ms': round(load_time_ms, 2),
+            'weights_bytes': _weights_nbytes(model) if model is not None else 0,
+            'rss_delta_bytes': max(0, _current_rss_bytes() - rss_before),
+            'loaded_at': time.time(),
+            'version': source['version'] if model is not None else None,
+            'sha256': source['manifest']['sha256'] if source['manifest'] else None,
+            'error': model is None
+        }
+        if model is None:
+            stats['failed_version'] = source['version']
+            stats['retry_at'] = time.time() + _load_retry_interval()
+        logger.info(f"Model {name} ({backend}) loaded in {load_time_ms:.1f} ms: {stats}")
+        return model, stats
+
+    def model_version(self, name, backend=None):
+        """
+        Return the version of the model a backend serves (or would load)
+
+        Published models report their manifest version (e.g. 'v0003');
+        unpublished files report a tag derived from mtime and size, and
+        TFLite exports one derived from their SHA-256.
+
+        :return: Version string, or None if no model file exists
+        """
+        backend = backend or _default_backend()
+        key = (name, backend)
+        if key not in self._models and backend in TFLITE_SUFFIXES and self._source(*key) is None:
+            key = (name, 'keras')  # Served by the Keras fallback
+
+        stats = self._stats.get(key)
+        if stats is not None:
+            return stats.get('version')
+        return self._source(*key)['version']
+
+    def mark_updated(self, name, backend='keras', manifest=None):
+        """
+        Record that a loaded model was changed in place and saved, e.g. by retraining
+
+        :param manifest: Manifest of the version the model was published as
+            (see model_versions.publish_model_version)
+        """
+        with self._lock:
+            stats = self._stats.get((name, backend))
+            if stats is None:
+                return
+            if manifest is not None:
+                stats['path'] = manifest_file_path(manifest, self._specs[name]['path'])
+                stats['version'] = manifest['version']
+                stats['sha256'] = manifest['sha256']
+            else:
+                stats['version'] = _file_version(stats['path'])
+            logger.info(f"Model {name} ({backend}) updated to version {stats['version']}")
+
+    def check_for_updates(self, names=None, background=True):
+        """
+        Reload loaded models whose current version differs from the one served
+
+        Only stats a small file per loaded model, so it is cheap to call often.
+
+        :param names: Optional iterable of registry keys (default: all loaded)
+        :param background: Load new versions on a separate thread
+        :return: List of (name, backend) keys being reloaded
+        """
+        reloading = []
+        for key in list(self._models):
+            if names is not None and key[0] not in names:
+                continue
+            if self._models.get(key) is None:
+                continue  # Failed loads are retried by get()
+            source = self._source(*key)
+            if source is None or source['version'] is None:
+                continue
+            if source['version'] == self._stats.get(key, {}).get('version'):
+                continue
+
+            with self._lock:
+                if key in self._reloading:
+                    continue
+                self._reloading.add(key)
+
+            logger.info(f"New version {source['version']} of {key[0]} ({key[1]}) detected")
+            reloading.append(key)
+            if background:
+                threading.Thread(target=self._reload, args=(key,), name=f'model-reload-{key[0]}', daemon=True).start()
+            else:
+                self._reload(key)
+        return reloading
+
+    def _reload(self, key):
+        """
+        Load a new version next to the current one, then swap it in
+        """
+        try:
+            model, stats = self._load(*key, fallback_to_live=False)
+            if model is None:
+                logger.error(f"Keeping {key[0]} ({key[1]}) version {self._stats.get(key, {}).get('version')}; "
+                             f"the new version could not be loaded")
+                return
+            with self._lock:
+                if key in self._models:
+                    self._models[key] = model
+                    self._stats[key] = stats
+            logger.info(f"Now serving {key[0]} ({key[1]}) version {stats['version']}")
+        finally:
+            with self._lock:
+                self._reloading.discard(key)
+
+    def start_watcher(self):
+        """
+        Start the version watcher thread in this process (settings.MODEL_RELOAD_INTERVAL_SECONDS)
+        """
+        interval = _reload_interval()
+        if interval <= 0:
+            return
+        with self._lock:
+            # A forked worker inherits the attribute but not the thread
+            if self._watcher is not None and self._watcher_pid == os.getpid() and self._watcher.is_alive():
+                return
+            self._watcher = threading.Thread(target=self._watch, args=(interval,), name='model-version-watcher', daemon=True)
+            self._watcher_pid = os.getpid()
+            self._watcher.start()
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.check_for_updates()
+            except Exception as e:
+                logger.error(f"Model version check failed: {e}")
+
+    def warm(self, names=None, backend=None):
+        """
+        Eagerly load the given models (all registered models by default)
+
+        :param names: Optional iterable of registry keys (default: every model
+            that has a file or can create a placeholder)
+        :param backend: Backend to warm (default: settings.PREDICTOR_BACKEND)
+        :return: Status dictionary, see status()
+        """
+        if not names:
+            names = [
+                name for name, spec in self._specs.items()
+                if spec['placeholder_factory'] is not None or self._source(name, 'keras')['version'] is not None
+            ]
+        for name in names:
+            self.get(name, backend)
+        return self.status()
+
+    def unload(self, names=None):
+        """
+        Drop the given models (all loaded models by default) from memory
+
+        :param names: Optional iterable of registry keys; every backend is dropped
+        :return: List of names that were unloaded
+        """
+        with self._lock:
+            keys = [key for key in self._models if names is None or key[0] in names]
+            for key in keys:
+                del self._models[key]
+                self._stats.pop(key, None)
+            unloaded = sorted({key[0] for key in keys})
+        if unloaded:
+            gc.collect()
+            logger.info(f"Unloaded models: {unloaded}")
+        return unloaded
+
+    def status(self):
+        """
+        Report load state, served version, load time and memory use for every registered model
+        """
+        report = {}
+        for name, spec in self._specs.items():
+            backends = {
+                key[1]: {'loaded': model is not None, **self._stats.get(key, {})}
+                for key, model in list(self._models.items())
+                if key[0] == name
+            }
+            current = read_current(spec['path'])
+            report[name] = {
+                'path': spec['path'],
+                'loaded': any(entry['loaded'] for entry in backends.values()),
+                'current_version': current['version'] if current else None,
+                'backends': backends
+            }
+        return {
+            'pid': os.getpid(),
+            'default_backend': _default_backend(),
+            'process_rss_bytes': _current_rss_bytes(),
+            'models': report
+        }
+
+# Process-wide registry shared by the predictor modules and views
+model_registry = ModelRegistry()
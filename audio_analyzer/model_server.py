@@ -0,0 +1,243 @@
+import os
+import json
+import socket
+import struct
+import logging
+import threading
+import socketserver
+from multiprocessing import shared_memory
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Every message is a 4-byte big-endian length followed by a JSON document
+_HEADER = struct.Struct('>I')
+
+def get_socket_path():
+    """
+    Return the Unix socket path shared by the model server and its clients
+    """
+    return str(getattr(settings, 'MODEL_SERVER_SOCKET', '/tmp/beemodos_model_server.sock'))
+
+def _send_message(sock, payload):
+    data = json.dumps(payload).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+def _recv_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError("Model server connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+def _recv_message(sock):
+    (length,) = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    return json.loads(_recv_exactly(sock, length).decode('utf-8'))
+
+def _attach_shared_memory(name):
+    """
+    Attach to a client's shared memory block without taking ownership of it
+    """
+    try:
+        # Python 3.13+: attach without registering with the resource tracker
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # The client unlinks the block; stop this process's tracker from doing it too
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+    return shm
+
+class _ModelRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            message = _recv_message(self.request)
+            op = message.get('op')
+            if op == 'predict':
+                response = self.server.model_server.handle_predict(message)
+            elif op == 'status':
+                response = {'status': 'ok', **self.server.model_server.status()}
+            elif op == 'ping':
+                response = {'status': 'ok', 'pid': os.getpid()}
+            else:
+                response = {'status': 'error', 'error': f'Unknown operation: {op}'}
+        except Exception as e:
+            logger.error(f"Model server request error: {e}")
+            response = {'status': 'error', 'error': str(e)}
+
+        try:
+            _send_message(self.request, response)
+        except OSError as e:
+            logger.warning(f"Could not reply to model server client: {e}")
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class ModelServer:
+    def __init__(self, socket_path=None):
+        """
+        Serve BNB, QNQ and TOOT predictions to local clients over a Unix socket
+
+        Model inputs travel through shared memory; only small JSON headers go
+        over the socket. Requests from all web workers are micro-batched
+        together, so one process holds the models regardless of worker count.
+
+        :param socket_path: Unix socket path (default: settings.MODEL_SERVER_SOCKET)
+        """
+        from .inference import predict_batch
+        from .inference_scheduler import MicroBatchScheduler
+
+        self.socket_path = socket_path or get_socket_path()
+        self.scheduler = MicroBatchScheduler(
+            predict_batch,
+            max_batch_size=getattr(settings, 'INFERENCE_MAX_BATCH_SIZE', 8),
+            max_wait_ms=getattr(settings, 'INFERENCE_MAX_WAIT_MS', 20)
+        )
+        self._server = None
+
+    def handle_predict(self, message):
+        """
+        Run a batch that the client placed in shared memory
+        """
+        shm = _attach_shared_memory(message['shm'])
+        try:
+            # Copy out of the client's block so it can be released right away
+            batch = np.ndarray(tuple(message['shape']), dtype=np.dtype(message['dtype']), buffer=shm.buf).copy()
+        finally:
+            shm.close()
+
+        results = self.scheduler.predict(batch, message.get('source_names'))
+
+        return {
+            'status': 'ok',
+            'results': {
+                name: {'error': str(result)} if isinstance(result, Exception)
+                else {'predictions': [list(row) if row is not None else None for row in result]}
+                for name, result in results.items()
+            }
+        }
+
+    def status(self):
+        from .model_registry import model_registry
+        from .prediction_cache import get_prediction_cache
+        from .inference import stage_metrics
+        cache = get_prediction_cache()
+        return {
+            'pid': os.getpid(),
+            'registry': model_registry.status(),
+            'scheduler': self.scheduler.metrics(),
+            'prediction_cache': cache.stats() if cache is not None else None,
+            'stages': stage_metrics()
+        }
+
+    def serve_forever(self):
+        """
+        Bind the socket and handle requests until interrupted
+        """
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # Stale socket from a previous run
+        os.makedirs(os.path.dirname(self.socket_path) or '.', exist_ok=True)
+
+        self._server = _ThreadingUnixServer(self.socket_path, _ModelRequestHandler)
+        self._server.model_server = self
+        os.chmod(self.socket_path, 0o660)
+        logger.info(f"Model server listening on {self.socket_path} (pid {os.getpid()})")
+
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+class ModelServerClient:
+    def __init__(self, socket_path=None, timeout=None):
+        """
+        Thin client used by the web workers and management commands
+
+        :param socket_path: Unix socket path (default: settings.MODEL_SERVER_SOCKET)
+        :param timeout: Seconds to wait for a reply (default: settings.MODEL_SERVER_TIMEOUT_SECONDS)
+        """
+        self.socket_path = socket_path or get_socket_path()
+        self.timeout = timeout or getattr(settings, 'MODEL_SERVER_TIMEOUT_SECONDS', 30)
+
+    def _request(self, payload):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            _send_message(sock, payload)
+            response = _recv_message(sock)
+        if response.get('status') != 'ok':
+            raise RuntimeError(f"Model server error: {response.get('error')}")
+        return response
+
+    def predict(self, batch, source_names=None):
+        """
+        Run a batch on the model server
+
+        :param batch: float32 array of shape (N, 224, 224, 3)
+        :param source_names: Optional list of N names used for logging
+        :return: Same structure as inference.predict_batch
+        """
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, batch.nbytes))
+        try:
+            shared_batch = np.ndarray(batch.shape, dtype=batch.dtype, buffer=shm.buf)
+            shared_batch[...] = batch
+            del shared_batch
+
+            response = self._request({
+                'op': 'predict',
+                'shm': shm.name,
+                'shape': list(batch.shape),
+                'dtype': str(batch.dtype),
+                'source_names': source_names
+            })
+        finally:
+            shm.close()
+            shm.unlink()
+
+        results = {}
+        for name, result in response['results'].items():
+            if 'error' in result:
+                results[name] = RuntimeError(result['error'])
+            else:
+                results[name] = [tuple(row) if row is not None else None for row in result['predictions']]
+        return results
+
+    def status(self):
+        return self._request({'op': 'status'})
+
+    def ping(self):
+        try:
+            self._request({'op': 'ping'})
+            return True
+        except (OSError, RuntimeError, ConnectionError):
+            return False
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_model_server_client():
+    """
+    Return the process-wide model server client
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ModelServerClient()
+        return _client
@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Versioned artifacts live next to the live model file
+VERSIONS_DIRNAME = 'versions'
+
+_model_locks = {}
+_model_locks_guard = threading.Lock()
+# Model paths whose lock the current thread holds, so nested use does not deadlock
+_held_locks = threading.local()
+
+@contextmanager
+def model_file_lock(model_path):
+    """
+    Serialize writes to a model file across threads and processes
+
+    Reentrant within a thread: a caller holding the lock across a whole
+    read-modify-publish cycle can call publish_model_version inside it.
+    """
+    held = getattr(_held_locks, 'paths', None)
+    if held is None:
+        held = _held_locks.paths = set()
+    if model_path in held:
+        yield
+        return
+
+    with _model_locks_guard:
+        thread_lock = _model_locks.setdefault(model_path, threading.Lock())
+    with thread_lock:
+        held.add(model_path)
+        try:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{model_path}.lock", 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            held.discard(model_path)
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def versions_dir(model_path):
+    return os.path.join(os.path.dirname(model_path), VERSIONS_DIRNAME)
+
+def current_pointer_path(model_path):
+    """
+    Return the path of the small JSON file naming a model's current version
+    """
+    return f"{os.path.splitext(model_path)[0]}.current.json"
+
+def _write_json_atomic(path, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+
+def read_current(model_path):
+    """
+    Return the manifest of a model's current version, or None if it was never published
+    """
+    try:
+        with open(current_pointer_path(model_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def manifest_file_path(manifest, model_path):
+    """
+    Return the absolute path of the artifact a manifest describes
+    """
+    return os.path.join(versions_dir(model_path), manifest['file'])
+
+def verify_manifest(manifest, model_path):
+    """
+    Raise ValueError if the artifact is missing or does not match its checksum
+    """
+    path = manifest_file_path(manifest, model_path)
+    if not os.path.exists(path):
+        raise ValueError(f"Model artifact {path} is missing")
+    checksum = sha256_file(path)
+    if checksum != manifest['sha256']:
+        raise ValueError(f"Checksum mismatch for {path}: expected {manifest['sha256']}, got {checksum}")
+
+def publish_model_version(model_path, model=None, source_path=None, source='retraining', metadata=None):
+    """
+    Store a new immutable model version and make it current
+
+    The artifact and its manifest are written to versions/ first, then the
+    live .keras file is replaced and finally the <model>.current.json pointer
+    is swapped with os.replace. Workers watch the pointer, so they only ever
+    see complete, checksummed versions. Existing .tflite exports of the
+    model are re-exported from the new version.
+
+    :param model_path: Live .keras path the model is registered with
+    :param model: Keras model to save (either model or source_path is required)
+    :param source_path: Existing .keras file to publish instead
+    :param source: Short description of where the version came from
+    :param metadata: Extra fields stored in the manifest
+    :return: Manifest dictionary of the new version
+    """
+    if model is None and source_path is None:
+        raise ValueError("publish_model_version needs a model or a source_path")
+
+    directory = versions_dir(model_path)
+    os.makedirs(directory, exist_ok=True)
+    stem, ext = os.path.splitext(os.path.basename(model_path))
+
+    with model_file_lock(model_path):
+        existing = [
+            int(name[len(stem) + 2:-len(ext)])
+            for name in os.listdir(directory)
+            if name.startswith(f"{stem}.v") and name.endswith(ext) and name[len(stem) + 2:-len(ext)].isdigit()
+        ]
+        version = f"v{max(existing, default=0) + 1:04d}"
+        version_path = os.path.join(directory, f"{stem}.{version}{ext}")
+
+        if model is not None:
+            model.save(version_path)
+        else:
+            shutil.copyfile(source_path, version_path)
+
+        previous = read_current(model_path)
+        manifest = {
+            'model': stem,
+            'version': version,
+            'file': os.path.basename(version_path),
+            'sha256': sha256_file(version_path),
+            'size_bytes': os.path.getsize(version_path),
+            'created_at': time.time(),
+            'source': source,
+            'parent_version': previous['version'] if previous else None,
+            **(metadata or {})
+        }
+        _write_json_atomic(os.path.join(directory, f"{stem}.{version}.manifest.json"), manifest)
+
+        # Keep the live file current for tools that read it directly
+        tmp_path = os.path.join(os.path.dirname(model_path), f".{stem}.tmp{ext}")
+        shutil.copyfile(version_path, tmp_path)
+        os.replace(tmp_path, model_path)
+
+        _write_json_atomic(current_pointer_path(model_path), manifest)
+
+    logger.info(f"Published {stem} {version} ({manifest['sha256'][:12]}) from {source}")
+
+    # TFLite backends serve exports of the live file; bring them up to this version
+    from .tflite_utils import refresh_tflite_exports
+    refresh_tflite_exports(model_path)
+    return manifest
@@ -0,0 +1,86 @@
+from django.db import models
+
+class Recording(models.Model):
+    """
+    One analysed recording of a hive
+
+    Rows are added by history.save_analysis after every analysis, so the
+    history endpoints and dashboards query the database instead of Sheets.
+    """
+    hive = models.CharField(max_length=64)
+    recorded_at = models.DateTimeField()
+    duration = models.FloatField(default=0.0)
+    sample_rate = models.PositiveIntegerField(default=0)
+    # Paths under MEDIA_ROOT (see recording_store); empty for spectrogram-only analyses
+    audio_path = models.CharField(max_length=255, blank=True)
+    audio_sha256 = models.CharField(max_length=64, blank=True)
+    spectrogram_path = models.CharField(max_length=255, blank=True)
+    # Id of the recording in the recording store index; one row per stored recording
+    store_id = models.BigIntegerField(null=True, blank=True, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-recorded_at', '-id']
+        indexes = [
+            models.Index(fields=['hive', 'recorded_at', 'id'], name='recording_hive_time'),
+            models.Index(fields=['recorded_at', 'id'], name='recording_time'),
+        ]
+
+    def __str__(self):
+        return f"{self.hive} {self.recorded_at:%Y-%m-%d %H:%M:%S}"
+
+class Prediction(models.Model):
+    """
+    One model's prediction for a recording, or for one window of it
+
+    hive and recorded_at are copied from the recording so history and trend
+    queries are answered from this table's indexes without a join.
+    """
+    recording = models.ForeignKey(Recording, on_delete=models.CASCADE, related_name='predictions')
+    hive = models.CharField(max_length=64)
+    recorded_at = models.DateTimeField()
+    model = models.CharField(max_length=16)
+    predicted_class = models.SmallIntegerField()
+    label = models.CharField(max_length=128)
+    # Percent, as returned by the analysis endpoints
+    confidence = models.FloatField()
+    skipped = models.BooleanField(default=False)
+    # Window of the recording in seconds; null when the recording was analysed whole
+    window_start = models.FloatField(null=True, blank=True)
+    window_end = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-recorded_at', '-id']
+        indexes = [
+            models.Index(fields=['hive', 'recorded_at', 'model', 'id'], name='prediction_hive_time_model'),
+            models.Index(fields=['hive', 'model', 'recorded_at', 'id'], name='prediction_hive_model_time'),
+            models.Index(fields=['model', 'recorded_at', 'id'], name='prediction_model_time'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.label} ({self.confidence:.1f}%)"
+
+class FeatureVector(models.Model):
+    """
+    Spectral features of a recording (see audio_features.compute_spectral_features)
+    """
+    recording = models.OneToOneField(Recording, on_delete=models.CASCADE, related_name='features')
+    hive = models.CharField(max_length=64)
+    recorded_at = models.DateTimeField()
+    spectral_centroid = models.FloatField()
+    spectral_bandwidth = models.FloatField()
+    spectral_rolloff = models.FloatField()
+    dominant_frequency = models.FloatField()
+    mean_frequency = models.FloatField()
+    rms = models.FloatField()
+    # Relative energy of each analysis band, keyed by band name
+    band_energies = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ['-recorded_at', '-id']
+        indexes = [
+            models.Index(fields=['hive', 'recorded_at', 'id'], name='features_hive_time'),
+        ]
+
+    def __str__(self):
+        return f"{self.hive} {self.recorded_at:%Y-%m-%d %H:%M:%S}"
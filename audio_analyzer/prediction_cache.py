@@ -0,0 +1,170 @@
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+def content_hash(input_row):
+    """
+    Return a digest identifying one model input (a (224, 224, 3) float32 array)
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{input_row.dtype}{input_row.shape}".encode('utf-8'))
+    digest.update(np.ascontiguousarray(input_row))
+    return digest.hexdigest()
+
+class PredictionCache:
+    def __init__(self, max_entries=1024, persist_path=None):
+        """
+        LRU cache of prediction tuples keyed by model, model version and input hash
+
+        Keys include the model version, so entries written before a model was
+        retrained or replaced are never returned; they simply age out.
+
+        :param max_entries: Entries kept in memory (and on disk when persisted)
+        :param persist_path: Optional SQLite file shared across restarts and workers
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.persist_path = persist_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._puts_since_prune = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        if persist_path:
+            try:
+                os.makedirs(os.path.dirname(persist_path) or '.', exist_ok=True)
+                self._db = sqlite3.connect(persist_path, check_same_thread=False, timeout=5)
+                self._db.execute('PRAGMA journal_mode=WAL')
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS predictions '
+                    '(key TEXT PRIMARY KEY, value TEXT NOT NULL, used REAL NOT NULL)'
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Could not open prediction cache at {persist_path}: {e}")
+                self._db = None
+
+    @staticmethod
+    def make_key(model_name, model_version, input_hash):
+        return f"{model_name}:{model_version}:{input_hash}"
+
+    def get(self, key):
+        """
+        Return the cached prediction tuple for a key, or None
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+            value = self._read_disk(key)
+            if value is not None:
+                self._store(key, value)
+                self.hits += 1
+                return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """
+        Cache a prediction tuple (predicted_class, confidence, f1, precision)
+        """
+        value = tuple(value)
+        with self._lock:
+            self._store(key, value)
+            self._write_disk(key, value)
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, key):
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute('SELECT value FROM predictions WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE predictions SET used = julianday('now') WHERE key = ?", (key,))
+            self._db.commit()
+            return tuple(json.loads(row[0]))
+        except sqlite3.Error as e:
+            logger.warning(f"Prediction cache read error: {e}")
+            return None
+
+    def _write_disk(self, key, value):
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO predictions (key, value, used) VALUES (?, ?, julianday('now'))",
+                (key, json.dumps(value))
+            )
+            self._puts_since_prune += 1
+            if self._puts_since_prune >= 100:
+                # Drop the least recently used rows beyond the size limit
+                self._db.execute(
+                    'DELETE FROM predictions WHERE key NOT IN '
+                    '(SELECT key FROM predictions ORDER BY used DESC LIMIT ?)',
+                    (self.max_entries,)
+                )
+                self._puts_since_prune = 0
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Prediction cache write error: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute('DELETE FROM predictions')
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Prediction cache clear error: {e}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'persist_path': self.persist_path,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_prediction_cache():
+    """
+    Return the process-wide prediction cache, or None if PREDICTION_CACHE_ENABLED is off
+    """
+    global _cache
+    if not getattr(settings, 'PREDICTION_CACHE_ENABLED', True):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = PredictionCache(
+                max_entries=getattr(settings, 'PREDICTION_CACHE_MAX_ENTRIES', 1024),
+                persist_path=getattr(settings, 'PREDICTION_CACHE_PATH', '') or None
+            )
+        return _cache
@@ -0,0 +1,249 @@
+import io
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import datetime, timezone
+from contextlib import closing
+
+import soundfile as sf
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Characters allowed in a hive's directory name; anything else becomes '_'
+_HIVE_NAME = re.compile(r'[^A-Za-z0-9_.-]')
+
+# Hex digits of the SHA-256 used in file names (the full digest is in the index)
+NAME_DIGEST_LENGTH = 16
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hive TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    duration REAL NOT NULL,
+    sample_rate INTEGER NOT NULL,
+    channels INTEGER NOT NULL,
+    audio_path TEXT NOT NULL,
+    audio_sha256 TEXT NOT NULL,
+    spectrogram_path TEXT,
+    spectrogram_sha256 TEXT,
+    created_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS recordings_audio_path ON recordings (audio_path);
+CREATE INDEX IF NOT EXISTS recordings_hive_time ON recordings (hive, recorded_at);
+CREATE INDEX IF NOT EXISTS recordings_time ON recordings (recorded_at);
+CREATE INDEX IF NOT EXISTS recordings_spectrogram_path ON recordings (spectrogram_path);
+"""
+
+class RecordingStore:
+    def __init__(self, root, index_path, default_hive='default'):
+        """
+        Content-addressed recording files, partitioned by hive, date and hour, with a SQLite index
+
+        Files are written to <root>/<hive>/<YYYY-MM-DD>/<HH>/<sha256>.<ext>
+        (UTC), so recordings never overwrite each other and a directory never
+        grows past one hour of captures. Every recording is a row in the index,
+        which answers latest and time-range lookups from its (hive,
+        recorded_at) and (recorded_at) B-tree indexes instead of listing and
+        stat()ing directories.
+
+        :param root: Directory the recording files are written under
+        :param index_path: SQLite file holding the index
+        :param default_hive: Hive recorded under when none is given
+        """
+        self.root = str(root)
+        self.index_path = str(index_path)
+        self.default_hive = default_hive
+
+        os.makedirs(self.root, exist_ok=True)
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        with closing(self._connect()) as db:
+            # Readers are not blocked while a capture is being indexed
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(_SCHEMA)
+
+    def _connect(self):
+        db = sqlite3.connect(self.index_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def path(self, relative_path):
+        """
+        Absolute path of a file stored under the root (as found in the index)
+        """
+        return os.path.join(self.root, *relative_path.split('/'))
+
+    def _partition(self, hive, recorded_at):
+        when = datetime.fromtimestamp(recorded_at, tz=timezone.utc)
+        return '/'.join([_HIVE_NAME.sub('_', hive) or '_', when.strftime('%Y-%m-%d'), when.strftime('%H')])
+
+    def _write(self, data, partition, extension):
+        """
+        Write bytes under their content hash (temporary file renamed into place)
+
+        :return: (path relative to the root, SHA-256 hex digest)
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        relative_path = f"{partition}/{digest[:NAME_DIGEST_LENGTH]}.{extension}"
+        path = self.path(relative_path)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        return relative_path, digest
+
+    def add(self, samples, sample_rate, hive=None, recorded_at=None, subtype='PCM_16'):
+        """
+        Store a recording as WAV and index it
+
+        Identical audio recorded in the same hive and hour is stored once;
+        adding it again returns the existing record.
+
+        :param samples: Array of samples (frames, or frames x channels)
+        :param sample_rate: Sampling rate of the samples
+        :param hive: Hive the audio was recorded at (default: the store's default hive)
+        :param recorded_at: Unix time the recording started (default: now minus its duration)
+        :param subtype: soundfile subtype of the WAV data
+        :return: Record dictionary (see get)
+        """
+        hive = hive or self.default_hive
+        frames = len(samples)
+        channels = 1 if getattr(samples, 'ndim', 1) == 1 else samples.shape[1]
+        duration = frames / sample_rate
+        if recorded_at is None:
+            recorded_at = time.time() - duration
+
+        buffer = io.BytesIO()
+        sf.write(buffer, samples, sample_rate, format='WAV', subtype=subtype)
+        audio_path, audio_sha256 = self._write(buffer.getvalue(), self._partition(hive, recorded_at), 'wav')
+
+        with closing(self._connect()) as db, db:
+            db.execute(
+                'INSERT OR IGNORE INTO recordings '
+                '(hive, recorded_at, duration, sample_rate, channels, audio_path, audio_sha256, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (hive, float(recorded_at), duration, int(sample_rate), int(channels), audio_path, audio_sha256, time.time())
+            )
+            row = db.execute('SELECT * FROM recordings WHERE audio_path = ?', (audio_path,)).fetchone()
+        logger.info(f"Stored {duration:.1f}s recording {row['id']} for hive {hive} at {audio_path}")
+        return dict(row)
+
+    def attach_spectrogram(self, recording_id, data, extension='png'):
+        """
+        Store an encoded spectrogram image next to its recording
+
+        :param recording_id: Index id of the recording
+        :param data: Encoded image bytes
+        :param extension: File extension of the image format
+        :return: Updated record dictionary
+        """
+        record = self.get(recording_id)
+        if record is None:
+            raise KeyError(f"Unknown recording {recording_id}")
+        partition = record['audio_path'].rsplit('/', 1)[0]
+        spectrogram_path, spectrogram_sha256 = self._write(data, partition, extension)
+        with closing(self._connect()) as db, db:
+            db.execute(
+                'UPDATE recordings SET spectrogram_path = ?, spectrogram_sha256 = ? WHERE id = ?',
+                (spectrogram_path, spectrogram_sha256, recording_id)
+            )
+        record.update(spectrogram_path=spectrogram_path, spectrogram_sha256=spectrogram_sha256)
+        return record
+
+    def get(self, recording_id):
+        """
+        Return a recording's index row as a dictionary, or None
+
+        Keys: id, hive, recorded_at (Unix time), duration (seconds),
+        sample_rate, channels, audio_path and spectrogram_path (relative to
+        the root; see path), audio_sha256, spectrogram_sha256 and created_at.
+        """
+        with closing(self._connect()) as db:
+            row = db.execute('SELECT * FROM recordings WHERE id = ?', (recording_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def latest(self, hive=None):
+        """
+        Most recent recording, of one hive or of any, or None if there is none
+        """
+        with closing(self._connect()) as db:
+            if hive is None:
+                row = db.execute('SELECT * FROM recordings ORDER BY recorded_at DESC LIMIT 1').fetchone()
+            else:
+                row = db.execute(
+                    'SELECT * FROM recordings WHERE hive = ? ORDER BY recorded_at DESC LIMIT 1', (hive,)
+                ).fetchone()
+        return dict(row) if row is not None else None
+
+    def between(self, start, end, hive=None, limit=None):
+        """
+        Recordings that started in [start, end), oldest first
+
+        :param start: Unix time (inclusive)
+        :param end: Unix time (exclusive)
+        :param hive: Only recordings of this hive
+        :param limit: Maximum number of records
+        :return: List of record dictionaries
+        """
+        query = 'SELECT * FROM recordings WHERE recorded_at >= ? AND recorded_at < ?'
+        params = [float(start), float(end)]
+        if hive is not None:
+            query += ' AND hive = ?'
+            params.append(hive)
+        query += ' ORDER BY recorded_at'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(int(limit))
+        with closing(self._connect()) as db:
+            return [dict(row) for row in db.execute(query, params)]
+
+    def find_by_audio(self, audio_path):
+        """
+        Recording stored at an audio path, or None
+
+        :param audio_path: Audio path relative to the root
+        """
+        with closing(self._connect()) as db:
+            row = db.execute('SELECT * FROM recordings WHERE audio_path = ?', (audio_path,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def find_by_spectrogram(self, spectrogram_path):
+        """
+        Recording a stored spectrogram belongs to, or None
+
+        :param spectrogram_path: Spectrogram path relative to the root
+        """
+        with closing(self._connect()) as db:
+            row = db.execute('SELECT * FROM recordings WHERE spectrogram_path = ?', (spectrogram_path,)).fetchone()
+        return dict(row) if row is not None else None
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_recording_store():
+    """
+    Return the process-wide recording store
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RecordingStore(
+                getattr(settings, 'RECORDING_STORE_DIR', os.path.join(settings.MEDIA_ROOT, 'recordings')),
+                getattr(settings, 'RECORDING_INDEX_PATH', os.path.join(settings.BASE_DIR, 'recordings.sqlite3')),
+                default_hive=getattr(settings, 'RECORDING_DEFAULT_HIVE', 'default')
+            )
+        return _store
@@ -0,0 +1,346 @@
+import os
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from contextlib import closing
+
+import numpy as np
+from django.conf import settings
+
+from .inference import PREDICTOR_SPECS, interpret_prediction
+from .model_registry import model_registry
+from .model_versions import model_file_lock, publish_model_version
+from .sheets_utils import save_prediction_to_sheets
+from .spectrogram_utils import load_spectrogram_batch
+
+logger = logging.getLogger(__name__)
+
+# Predictor specs by registry name ('BNB', 'QNQ', 'TOOT')
+MODEL_SPECS = {spec['model']: spec for spec in PREDICTOR_SPECS}
+
+# Job states stored in the replay buffer
+QUEUED, TRAINING, DONE, FAILED = 'queued', 'training', 'done', 'failed'
+
+# Claims older than this are assumed to belong to a trainer that died
+STALE_CLAIM_SECONDS = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS feedback (
+    job_id TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    spectrogram_path TEXT NOT NULL,
+    true_label INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    claimed_at REAL,
+    trained_at REAL,
+    model_version TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS feedback_model_status ON feedback (model, status, created_at);
+"""
+
+class RetrainingQueue:
+    def __init__(self, db_path, min_samples=8, interval_seconds=300, replay_samples=32,
+                 max_buffer=5000, epochs=1, batch_size=16, learning_rate=0.001):
+        """
+        Persistent replay buffer of feedback labels and the trainer that consumes it
+
+        Feedback is stored immediately and trained on later, in mini-batches,
+        once min_samples labels are pending for a model or every
+        interval_seconds. Each batch mixes the new labels with a sample of
+        earlier ones (the replay) so a handful of corrections does not undo
+        what the model already learned.
+
+        :param db_path: SQLite file holding the buffer
+        :param min_samples: Pending labels that trigger training right away
+        :param interval_seconds: Period of the scheduled training pass
+        :param replay_samples: Earlier labels mixed into each training batch
+        :param max_buffer: Trained labels kept per model for replay
+        :param epochs: Epochs per training pass
+        :param batch_size: Mini-batch size passed to fit()
+        :param learning_rate: Adam learning rate for fine-tuning
+        """
+        self.db_path = str(db_path)
+        self.min_samples = max(1, int(min_samples))
+        self.interval_seconds = float(interval_seconds)
+        self.replay_samples = int(replay_samples)
+        self.max_buffer = int(max_buffer)
+        self.epochs = int(epochs)
+        self.batch_size = int(batch_size)
+        self.learning_rate = float(learning_rate)
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._worker = None
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        with closing(self._connect()) as db:
+            db.executescript(_SCHEMA)
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def enqueue(self, model_name, spectrogram_path, true_label):
+        """
+        Store one feedback label and return its job id
+        """
+        if model_name not in MODEL_SPECS:
+            raise ValueError(f"Unknown model '{model_name}'")
+
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as db, db:
+            db.execute(
+                'INSERT INTO feedback (job_id, model, spectrogram_path, true_label, status, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (job_id, model_name, spectrogram_path, int(true_label), QUEUED, time.time())
+            )
+        logger.info(f"Queued {model_name} feedback {job_id} (label {true_label}) for {spectrogram_path}")
+
+        if self.pending_count(model_name) >= self.min_samples:
+            self._wake.set()
+        return job_id
+
+    def job_status(self, job_id):
+        """
+        Return a job's row as a dictionary, or None if it does not exist
+        """
+        with closing(self._connect()) as db:
+            row = db.execute('SELECT * FROM feedback WHERE job_id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        status = dict(row)
+        status['pending_for_model'] = self.pending_count(row['model'])
+        return status
+
+    def pending_count(self, model_name=None):
+        with closing(self._connect()) as db:
+            if model_name is None:
+                return db.execute('SELECT COUNT(*) FROM feedback WHERE status = ?', (QUEUED,)).fetchone()[0]
+            return db.execute(
+                'SELECT COUNT(*) FROM feedback WHERE model = ? AND status = ?', (model_name, QUEUED)
+            ).fetchone()[0]
+
+    def feedback_labels(self):
+        """
+        Return every stored (model, spectrogram_path, true_label) that has not failed
+        """
+        with closing(self._connect()) as db:
+            return [
+                (row['model'], row['spectrogram_path'], row['true_label'])
+                for row in db.execute(
+                    'SELECT model, spectrogram_path, true_label FROM feedback WHERE status != ? ORDER BY created_at',
+                    (FAILED,)
+                )
+            ]
+
+    def _claim(self, model_name):
+        """
+        Atomically mark the model's queued labels as being trained and return them
+        """
+        now = time.time()
+        with closing(self._connect()) as db, db:
+            db.execute('BEGIN IMMEDIATE')
+            # Requeue work left behind by a trainer that died
+            db.execute(
+                'UPDATE feedback SET status = ?, claimed_at = NULL WHERE status = ? AND claimed_at < ?',
+                (QUEUED, TRAINING, now - STALE_CLAIM_SECONDS)
+            )
+            rows = db.execute(
+                'SELECT * FROM feedback WHERE model = ? AND status = ? ORDER BY created_at',
+                (model_name, QUEUED)
+            ).fetchall()
+            db.executemany(
+                'UPDATE feedback SET status = ?, claimed_at = ? WHERE job_id = ?',
+                [(TRAINING, now, row['job_id']) for row in rows]
+            )
+        return rows
+
+    def _replay_rows(self, model_name):
+        with closing(self._connect()) as db:
+            return db.execute(
+                'SELECT * FROM feedback WHERE model = ? AND status = ? ORDER BY RANDOM() LIMIT ?',
+                (model_name, DONE, self.replay_samples)
+            ).fetchall()
+
+    def _finish(self, rows, status, model_version=None, error=None):
+        with closing(self._connect()) as db, db:
+            db.executemany(
+                'UPDATE feedback SET status = ?, trained_at = ?, model_version = ?, error = ? WHERE job_id = ?',
+                [(status, time.time(), model_version, error, row['job_id']) for row in rows]
+            )
+            if status == DONE and rows:
+                # Keep the replay buffer bounded
+                db.execute(
+                    'DELETE FROM feedback WHERE model = ? AND status = ? AND job_id NOT IN '
+                    '(SELECT job_id FROM feedback WHERE model = ? AND status = ? ORDER BY trained_at DESC LIMIT ?)',
+                    (rows[0]['model'], DONE, rows[0]['model'], DONE, self.max_buffer)
+                )
+
+    def train_model(self, model_name):
+        """
+        Fine-tune one model on its pending labels plus a replay sample
+
+        :return: Number of new labels trained on
+        """
+        rows = self._claim(model_name)
+        if not rows:
+            return 0
+
+        try:
+            available = [row for row in rows if os.path.exists(row['spectrogram_path'])]
+            replay = [row for row in self._replay_rows(model_name) if os.path.exists(row['spectrogram_path'])]
+            training_rows = available + replay
+            if not available:
+                raise FileNotFoundError("None of the feedback spectrograms exist anymore")
+
+            inputs = load_spectrogram_batch([row['spectrogram_path'] for row in training_rows])
+            labels = np.array([row['true_label'] for row in training_rows])
+
+            manifest = self._fit_and_publish(model_registry.model_path(model_name), inputs, labels, len(available))
+
+            # Swap the new version in here now; other processes pick it up from the pointer file
+            model_registry.check_for_updates([model_name], background=False)
+            model_version = manifest['version']
+        except Exception as e:
+            logger.error(f"Retraining {model_name} failed: {e}", exc_info=True)
+            self._finish(rows, FAILED, error=str(e))
+            return 0
+
+        self._finish(rows, DONE, model_version=model_version)
+        logger.info(f"{model_name} retrained on {len(rows)} new and {len(replay)} replayed labels ({model_version})")
+        self._report(model_name, rows, model_version)
+        return len(rows)
+
+    def _fit_and_publish(self, model_path, inputs, labels, new_labels):
+        """
+        Train a private copy of the model so serving is never blocked or affected mid-fit
+
+        The model file lock is held from loading the parent version until
+        the new one is published. Every worker runs a trainer by default
+        (RETRAIN_IN_PROCESS), and without the lock two of them could fine-tune
+        the same parent and the later publish would drop the other's update.
+
+        :return: Manifest of the published version
+        """
+        from tensorflow.keras.models import load_model
+        from tensorflow.keras.optimizers import Adam
+
+        with model_file_lock(model_path):
+            model = load_model(model_path)
+            if model.output_shape[-1] > 1:
+                loss = 'sparse_categorical_crossentropy'
+            else:
+                loss = 'binary_crossentropy'
+            model.compile(optimizer=Adam(learning_rate=self.learning_rate), loss=loss, metrics=['accuracy'])
+            model.fit(inputs, labels, epochs=self.epochs, batch_size=self.batch_size, shuffle=True, verbose=0)
+            return publish_model_version(
+                model_path, model=model, source='feedback retraining',
+                metadata={'new_labels': new_labels, 'replayed_labels': len(labels) - new_labels}
+            )
+
+    def _report(self, model_name, rows, model_version):
+        """
+        Log the retrained model's predictions for the new labels to Sheets and Discord
+        """
+        from .discord_utils import send_discord_message
+
+        spec = MODEL_SPECS[model_name]
+        try:
+            model = model_registry.get(model_name, backend='keras')
+            paths = [row['spectrogram_path'] for row in rows if os.path.exists(row['spectrogram_path'])]
+            preds = np.asarray(model.predict_on_batch(load_spectrogram_batch(paths))) if paths else []
+            labels = {row['spectrogram_path']: row['true_label'] for row in rows}
+            for path, pred_row in zip(paths, preds):
+                predicted_class, confidence, f1, precision = interpret_prediction(pred_row)
+                save_prediction_to_sheets(spec['sheet_type'], {
+                    'model': spec['name'],
+                    'filename': os.path.basename(path),
+                    'true_label': labels[path],
+                    'predicted_class': predicted_class,
+                    'confidence': confidence,
+                    'f1_score': f1,
+                    'precision': precision,
+                    'model_retrained': True,
+                    'model_version': model_version
+                })
+        except Exception as e:
+            logger.warning(f"Could not record retraining results for {model_name}: {e}")
+
+        try:
+            send_discord_message(
+                f"🔄 Model Retraining Completed\n"
+                f"Model: {model_name}\n"
+                f"Labels: {len(rows)}\n"
+                f"Version: {model_version}"
+            )
+        except Exception as discord_error:
+            logger.warning(f"Failed to send Discord notification for model retraining: {discord_error}")
+
+    def run_once(self, force=False):
+        """
+        Train every model with enough pending labels (any pending label if force)
+
+        :return: Dictionary of model name -> labels trained on
+        """
+        trained = {}
+        with self._lock:
+            for model_name in MODEL_SPECS:
+                pending = self.pending_count(model_name)
+                if pending and (force or pending >= self.min_samples):
+                    trained[model_name] = self.train_model(model_name)
+        return trained
+
+    def start(self):
+        """
+        Start the background trainer thread if it is not running
+        """
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop.clear()
+                self._worker = threading.Thread(target=self._run, name='retraining-worker', daemon=True)
+                self._worker.start()
+                logger.info(f"Retraining worker started (min_samples={self.min_samples}, "
+                            f"interval={self.interval_seconds:.0f}s)")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Woken early when a model reaches min_samples, otherwise on the schedule
+            woken = self._wake.wait(timeout=self.interval_seconds)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.run_once(force=not woken)
+            except Exception as e:
+                logger.error(f"Retraining worker error: {e}", exc_info=True)
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_retraining_queue():
+    """
+    Return the process-wide retraining queue, configured from settings on first use
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = RetrainingQueue(
+                getattr(settings, 'RETRAIN_BUFFER_PATH', os.path.join(settings.BASE_DIR, 'training_models', 'replay_buffer.sqlite3')),
+                min_samples=getattr(settings, 'RETRAIN_MIN_SAMPLES', 8),
+                interval_seconds=getattr(settings, 'RETRAIN_INTERVAL_SECONDS', 300),
+                replay_samples=getattr(settings, 'RETRAIN_REPLAY_SAMPLES', 32),
+                epochs=getattr(settings, 'RETRAIN_EPOCHS', 1),
+                batch_size=getattr(settings, 'RETRAIN_BATCH_SIZE', 16),
+                learning_rate=getattr(settings, 'RETRAIN_LEARNING_RATE', 0.001)
+            )
+        return _queue
@@ -0,0 +1,160 @@
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Bumped when rendering changes so images from older code are not served
+RENDER_VERSION = 1
+
+class SpectrogramCache:
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        """
+        Size-bounded disk cache of encoded spectrogram images
+
+        Files are named after their key, so several worker processes can share
+        the directory. Reads refresh a file's mtime and the least recently used
+        files are deleted once the directory grows past max_bytes.
+
+        :param directory: Cache directory (created if missing)
+        :param max_bytes: Total size the cache is pruned back to
+        """
+        self.directory = str(directory)
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.Lock()
+        self._size = None
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(source_path, params):
+        """
+        Key of one rendering of an audio file
+
+        The file's size and modification time are part of the key, so a
+        recording written again under the same name gets new images.
+
+        :param source_path: Audio file the image is rendered from
+        :param params: Dictionary of rendering parameters
+        :return: Hex digest, also used as the ETag
+        """
+        stat = os.stat(source_path)
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{RENDER_VERSION}|{os.path.abspath(source_path)}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8'))
+        digest.update(repr(sorted(params.items())).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, f"{key}.{extension}")
+
+    def get(self, key, extension):
+        """
+        Return the cached image bytes, or None
+        """
+        path = self._path(key, extension)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except OSError as e:
+            logger.error(f"Could not read cached spectrogram {path}: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key, extension, data):
+        """
+        Store image bytes (written to a temporary file and renamed into place)
+        """
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key, extension))
+        except OSError as e:
+            logger.error(f"Could not cache spectrogram {key}: {e}")
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._prune()
+
+    def _scan(self):
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.is_file() or entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        return entries, total
+
+    def _prune(self):
+        """
+        Delete least recently used files until the cache is at 90% of max_bytes
+        """
+        entries, total = self._scan()
+        entries.sort()
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+        if removed:
+            logger.info(f"Pruned {removed} cached spectrogram(s), {total / (1024 * 1024):.1f} MiB left")
+
+    def stats(self):
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+            lookups = self.hits + self.misses
+            return {
+                'directory': self.directory,
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_spectrogram_cache():
+    """
+    Return the process-wide spectrogram image cache
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SpectrogramCache(
+                getattr(settings, 'SPECTROGRAM_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'spectrogram_cache')),
+                max_bytes=getattr(settings, 'SPECTROGRAM_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+            )
+        return _cache
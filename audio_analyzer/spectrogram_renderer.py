@@ -0,0 +1,227 @@
+import matplotlib
+matplotlib.use('Agg')  # Use non-interactive backend
+
+import io
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import librosa.display
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Overlays kept in memory; one per spectrogram shape, sample rate, title, size and dB range
+MAX_CACHED_LAYOUTS = 32
+
+def draw_spectrogram_figure(spectrogram_db, sample_rate, title, figsize, ylim=None):
+    """
+    Lay out the spectrogram exactly like the original pyplot rendering
+
+    Uses an explicit Figure/Agg canvas so no pyplot global state is touched.
+
+    :param ylim: Optional (low, high) frequency range in Hz to show
+    :return: (figure, canvas, QuadMesh of the spectrogram, axes)
+    """
+    fig = Figure(figsize=figsize)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    img = librosa.display.specshow(
+        spectrogram_db,
+        sr=sample_rate,
+        x_axis='time',
+        y_axis='hz',
+        ax=ax
+    )
+    fig.colorbar(img, ax=ax, format='%+2.0f dB')
+    if ylim is not None:
+        ax.set_ylim(*ylim)
+    ax.set_title(title)
+    fig.tight_layout()
+    return fig, canvas, img, ax
+
+def colormap_lut(cmap):
+    """
+    256-entry uint8 RGB lookup table of a matplotlib colormap, rounded like Agg does
+    """
+    return np.round(cmap(np.arange(cmap.N))[:, :3] * 255).astype(np.uint8)
+
+def _color_indices(spectrogram_db, vmin, vmax, levels=256):
+    """
+    Map dB values to colormap indices like matplotlib's Normalize + Colormap
+    """
+    if vmax <= vmin:
+        return np.zeros(spectrogram_db.shape, dtype=np.intp)
+    scaled = (spectrogram_db - vmin) / (vmax - vmin) * levels
+    return np.clip(scaled.astype(np.intp), 0, levels - 1)
+
+class SpectrogramLayout:
+    def __init__(self, shape, sample_rate, title, figsize, vmin, vmax, ylim=None):
+        """
+        Axes, ticks, title and colorbar of one pyplot spectrogram figure, drawn once
+
+        The figure is drawn with the spectrogram mesh hidden on a transparent
+        background. The pixel centre of every column and row inside the axes
+        is mapped to the STFT frame and bin that Agg would paint there (a
+        centre exactly on a cell edge belongs to the lower cell, as in Agg).
+
+        :param shape: (frequency bins, frames) of the spectrograms drawn with it
+        :param sample_rate: Sampling rate used for the axes
+        :param title: Figure title
+        :param figsize: Figure size in inches
+        :param vmin: Lowest dB value (bottom of the colorbar)
+        :param vmax: Highest dB value (top of the colorbar)
+        :param ylim: Optional (low, high) frequency range in Hz to show
+        """
+        bins, frames = shape
+        template = np.linspace(vmin, vmax, bins * frames, dtype=np.float32).reshape(shape)
+        fig, canvas, img, ax = draw_spectrogram_figure(template, sample_rate, title, figsize, ylim)
+        self.lut = colormap_lut(img.get_cmap())
+
+        # Mesh cell edges in pixels (display y grows upwards)
+        coordinates = img.get_coordinates()
+        x_edges = ax.transData.transform(
+            np.column_stack([coordinates[0, :, 0], np.full(frames + 1, coordinates[0, 0, 1])]))[:, 0]
+        y_edges = ax.transData.transform(
+            np.column_stack([np.full(bins + 1, coordinates[0, 0, 0]), coordinates[:, 0, 1]]))[:, 1]
+        x0, y0, x1, y1 = ax.bbox.extents
+
+        fig.patch.set_alpha(0)
+        ax.patch.set_alpha(0)
+        img.set_visible(False)
+        canvas.draw()
+        overlay = np.asarray(canvas.buffer_rgba()).astype(np.float32)
+        height, width = overlay.shape[:2]
+
+        centres_x = np.arange(width) + 0.5
+        centres_y = height - (np.arange(height) + 0.5)
+        columns = np.searchsorted(x_edges, centres_x, side='left') - 1
+        rows = np.searchsorted(y_edges, centres_y, side='left') - 1
+        column_inside = np.flatnonzero((columns >= 0) & (columns < frames) & (centres_x >= x0) & (centres_x <= x1))
+        row_inside = np.flatnonzero((rows >= 0) & (rows < bins) & (centres_y >= y0) & (centres_y <= y1))
+        self.columns = slice(column_inside[0], column_inside[-1] + 1)
+        self.rows = slice(row_inside[0], row_inside[-1] + 1)
+        self.frame_index = columns[self.columns]
+        self.bin_index = rows[self.rows]
+
+        # Everything but the mesh, composited on the white figure background once
+        alpha = overlay[..., 3:] / 255.0
+        self.background = np.round(overlay[..., :3] * alpha + 255.0 * (1 - alpha)).astype(np.uint8)
+
+        # Overlay pixels (spines, ticks) that are blended over the mesh
+        region_alpha = alpha[self.rows, self.columns, 0]
+        self.blend_mask = region_alpha > 0
+        self.blend_alpha = region_alpha[self.blend_mask][:, np.newaxis]
+        self.blend_color = overlay[self.rows, self.columns, :3][self.blend_mask] * self.blend_alpha
+
+    def render(self, spectrogram_db, vmin, vmax):
+        rgb = self.background.copy()
+        indices = _color_indices(spectrogram_db, vmin, vmax, len(self.lut))
+        region = self.lut[indices[np.ix_(self.bin_index, self.frame_index)]]
+        region[self.blend_mask] = np.round(
+            self.blend_color + region[self.blend_mask] * (1 - self.blend_alpha)
+        ).astype(np.uint8)
+        rgb[self.rows, self.columns] = region
+        return rgb
+
+class SpectrogramRenderer:
+    def __init__(self, max_layouts=MAX_CACHED_LAYOUTS):
+        """
+        Render dB spectrograms to RGB arrays through a colormap lookup table
+
+        Only the first spectrogram of a given layout pays for a matplotlib
+        draw; after that rendering is a table lookup into the cached overlay.
+        Thread-safe.
+
+        :param max_layouts: Overlays kept in memory (least recently used are dropped)
+        """
+        self.max_layouts = max(1, int(max_layouts))
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
+        self._luts = {}
+
+    def layout(self, shape, sample_rate, title, figsize, vmin, vmax, ylim=None):
+        key = (tuple(shape), int(sample_rate), title, tuple(figsize), vmin, vmax, ylim and tuple(ylim))
+        with self._lock:
+            layout = self._layouts.get(key)
+            if layout is not None:
+                self._layouts.move_to_end(key)
+                return layout
+
+        # Drawn outside the lock; two threads may build the same layout once each
+        layout = SpectrogramLayout(shape, sample_rate, title, figsize, vmin, vmax, ylim)
+        with self._lock:
+            self._layouts[key] = layout
+            while len(self._layouts) > self.max_layouts:
+                self._layouts.popitem(last=False)
+        return layout
+
+    def colormap(self, name):
+        with self._lock:
+            if name not in self._luts:
+                self._luts[name] = colormap_lut(matplotlib.colormaps[name])
+            return self._luts[name]
+
+    def render(self, spectrogram_db, sample_rate=None, title=None, figsize=(10, 4), axes=True, cmap='magma', ylim=None):
+        """
+        Render a dB spectrogram to an RGB array
+
+        :param spectrogram_db: Magnitude spectrogram in dB (frequency bins x frames)
+        :param sample_rate: Sampling rate used for the axes
+        :param title: Figure title
+        :param figsize: Figure size in inches
+        :param axes: With axes, the same figure as the pyplot rendering (axes,
+            ticks, title and colorbar from a cached overlay); without, one
+            pixel per STFT cell, lowest frequency at the bottom
+        :param cmap: Colormap name for axes=False (with axes, librosa's choice is used)
+        :param ylim: Optional (low, high) frequency range in Hz shown on the axes
+        :return: uint8 array of shape (height, width, 3)
+        """
+        spectrogram_db = np.asarray(spectrogram_db)
+        vmin, vmax = float(spectrogram_db.min()), float(spectrogram_db.max())
+        if not axes:
+            return self.colorize(spectrogram_db, vmin, vmax, cmap)
+        layout = self.layout(spectrogram_db.shape, sample_rate, title, figsize, vmin, vmax, ylim)
+        return layout.render(spectrogram_db, vmin, vmax)
+
+    def colorize(self, spectrogram_db, vmin, vmax, cmap='magma'):
+        """
+        Map a dB spectrogram onto a colormap over a fixed range, one pixel per STFT cell
+
+        :param spectrogram_db: Magnitude spectrogram in dB (frequency bins x frames)
+        :param vmin: dB value at the bottom of the colormap (lower values clip)
+        :param vmax: dB value at the top of the colormap (higher values clip)
+        :param cmap: Colormap name
+        :return: uint8 array of shape (bins, frames, 3), lowest frequency at the bottom
+        """
+        lut = self.colormap(cmap)
+        return lut[_color_indices(np.asarray(spectrogram_db)[::-1], vmin, vmax, len(lut))]
+
+def encode_image(rgb, format='PNG', **options):
+    """
+    Encode an RGB array with Pillow
+
+    :param rgb: uint8 array of shape (height, width, 3)
+    :param format: Pillow format name ('PNG', 'WEBP', ...)
+    :param options: Extra Pillow save options, e.g. quality=80 or lossless=True for WebP
+    :return: Encoded bytes
+    """
+    buffer = io.BytesIO()
+    Image.fromarray(rgb).save(buffer, format=format, **options)
+    return buffer.getvalue()
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+def get_spectrogram_renderer():
+    """
+    Return the process-wide SpectrogramRenderer
+    """
+    global _renderer
+    with _renderer_lock:
+        if _renderer is None:
+            _renderer = SpectrogramRenderer()
+        return _renderer
@@ -0,0 +1,280 @@
+import os
+import json
+import math
+import shutil
+import logging
+import tempfile
+import threading
+
+import numpy as np
+import librosa
+import soundfile as sf
+from django.conf import settings
+
+from .spectrogram_renderer import encode_image, get_spectrogram_renderer
+
+logger = logging.getLogger(__name__)
+
+# Tiles are TILE_SIZE x TILE_SIZE pixels (edge tiles may be smaller)
+TILE_SIZE = 256
+
+# STFT parameters, the same as the analysed spectrograms
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Colour scale in dB relative to full scale, fixed so tiles compare across time
+DB_RANGE = (-100.0, 0.0)
+
+# Level-0 tile columns computed per STFT chunk; bounds memory for any recording length
+CHUNK_TILES = 16
+
+MANIFEST_NAME = 'manifest.json'
+
+def tile_root():
+    """
+    Directory holding one tile pyramid per recording (settings.SPECTROGRAM_TILE_DIR)
+    """
+    return str(getattr(settings, 'SPECTROGRAM_TILE_DIR', os.path.join(settings.MEDIA_ROOT, 'spectrogram_tiles')))
+
+def pyramid_dir(recording_id):
+    return os.path.join(tile_root(), *recording_id.split('/')) + '.tiles'
+
+def tile_path(output_dir, level, x, y):
+    return os.path.join(output_dir, str(level), f"{x}_{y}.png")
+
+def level_count(frames, bins, tile_size=TILE_SIZE):
+    """
+    Levels needed until the whole spectrogram fits in one tile (each level halves both axes)
+    """
+    largest = max(frames, bins, 1)
+    return max(0, math.ceil(math.log2(largest / tile_size))) + 1 if largest > tile_size else 1
+
+def _pool_rows(block):
+    """
+    Halve the frequency axis, keeping the louder bin of each pair
+    """
+    return np.maximum.reduceat(block, np.arange(0, block.shape[0], 2), axis=0)
+
+def stft_chunks(audio_path, chunk_frames, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    """
+    Yield the STFT of an audio file in chunks of frames, reading it in blocks
+
+    The frames are those of librosa.stft(y, n_fft, hop_length) with its
+    default centred, zero-padded framing, in dB relative to full scale (a
+    full-scale sine peaks at 0 dB).
+
+    :param audio_path: Audio file (mixed down to mono)
+    :param chunk_frames: STFT frames per yielded chunk
+    :return: Generator of float32 arrays (frequency bins x frames)
+    """
+    window = librosa.filters.get_window('hann', n_fft, fftbins=True)
+    scale = 2.0 / window.sum()
+    carry = np.zeros(n_fft // 2, dtype=np.float32)
+
+    def frames_of(data):
+        count = 1 + (len(data) - n_fft) // hop_length
+        magnitude = np.abs(librosa.stft(
+            data[:(count - 1) * hop_length + n_fft], n_fft=n_fft, hop_length=hop_length, center=False
+        ))
+        return (20.0 * np.log10(np.maximum(magnitude * scale, 1e-10))).astype(np.float32), count
+
+    with sf.SoundFile(audio_path) as audio:
+        for block in audio.blocks(blocksize=chunk_frames * hop_length, dtype='float32', always_2d=True):
+            data = np.concatenate([carry, block.mean(axis=1)])
+            if len(data) < n_fft:
+                carry = data
+                continue
+            frames, count = frames_of(data)
+            carry = data[count * hop_length:]
+            yield frames
+
+    # Final frames reach into the zero padding after the last sample
+    data = np.concatenate([carry, np.zeros(n_fft // 2, dtype=np.float32)])
+    if len(data) >= n_fft:
+        yield frames_of(data)[0]
+
+class TilePyramidBuilder:
+    def __init__(self, output_dir, frames, bins, tile_size=TILE_SIZE, db_range=DB_RANGE):
+        """
+        Write tiles of every level as spectrogram columns arrive
+
+        Columns are emitted as full-height tile columns once TILE_SIZE of them
+        are buffered, then max-pooled 2x2 into the next level, so only a few
+        tile columns per level are ever held in memory.
+
+        :param output_dir: Directory the <level>/<x>_<y>.png tiles are written to
+        :param frames: Total STFT frames of the recording
+        :param bins: Frequency bins per frame
+        """
+        self.output_dir = output_dir
+        self.tile_size = tile_size
+        self.db_range = db_range
+        self.levels = level_count(frames, bins, tile_size)
+        self._buffers = [None] * self.levels
+        self._odd = [None] * self.levels
+        self._next_column = [0] * self.levels
+        self._renderer = get_spectrogram_renderer()
+
+    def add(self, columns, level=0):
+        """
+        Append spectrogram columns (bins x frames, dB) to a level
+        """
+        if level >= self.levels or columns.shape[1] == 0:
+            return
+        buffer = columns if self._buffers[level] is None else np.concatenate([self._buffers[level], columns], axis=1)
+        while buffer.shape[1] >= self.tile_size:
+            self._write_column(level, buffer[:, :self.tile_size])
+            buffer = buffer[:, self.tile_size:]
+        self._buffers[level] = buffer
+
+        # Pairs of columns make one column of the next level
+        source = columns if self._odd[level] is None else np.concatenate([self._odd[level], columns], axis=1)
+        even = source.shape[1] // 2 * 2
+        self._odd[level] = source[:, even:] if even < source.shape[1] else None
+        if even:
+            self.add(_pool_rows(np.maximum(source[:, 0:even:2], source[:, 1:even:2])), level + 1)
+
+    def finish(self):
+        """
+        Flush the partial tiles at the end of every level
+        """
+        for level in range(self.levels):
+            if self._odd[level] is not None:
+                self.add(_pool_rows(self._odd[level]), level + 1)
+                self._odd[level] = None
+            if self._buffers[level] is not None and self._buffers[level].shape[1]:
+                self._write_column(level, self._buffers[level])
+            self._buffers[level] = None
+
+    def _write_column(self, level, block):
+        rgb = self._renderer.colorize(block, *self.db_range)
+        x = self._next_column[level]
+        self._next_column[level] += 1
+        os.makedirs(os.path.join(self.output_dir, str(level)), exist_ok=True)
+        for y in range(math.ceil(rgb.shape[0] / self.tile_size)):
+            tile = rgb[y * self.tile_size:(y + 1) * self.tile_size]
+            with open(tile_path(self.output_dir, level, x, y), 'wb') as f:
+                f.write(encode_image(np.ascontiguousarray(tile), 'PNG'))
+
+def build_tile_pyramid(audio_path, output_dir, tile_size=TILE_SIZE, n_fft=N_FFT, hop_length=HOP_LENGTH):
+    """
+    Compute a recording's STFT in chunks and write its multi-resolution tile pyramid
+
+    Level 0 has one pixel per STFT frame and frequency bin; every level above
+    halves both axes, up to the level where the whole recording fits in one
+    tile. Tiles are written to a temporary directory that replaces
+    output_dir once the manifest is complete.
+
+    :param audio_path: Audio file to tile
+    :param output_dir: Pyramid directory (<level>/<x>_<y>.png and manifest.json)
+    :return: Manifest dictionary
+    """
+    info = sf.info(audio_path)
+    stat = os.stat(audio_path)
+    frames = 1 + info.frames // hop_length
+    bins = n_fft // 2 + 1
+
+    parent = os.path.dirname(os.path.abspath(output_dir))
+    os.makedirs(parent, exist_ok=True)
+    work_dir = tempfile.mkdtemp(dir=parent, prefix='.tiles-')
+    try:
+        builder = TilePyramidBuilder(work_dir, frames, bins, tile_size)
+        for chunk in stft_chunks(audio_path, CHUNK_TILES * tile_size, n_fft, hop_length):
+            builder.add(chunk)
+        builder.finish()
+
+        levels = []
+        for level in range(builder.levels):
+            width = math.ceil(frames / 2 ** level)
+            height = math.ceil(bins / 2 ** level)
+            levels.append({
+                'level': level,
+                'width': width,
+                'height': height,
+                'columns': math.ceil(width / tile_size),
+                'rows': math.ceil(height / tile_size),
+                'seconds_per_pixel': hop_length * 2 ** level / info.samplerate
+            })
+        manifest = {
+            'version': f"{stat.st_size}-{stat.st_mtime_ns}",
+            'sample_rate': info.samplerate,
+            'duration': info.frames / info.samplerate,
+            'n_fft': n_fft,
+            'hop_length': hop_length,
+            'frames': frames,
+            'bins': bins,
+            'max_frequency': info.samplerate / 2,
+            'tile_size': tile_size,
+            'db_range': list(DB_RANGE),
+            'levels': levels
+        }
+        with open(os.path.join(work_dir, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f)
+
+        # Swap the finished pyramid in; readers see either the old or the new one
+        if os.path.exists(output_dir):
+            stale_dir = tempfile.mkdtemp(dir=parent, prefix='.stale-')
+            os.replace(output_dir, os.path.join(stale_dir, 'pyramid'))
+            os.replace(work_dir, output_dir)
+            shutil.rmtree(stale_dir, ignore_errors=True)
+        else:
+            os.replace(work_dir, output_dir)
+    except Exception:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+
+    logger.info(
+        f"Built {len(levels)} tile level(s) for {audio_path}: "
+        f"{frames} frames, {sum(l['columns'] * l['rows'] for l in levels)} tiles"
+    )
+    return manifest
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+_build_locks = {}
+_build_locks_lock = threading.Lock()
+
+def ensure_tile_pyramid(recording_id, audio_path, force=False):
+    """
+    Return the manifest of a recording's tile pyramid, building it if missing or stale
+
+    :param recording_id: Recording id (audio path under MEDIA_ROOT without extension)
+    :param audio_path: Audio file of the recording
+    :param force: Rebuild even if an up-to-date pyramid exists
+    :return: Manifest dictionary
+    """
+    with _build_locks_lock:
+        lock = _build_locks.setdefault(recording_id, threading.Lock())
+
+    with lock:
+        output_dir = pyramid_dir(recording_id)
+        stat = os.stat(audio_path)
+        manifest = load_manifest(output_dir)
+        if not force and manifest is not None and manifest.get('version') == f"{stat.st_size}-{stat.st_mtime_ns}":
+            return manifest
+        return build_tile_pyramid(audio_path, output_dir)
+
+def start_tile_build(recording_id, audio_path):
+    """
+    Build a recording's tile pyramid in a background thread
+
+    :return: False if a build of this recording is already running in this process
+    """
+    with _build_locks_lock:
+        lock = _build_locks.setdefault(recording_id, threading.Lock())
+    if lock.locked():
+        return False
+
+    def build():
+        try:
+            ensure_tile_pyramid(recording_id, audio_path)
+        except Exception as e:
+            logger.error(f"Tile pyramid build failed for {recording_id}: {e}")
+
+    threading.Thread(target=build, name=f"tiles-{recording_id}", daemon=True).start()
+    return True
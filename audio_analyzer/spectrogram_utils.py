@@ -0,0 +1,276 @@
+import matplotlib
+matplotlib.use('Agg')  # Use non-interactive backend
+
+import logging
+from math import gcd
+import numpy as np
+import librosa
+import soundfile as sf
+from scipy.signal import resample_poly
+from django.conf import settings
+from PIL import Image
+
+from .spectrogram_renderer import draw_spectrogram_figure, encode_image, get_spectrogram_renderer
+
+logger = logging.getLogger(__name__)
+
+# Input size expected by the BNB, QNQ and TOOT models (height, width)
+MODEL_INPUT_SIZE = (224, 224)
+
+def decimate(samples, sample_rate, target_rate=None):
+    """
+    Reduce audio to the analysis sample rate with a polyphase FIR filter
+
+    scipy's resample_poly low-pass filters and downsamples in one pass, so
+    everything above the new Nyquist frequency is removed before the STFT.
+
+    :param samples: Array of samples, time along the first axis
+    :param sample_rate: Sampling rate of the samples
+    :param target_rate: Analysis sampling rate; None, 0 or a rate at or above
+        sample_rate leaves the audio unchanged
+    :return: (samples, sample rate)
+    """
+    if not target_rate or target_rate >= sample_rate:
+        return samples, sample_rate
+    divisor = gcd(int(target_rate), int(sample_rate))
+    up, down = int(target_rate) // divisor, int(sample_rate) // divisor
+    return resample_poly(samples, up, down, axis=0).astype(np.float32), int(target_rate)
+
+def load_analysis_audio(audio_path, target_rate=None):
+    """
+    Load an audio file as mono samples for analysis
+
+    With a target rate the file is read at its native rate and decimated
+    once; otherwise librosa.load's default 22.05 kHz resampling is kept.
+
+    :param audio_path: Path to the audio file
+    :param target_rate: Analysis sampling rate (settings.ANALYSIS_SAMPLE_RATE)
+    :return: (1-D float32 samples, sample rate)
+    """
+    if not target_rate:
+        return librosa.load(audio_path)
+    samples, sample_rate = sf.read(audio_path, dtype='float32', always_2d=True)
+    return decimate(samples.mean(axis=1), sample_rate, target_rate)
+
+def compute_stft_magnitude(samples, n_fft=2048, hop_length=512):
+    """
+    STFT magnitude shared by the spectrogram and the spectral features
+
+    :param samples: 1-D array of audio samples
+    :return: 2-D array (frequency bins x frames)
+    """
+    return np.abs(librosa.stft(samples, n_fft=n_fft, hop_length=hop_length))
+
+def compute_spectrogram_db(samples, magnitude=None):
+    """
+    Compute the dB-scaled STFT magnitude used for every spectrogram
+
+    :param samples: 1-D array of audio samples
+    :param magnitude: Precomputed compute_stft_magnitude(samples) to reuse
+    :return: 2-D array (frequency bins x frames) in dB relative to the peak
+    """
+    if magnitude is None:
+        magnitude = compute_stft_magnitude(samples)
+    return librosa.amplitude_to_db(magnitude, ref=np.max)
+
+def compute_window_spectrograms_db(samples, sample_rate, window_seconds, hop_seconds, hop_length=512, magnitude=None):
+    """
+    Split a recording into overlapping fixed-length windows of one shared STFT
+
+    The STFT magnitude is computed once for the whole recording and the
+    windows are strided views over its frames, so the cost is linear in the
+    audio length. Each window is scaled to dB relative to its own peak, like
+    compute_spectrogram_db does for a clip of that length.
+
+    :param samples: 1-D array of audio samples
+    :param sample_rate: Sampling rate of the samples
+    :param window_seconds: Length of each window in seconds
+    :param hop_seconds: Distance between window starts in seconds
+    :param hop_length: STFT hop length (librosa's default)
+    :param magnitude: Precomputed compute_stft_magnitude(samples) to reuse,
+        e.g. shared with audio_features.compute_spectral_features
+    :return: (windows, spans) where windows is a float32 array of shape
+        (num_windows, frequency bins, frames per window) in dB and spans is a
+        list of (start_seconds, end_seconds)
+    """
+    if magnitude is None:
+        magnitude = compute_stft_magnitude(samples, hop_length=hop_length)
+    magnitude = np.asarray(magnitude, dtype=np.float32)
+    total_frames = magnitude.shape[1]
+    # A centred STFT of a clip one window long has 1 + window_samples // hop_length frames
+    window_samples = int(round(window_seconds * sample_rate))
+    window_frames = 1 + window_samples // hop_length
+    hop_frames = max(1, int(round(hop_seconds * sample_rate / hop_length)))
+
+    if total_frames <= window_frames:
+        # At most one window long: analyse the whole recording
+        windows = magnitude[np.newaxis]
+        starts = np.array([0])
+    else:
+        starts = np.arange(0, total_frames - window_frames + 1, hop_frames)
+        if total_frames > starts[-1] + window_frames:
+            # Score the tail of the recording in a final, right-aligned window
+            starts = np.append(starts, total_frames - window_frames)
+        view = np.lib.stride_tricks.sliding_window_view(magnitude, window_frames, axis=1)
+        windows = view[:, starts].transpose(1, 0, 2)
+
+    # Vectorized librosa.amplitude_to_db(window, ref=np.max) with its default amin and top_db
+    amin, top_db = 1e-5, 80.0
+    peaks = np.maximum(windows.max(axis=(1, 2), keepdims=True), amin)
+    windows_db = 20.0 * np.log10(np.maximum(windows, amin) / peaks)
+    windows_db = np.maximum(windows_db, -top_db).astype(np.float32)
+
+    duration = len(samples) / sample_rate
+    spans = [
+        (round(float(start) * hop_length / sample_rate, 3),
+         round(min(duration, (float(start) * hop_length + window_samples) / sample_rate), 3))
+        for start in starts
+    ]
+    return windows_db, spans
+
+def use_fast_renderer():
+    """
+    Whether spectrograms are drawn by the lookup-table renderer (settings.SPECTROGRAM_RENDERER)
+    """
+    return getattr(settings, 'SPECTROGRAM_RENDERER', 'fast') == 'fast'
+
+def render_spectrogram_rgb(spectrogram_db, sample_rate, title, figsize=(10, 4), ylim=None):
+    """
+    Render a spectrogram figure to an in-memory RGB array
+
+    The pixels are identical to the PNG written by save_spectrogram_image,
+    without encoding or touching the disk. The fast renderer reproduces the
+    matplotlib figure from a cached overlay; only anti-aliased spine edges
+    can differ, by at most 3/255 (see check_spectrogram_parity).
+
+    :param spectrogram_db: Magnitude spectrogram in dB
+    :param sample_rate: Sampling rate used for the axes
+    :param title: Figure title
+    :param figsize: Figure size in inches
+    :param ylim: Optional (low, high) frequency range in Hz to show
+    :return: uint8 array of shape (height, width, 3)
+    """
+    if use_fast_renderer():
+        return get_spectrogram_renderer().render(spectrogram_db, sample_rate, title, figsize, ylim=ylim)
+    fig, canvas, _, _ = draw_spectrogram_figure(spectrogram_db, sample_rate, title, figsize, ylim)
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba())[..., :3].copy()
+
+def save_spectrogram_image(spectrogram_db, sample_rate, title, spectrogram_path, figsize=(10, 4)):
+    """
+    Render a dB-scaled STFT magnitude to a PNG file
+
+    :param spectrogram_db: Magnitude spectrogram in dB
+    :param sample_rate: Sampling rate used for the axes
+    :param title: Figure title
+    :param spectrogram_path: Destination PNG path (a .webp path writes WebP)
+    :param figsize: Figure size in inches
+    """
+    if use_fast_renderer():
+        Image.fromarray(render_spectrogram_rgb(spectrogram_db, sample_rate, title, figsize)).save(spectrogram_path)
+        return
+    fig, canvas, _, _ = draw_spectrogram_figure(spectrogram_db, sample_rate, title, figsize)
+    fig.savefig(spectrogram_path)
+
+def rgb_to_model_input(rgb):
+    """
+    Convert a rendered RGB spectrogram into a model input batch
+
+    Mirrors load_and_preprocess_image in the predictors: nearest-neighbour
+    resize to 224x224, float32, scaled to [0, 1], with a batch dimension.
+
+    :param rgb: uint8 array of shape (height, width, 3)
+    :return: float32 array of shape (1, 224, 224, 3)
+    """
+    height, width = MODEL_INPUT_SIZE
+    resized = Image.fromarray(rgb).resize((width, height), Image.NEAREST)
+    img_array = np.asarray(resized, dtype=np.float32)
+    img_array = np.expand_dims(img_array, axis=0)  # Add batch dimension
+    img_array /= 255.0  # Normalize to [0, 1]
+    return img_array
+
+def spectrogram_to_model_input(spectrogram_db, sample_rate, title, figsize=(10, 4), save_path=None):
+    """
+    Build the normalized model input tensor directly from an STFT magnitude
+
+    :param spectrogram_db: Magnitude spectrogram in dB
+    :param sample_rate: Sampling rate used for the axes
+    :param title: Figure title
+    :param figsize: Figure size in inches
+    :param save_path: Optional PNG path, written as a side output
+    :return: float32 array of shape (1, 224, 224, 3)
+    """
+    rgb = render_spectrogram_rgb(spectrogram_db, sample_rate, title, figsize)
+    if save_path:
+        Image.fromarray(rgb).save(save_path)
+    return rgb_to_model_input(rgb)
+
+def load_spectrogram_batch(spectrogram_paths):
+    """
+    Decode spectrogram images once into a single preallocated model input batch
+
+    Each image is decoded like keras' load_img (RGB, nearest-neighbour
+    resize to 224x224) and scaled to [0, 1].
+
+    :param spectrogram_paths: List of image paths
+    :return: float32 array of shape (N, 224, 224, 3)
+    """
+    height, width = MODEL_INPUT_SIZE
+    batch = np.empty((len(spectrogram_paths), height, width, 3), dtype=np.float32)
+    for i, path in enumerate(spectrogram_paths):
+        with Image.open(path) as img:
+            batch[i] = np.asarray(img.convert('RGB').resize((width, height), Image.NEAREST), dtype=np.float32)
+    batch /= 255.0
+    return batch
+
+def windows_to_model_inputs(windows_db, sample_rate, title='Spectrogram', figsize=(10, 4)):
+    """
+    Render every window of compute_window_spectrograms_db into one model input batch
+
+    :param windows_db: Array of shape (num_windows, frequency bins, frames) in dB
+    :param sample_rate: Sampling rate used for the axes
+    :param title: Figure title
+    :param figsize: Figure size in inches
+    :return: float32 array of shape (num_windows, 224, 224, 3)
+    """
+    height, width = MODEL_INPUT_SIZE
+    batch = np.empty((len(windows_db), height, width, 3), dtype=np.float32)
+    for i, window_db in enumerate(windows_db):
+        batch[i] = rgb_to_model_input(render_spectrogram_rgb(window_db, sample_rate, title, figsize))[0]
+    return batch
+
+def render_audio_spectrogram(audio_path, width=1000, height=400, fmin=None, fmax=None, axes=True,
+                             image_format='PNG', title='Spectrogram'):
+    """
+    Render an audio file's spectrogram to encoded image bytes
+
+    :param audio_path: Path to the audio file (decimated to settings.ANALYSIS_SAMPLE_RATE when set)
+    :param width: Image width in pixels
+    :param height: Image height in pixels
+    :param fmin: Lowest frequency shown in Hz (default: 0)
+    :param fmax: Highest frequency shown in Hz (default: Nyquist)
+    :param axes: Draw the axes, title and colorbar like the saved spectrograms;
+        without, the image is the spectrogram alone, stretched to the size
+    :param image_format: Pillow format name ('PNG' or 'WEBP')
+    :param title: Figure title (with axes)
+    :return: Encoded image bytes
+    """
+    samples, sample_rate = load_analysis_audio(audio_path, getattr(settings, 'ANALYSIS_SAMPLE_RATE', 0))
+    spectrogram_db = compute_spectrogram_db(samples)
+    nyquist = sample_rate / 2
+    low = 0.0 if fmin is None else max(0.0, float(fmin))
+    high = nyquist if fmax is None else min(nyquist, float(fmax))
+    if high <= low:
+        raise ValueError(f"Empty frequency range {low}-{high} Hz")
+
+    if axes:
+        ylim = None if (fmin is None and fmax is None) else (low, high)
+        rgb = render_spectrogram_rgb(spectrogram_db, sample_rate, title, figsize=(width / 100, height / 100), ylim=ylim)
+    else:
+        freqs = librosa.fft_frequencies(sr=sample_rate, n_fft=(spectrogram_db.shape[0] - 1) * 2)
+        rows = np.flatnonzero((freqs >= low) & (freqs <= high))
+        if rows.size == 0:
+            raise ValueError(f"No frequency bins between {low} and {high} Hz")
+        rgb = get_spectrogram_renderer().render(spectrogram_db[rows[0]:rows[-1] + 1], axes=False)
+        rgb = np.asarray(Image.fromarray(rgb).resize((width, height), Image.BILINEAR))
+    return encode_image(rgb, image_format)
@@ -0,0 +1,552 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+from unittest import mock
+
+import numpy as np
+from django.conf import settings
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+
+from . import audio_capture, recording_store
+from .audio_capture import AudioRingBuffer, SharedAudioRingBuffer
+from .frequency_stats import WelchAccumulator, compute_frequency_stats
+from .history import save_analysis
+from .models import Prediction, Recording
+from .inference_scheduler import MicroBatchScheduler
+from .prediction_cache import PredictionCache, content_hash
+from .recording_store import RecordingStore
+from .retraining import DONE, FAILED, QUEUED, RetrainingQueue
+from .model_registry import ModelRegistry
+from .model_versions import model_file_lock, publish_model_version, read_current
+from .spectrogram_utils import compute_spectrogram_db, compute_window_spectrograms_db, render_spectrogram_rgb
+
+def synthetic_audio(seconds, sample_rate=22050, seed=0):
+    """
+    Hive-like test signal: a 250 Hz hum with noise
+    """
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    rng = np.random.default_rng(seed)
+    return (0.3 * np.sin(2 * np.pi * 250 * t) + 0.05 * rng.standard_normal(t.size)).astype(np.float32)
+
+class ModelRegistryTests(SimpleTestCase):
+    def _registry(self, directory, factory):
+        registry = ModelRegistry()
+        registry.register('TEST', os.path.join(directory, 'TEST_model.keras'), factory)
+        return registry
+
+    def test_failed_load_is_retried(self):
+        attempts = []
+
+        class Placeholder:
+            def save(self, path):
+                with open(path, 'wb') as f:
+                    f.write(b'placeholder')
+
+        def factory():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError('not ready')
+            return Placeholder()
+
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(MODEL_LOAD_RETRY_SECONDS=0, MODEL_RELOAD_INTERVAL_SECONDS=0):
+            registry = self._registry(directory, factory)
+            self.assertIsNone(registry.get('TEST', 'keras'))
+            self.assertIsInstance(registry.get('TEST', 'keras'), Placeholder)
+
+    def test_failed_load_waits_for_retry_interval(self):
+        attempts = []
+
+        def factory():
+            attempts.append(1)
+            raise RuntimeError('broken')
+
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(MODEL_LOAD_RETRY_SECONDS=3600, MODEL_RELOAD_INTERVAL_SECONDS=0):
+            registry = self._registry(directory, factory)
+            self.assertIsNone(registry.get('TEST', 'keras'))
+            self.assertIsNone(registry.get('TEST', 'keras'))
+            self.assertEqual(len(attempts), 1)
+
+class SpectrogramRendererTests(SimpleTestCase):
+    def test_fast_renderer_matches_matplotlib(self):
+        spectrogram_db = compute_spectrogram_db(synthetic_audio(2))
+        with override_settings(SPECTROGRAM_RENDERER='matplotlib'):
+            reference = render_spectrogram_rgb(spectrogram_db, 22050, 'Spectrogram')
+        with override_settings(SPECTROGRAM_RENDERER='fast'):
+            fast = render_spectrogram_rgb(spectrogram_db, 22050, 'Spectrogram')
+        self.assertEqual(reference.shape, fast.shape)
+        self.assertLessEqual(int(np.abs(reference.astype(int) - fast).max()), 3)
+
+class ModelFileLockTests(SimpleTestCase):
+    def test_publish_inside_held_lock(self):
+        with tempfile.TemporaryDirectory() as directory:
+            model_path = os.path.join(directory, 'TEST_model.keras')
+            source_path = os.path.join(directory, 'trained.keras')
+            with open(source_path, 'wb') as f:
+                f.write(b'weights')
+            with model_file_lock(model_path):
+                manifest = publish_model_version(model_path, source_path=source_path)
+            self.assertEqual(read_current(model_path)['version'], manifest['version'])
+
+    def test_lock_serializes_threads(self):
+        with tempfile.TemporaryDirectory() as directory:
+            model_path = os.path.join(directory, 'TEST_model.keras')
+            events = []
+
+            def train(name):
+                with model_file_lock(model_path):
+                    events.append(f'{name} start')
+                    time.sleep(0.05)
+                    events.append(f'{name} end')
+
+            threads = [threading.Thread(target=train, args=(name,)) for name in ('a', 'b')]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual([event.split()[1] for event in events], ['start', 'end', 'start', 'end'])
+
+class WindowSpectrogramTests(SimpleTestCase):
+    def windows(self, seconds):
+        return compute_window_spectrograms_db(synthetic_audio(seconds), 22050, 10, 5)
+
+    def test_clip_one_window_long_gives_one_window(self):
+        windows, spans = self.windows(10)
+        self.assertEqual(len(windows), 1)
+        self.assertEqual(spans, [(0.0, 10.0)])
+
+    def test_tail_is_covered(self):
+        for seconds in (12, 15, 17.5, 32, 35):
+            windows, spans = self.windows(seconds)
+            # Windows start on STFT frames, so the last one may end up to one hop early
+            self.assertAlmostEqual(spans[-1][1], seconds, delta=512 / 22050, msg=f'{seconds}s clip')
+            self.assertEqual(len(windows), len(spans))
+
+    def test_window_frames_match_a_clip_of_window_length(self):
+        single, _ = self.windows(10)
+        windows, _ = self.windows(30)
+        self.assertEqual(windows.shape[1:], single.shape[1:])
+
+class AudioRingBufferTests(SimpleTestCase):
+    def test_read_spans_the_wraparound(self):
+        ring = AudioRingBuffer(capacity_frames=8)
+        ring.write(np.arange(6))
+        ring.write(np.arange(6, 11))
+        np.testing.assert_array_equal(ring.read(5)[:, 0], np.arange(6, 11))
+        np.testing.assert_array_equal(ring.read(3, end_frame=7)[:, 0], [4, 5, 6])
+
+    def test_overwritten_frames_cannot_be_read(self):
+        ring = AudioRingBuffer(capacity_frames=8)
+        ring.write(np.arange(11))
+        with self.assertRaises(ValueError):
+            ring.read(4, end_frame=6)
+
+    def test_fresh_snapshots_do_not_overlap(self):
+        class Source(audio_capture._Snapshots):
+            running = True
+            sample_rate = 1000
+            ring = AudioRingBuffer(capacity_frames=5000)
+
+        stop = threading.Event()
+
+        def write_frame_numbers():
+            # Each sample holds its own frame index
+            while not stop.is_set():
+                total = Source.ring.total_frames
+                Source.ring.write(np.arange(total, total + 10))
+                time.sleep(0.01)
+
+        writer = threading.Thread(target=write_frame_numbers, daemon=True)
+        writer.start()
+        self.addCleanup(stop.set)
+
+        first = Source().snapshot(0.2, fresh=True)
+        second = Source().snapshot(0.2, fresh=True)
+        self.assertEqual(len(first), 200)
+        self.assertGreater(second[0], first[-1])
+
+class SharedAudioRingBufferTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'capture.buf')
+
+    def test_reader_sees_the_writers_frames(self):
+        writer = SharedAudioRingBuffer.create(self.path, capacity_frames=100, channels=2, sample_rate=10, device=3)
+        self.addCleanup(writer.close)
+        reader = SharedAudioRingBuffer.attach(self.path)
+        self.addCleanup(reader.close)
+
+        writer.write(np.arange(150 * 2).reshape(150, 2))
+        self.assertEqual((reader.sample_rate, reader.channels, reader.device), (10, 2, 3))
+        self.assertEqual(reader.total_frames, 150)
+        np.testing.assert_array_equal(reader.read(3)[:, 0], [294, 296, 298])
+
+    def test_guard_frames_are_not_readable(self):
+        writer = SharedAudioRingBuffer.create(self.path, capacity_frames=100, channels=1, sample_rate=10)
+        self.addCleanup(writer.close)
+        writer.write(np.arange(250))
+        with self.assertRaises(ValueError):
+            writer.read(100)
+        self.assertEqual(len(writer.read(100 - writer.guard_frames)), 90)
+
+    def test_attach_rejects_other_files(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'\0' * 128)
+        with self.assertRaises(ValueError):
+            SharedAudioRingBuffer.attach(self.path)
+
+class FakeInputStream:
+    """
+    sounddevice.InputStream stand-in delivering silence in real time
+    """
+    opened = []
+
+    def __init__(self, device=None, samplerate=44100, channels=1, dtype='float32', blocksize=1024, callback=None):
+        self.samplerate, self.channels, self.blocksize, self.callback = samplerate, channels, blocksize, callback
+        self.active = False
+        FakeInputStream.opened.append(self)
+
+    def _run(self):
+        block = np.zeros((self.blocksize, self.channels), dtype=np.float32)
+        while self.active:
+            time.sleep(self.blocksize / self.samplerate)
+            self.callback(block, self.blocksize, None, None)
+
+    def start(self):
+        self.active = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self.active = False
+
+    def close(self):
+        pass
+
+class RecordHivesTests(SimpleTestCase):
+    def setUp(self):
+        FakeInputStream.opened = []
+        audio_capture._services.clear()
+        self.addCleanup(audio_capture._services.clear)
+
+    def test_hives_are_recorded_in_parallel_and_streams_stopped(self):
+        hives = {'hive-1': 1, 'hive-2': 2, 'hive-3': 3}
+        fake_sd = mock.MagicMock(InputStream=FakeInputStream)
+        with mock.patch.dict(sys.modules, {'sounddevice': fake_sd}), override_settings(
+                AUDIO_CAPTURE_ENABLED=True, AUDIO_CAPTURE_SHARED_PATH='', HIVE_DEVICES=hives,
+                AUDIO_CAPTURE_SAMPLE_RATE=8000, AUDIO_CAPTURE_BUFFER_SECONDS=5):
+            start = time.monotonic()
+            clips = audio_capture.record_hives(0.5, 8000)
+            elapsed = time.monotonic() - start
+
+        self.assertEqual(sorted(clips), sorted(hives))
+        self.assertTrue(all(len(samples) == 4000 for samples, _ in clips.values()))
+        self.assertLess(elapsed, 1.2)
+        self.assertEqual(len(FakeInputStream.opened), 3)
+        self.assertFalse(any(stream.active for stream in FakeInputStream.opened))
+
+class AnalyzeEndpointTests(SimpleTestCase):
+    def test_analyze_is_csrf_exempt(self):
+        client = Client(enforce_csrf_checks=True)
+        response = client.post('/analyze/', '{"spectrograms": []}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'No spectrograms provided')
+
+class HourlyAnalysisInputTests(SimpleTestCase):
+    def test_windowed_inputs_use_one_stft(self):
+        import librosa
+        from .management.commands.run_hourly_analysis import Command
+
+        with mock.patch('librosa.stft', wraps=librosa.stft) as stft, override_settings(ANALYSIS_SAMPLE_RATE=0):
+            batch, windows, features = Command()._model_inputs(synthetic_audio(12), 22050, 10, 5)
+
+        self.assertEqual(stft.call_count, 1)
+        self.assertEqual(len(batch), len(windows))
+        self.assertGreater(features['spectral_centroid'], 0)
+
+ANALYSIS = {
+    name: {'predicted_class': 1, 'confidence': 90.0, 'label': 'Detected', 'skipped': False}
+    for name in ('BNQ', 'QNQ', 'TOOT')
+}
+
+class AnalysisHistoryTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root.name,
+            RECORDING_STORE_DIR=os.path.join(media_root.name, 'recordings'),
+            RECORDING_INDEX_PATH=os.path.join(media_root.name, 'recordings.sqlite3')
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        recording_store._store = None
+        self.addCleanup(setattr, recording_store, '_store', None)
+
+        self.store = recording_store.get_recording_store()
+        record = self.store.add(synthetic_audio(1), 22050, hive='hive-1')
+        self.record = self.store.attach_spectrogram(record['id'], b'png')
+        self.spectrogram_path = self.store.path(self.record['spectrogram_path'])
+
+    def test_one_recording_per_stored_recording(self):
+        first = save_analysis(ANALYSIS, recording=self.record)
+        # The frontend then posts the same spectrogram once per predictor
+        for _ in range(3):
+            again = save_analysis(ANALYSIS, spectrogram_path=os.path.relpath(self.spectrogram_path, settings.MEDIA_ROOT))
+            self.assertEqual(again.pk, first.pk)
+        self.assertEqual(Recording.objects.count(), 1)
+        self.assertEqual(Prediction.objects.count(), len(ANALYSIS))
+
+    def test_first_analysis_by_spectrogram_creates_the_recording(self):
+        row = save_analysis(ANALYSIS, spectrogram_path=self.spectrogram_path)
+        self.assertEqual(row.store_id, self.record['id'])
+        self.assertEqual(row.hive, 'hive-1')
+        self.assertIsNotNone(save_analysis(ANALYSIS, recording=self.record))
+        self.assertEqual(Recording.objects.count(), 1)
+
+    def test_unknown_spectrogram_is_not_saved(self):
+        self.assertIsNone(save_analysis(ANALYSIS, spectrogram_path='elsewhere/spectrogram.png'))
+        self.assertIsNone(save_analysis(ANALYSIS))
+        self.assertEqual(Recording.objects.count(), 0)
+
+    def test_analyze_posts_share_one_recording(self):
+        spectrogram = os.path.relpath(self.spectrogram_path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        client = Client()
+        with mock.patch('audio_analyzer.views.send_discord_message'):
+            for _ in range(3):
+                client.post('/analyze/', f'{{"spectrograms": ["{spectrogram}"]}}', content_type='application/json')
+        self.assertEqual(Recording.objects.count(), 1)
+
+class HistoryEndpointTests(TestCase):
+    def assertBadRequest(self, url, message):
+        response = Client().get(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'status': 'error', 'message': message})
+
+    def test_invalid_parameters_get_fixed_messages(self):
+        for url in ('/history/predictions/', '/history/recordings/'):
+            self.assertBadRequest(f'{url}?limit=x', 'Invalid limit: expected a positive integer')
+            self.assertBadRequest(f'{url}?limit=0', 'Invalid limit: expected a positive integer')
+            self.assertBadRequest(f'{url}?cursor=!!!', 'Invalid cursor')
+            self.assertBadRequest(f'{url}?start=2025-13-01T00:00:00', "Invalid time '2025-13-01T00:00:00': expected ISO 8601 or Unix seconds")
+
+    def test_pages_cover_every_recording_once_in_order(self):
+        from datetime import datetime, timedelta, timezone
+
+        base = datetime(2026, 1, 2, tzinfo=timezone.utc)
+        # Pairs of recordings share a timestamp, so pages must also split on id
+        for i in range(7):
+            Recording.objects.create(hive='hive-1' if i % 3 else 'hive-2', recorded_at=base + timedelta(minutes=i // 2))
+        expected = list(Recording.objects.order_by('-recorded_at', '-id').values_list('id', flat=True))
+
+        seen, cursor = [], None
+        while True:
+            url = '/history/recordings/?limit=2' + (f'&cursor={cursor}' if cursor else '')
+            page = Client().get(url).json()
+            self.assertLessEqual(len(page['results']), 2)
+            seen.extend(row['id'] for row in page['results'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+
+        page = Client().get('/history/recordings/?hive=hive-2&start=2026-01-02T00:01:00Z').json()
+        self.assertEqual([row['id'] for row in page['results']],
+                         list(Recording.objects.filter(hive='hive-2', recorded_at__gte=base + timedelta(minutes=1))
+                              .order_by('-recorded_at', '-id').values_list('id', flat=True)))
+
+class PredictionCacheTests(SimpleTestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = PredictionCache(max_entries=2)
+        cache.put('a', (1, 0.9, 0.9, 0.9))
+        cache.put('b', (0, 0.8, 0.8, 0.8))
+        cache.get('a')
+        cache.put('c', (1, 0.7, 0.7, 0.7))
+        self.assertEqual(cache.get('a'), (1, 0.9, 0.9, 0.9))
+        self.assertIsNone(cache.get('b'))
+
+    def test_model_version_is_part_of_the_key(self):
+        cache = PredictionCache()
+        input_hash = content_hash(np.zeros((224, 224, 3), dtype=np.float32))
+        cache.put(PredictionCache.make_key('BNB', 'v0001', input_hash), (1, 0.9, 0.9, 0.9))
+        self.assertIsNone(cache.get(PredictionCache.make_key('BNB', 'v0002', input_hash)))
+
+    def test_persisted_entries_survive_a_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.sqlite3')
+            PredictionCache(persist_path=path).put('key', (1, 0.5, 0.5, 0.5))
+            self.assertEqual(PredictionCache(persist_path=path).get('key'), (1, 0.5, 0.5, 0.5))
+
+class MicroBatchSchedulerTests(SimpleTestCase):
+    @staticmethod
+    def tag_rows(batch, source_names):
+        # Each row's result is the marker value written into its first pixel
+        return {'BNB': [float(row[0, 0, 0]) for row in batch]}
+
+    @staticmethod
+    def marked_input(*markers):
+        batch = np.zeros((len(markers), 224, 224, 3), dtype=np.float32)
+        batch[:, 0, 0, 0] = markers
+        return batch
+
+    def test_callers_get_back_only_their_own_rows(self):
+        scheduler = MicroBatchScheduler(self.tag_rows, max_batch_size=8, max_wait_ms=200)
+        futures = [
+            scheduler.submit(self.marked_input(1, 2)),
+            scheduler.submit(self.marked_input(3)[0]),
+            scheduler.submit(self.marked_input(4, 5, 6)),
+        ]
+
+        results = [future.result(timeout=5)['BNB'] for future in futures]
+        self.assertEqual(results, [[1.0, 2.0], [3.0], [4.0, 5.0, 6.0]])
+        self.assertEqual(scheduler.metrics()['batches_run'], 1)
+
+    def test_batches_never_exceed_max_batch_size(self):
+        scheduler = MicroBatchScheduler(self.tag_rows, max_batch_size=4, max_wait_ms=200)
+        futures = [scheduler.submit(self.marked_input(i, i)) for i in range(5)]
+
+        for i, future in enumerate(futures):
+            self.assertEqual(future.result(timeout=5)['BNB'], [float(i), float(i)])
+        self.assertLessEqual(max(scheduler.metrics()['batch_size_histogram']), 4)
+
+    def test_prediction_errors_reach_every_caller_in_the_batch(self):
+        def failing(batch, source_names):
+            raise RuntimeError('model unavailable')
+
+        scheduler = MicroBatchScheduler(failing, max_batch_size=8, max_wait_ms=200)
+        futures = [scheduler.submit(self.marked_input(i)) for i in range(2)]
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+
+class WelchPsdTests(SimpleTestCase):
+    def test_blockwise_psd_matches_scipy_welch(self):
+        from scipy.signal import welch
+
+        samples = synthetic_audio(3)
+        accumulator = WelchAccumulator(22050, segment_size=1024)
+        for start in range(0, len(samples), 3000):
+            accumulator.update(samples[start:start + 3000])
+
+        freqs, psd = accumulator.psd()
+        expected_freqs, expected_psd = welch(samples.astype(np.float64), fs=22050, nperseg=1024)
+        np.testing.assert_allclose(freqs, expected_freqs)
+        np.testing.assert_allclose(psd, expected_psd, rtol=1e-6, atol=1e-12)
+
+    def test_short_clip_matches_a_single_periodogram(self):
+        from scipy.signal import welch
+
+        samples = synthetic_audio(0.02)
+        accumulator = WelchAccumulator(22050, segment_size=1024)
+        accumulator.update(samples)
+        np.testing.assert_allclose(accumulator.psd()[1], welch(samples.astype(np.float64), fs=22050, nperseg=1024)[1],
+                                   rtol=1e-6, atol=1e-12)
+
+    def test_stats_find_the_hum(self):
+        hum = 0.3 * np.sin(2 * np.pi * 250 * np.arange(5 * 22050) / 22050)
+        stats = compute_frequency_stats(hum, 22050)
+        self.assertAlmostEqual(stats['peak_frequency'], 250, delta=22050 / 4096)
+        self.assertEqual(stats['activity'], 'Normal')
+
+class RecordingStoreTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = RecordingStore(os.path.join(directory.name, 'recordings'),
+                                    os.path.join(directory.name, 'index.sqlite3'))
+        # 2026-01-02 03:04:05 UTC
+        self.recorded_at = 1767323045.0
+
+    def test_files_are_partitioned_by_hive_date_and_hour(self):
+        record = self.store.add(synthetic_audio(1), 22050, hive='hive/1', recorded_at=self.recorded_at)
+        self.assertTrue(record['audio_path'].startswith('hive_1/2026-01-02/03/'))
+        self.assertTrue(os.path.exists(self.store.path(record['audio_path'])))
+
+        record = self.store.attach_spectrogram(record['id'], b'png bytes')
+        self.assertEqual(record['spectrogram_path'].rsplit('/', 1)[0], 'hive_1/2026-01-02/03')
+        self.assertEqual(self.store.find_by_spectrogram(record['spectrogram_path'])['id'], record['id'])
+
+    def test_identical_audio_is_stored_once(self):
+        first = self.store.add(synthetic_audio(1), 22050, hive='hive-1', recorded_at=self.recorded_at)
+        second = self.store.add(synthetic_audio(1), 22050, hive='hive-1', recorded_at=self.recorded_at + 60)
+        other = self.store.add(synthetic_audio(1, seed=1), 22050, hive='hive-1', recorded_at=self.recorded_at + 60)
+        self.assertEqual(first['id'], second['id'])
+        self.assertNotEqual(first['id'], other['id'])
+
+    def test_latest_and_between(self):
+        ids = [
+            self.store.add(synthetic_audio(1, seed=i), 22050, hive=hive, recorded_at=self.recorded_at + i * 600)['id']
+            for i, hive in enumerate(['hive-1', 'hive-2', 'hive-1', 'hive-2'])
+        ]
+
+        self.assertEqual(self.store.latest()['id'], ids[3])
+        self.assertEqual(self.store.latest(hive='hive-1')['id'], ids[2])
+        self.assertIsNone(self.store.latest(hive='hive-3'))
+
+        window = self.store.between(self.recorded_at + 600, self.recorded_at + 1800)
+        self.assertEqual([record['id'] for record in window], ids[1:3])
+        window = self.store.between(self.recorded_at, self.recorded_at + 3600, hive='hive-2', limit=1)
+        self.assertEqual([record['id'] for record in window], [ids[1]])
+
+class RetrainingQueueTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.queue = RetrainingQueue(os.path.join(self.directory, 'feedback.sqlite3'), min_samples=2, replay_samples=4)
+
+    def spectrogram(self, name):
+        path = os.path.join(self.directory, f'{name}.png')
+        open(path, 'wb').close()
+        return path
+
+    def train(self, model_name):
+        fit = mock.MagicMock(return_value={'version': 'v0002'})
+        with mock.patch.object(self.queue, '_fit_and_publish', fit), \
+                mock.patch.object(self.queue, '_report'), \
+                mock.patch('audio_analyzer.retraining.model_registry'), \
+                mock.patch('audio_analyzer.retraining.load_spectrogram_batch',
+                           side_effect=lambda paths: np.zeros((len(paths), 224, 224, 3), dtype=np.float32)):
+            return self.queue.train_model(model_name), fit
+
+    def test_feedback_is_queued_per_model(self):
+        job_id = self.queue.enqueue('QNQ', self.spectrogram('a'), 1)
+        self.queue.enqueue('TOOT', self.spectrogram('b'), 0)
+
+        status = self.queue.job_status(job_id)
+        self.assertEqual((status['model'], status['status'], status['pending_for_model']), ('QNQ', QUEUED, 1))
+        self.assertEqual(self.queue.pending_count(), 2)
+        self.assertIsNone(self.queue.job_status('missing'))
+        with self.assertRaises(ValueError):
+            self.queue.enqueue('XYZ', self.spectrogram('c'), 1)
+
+    def test_min_samples_wakes_the_trainer(self):
+        self.queue.enqueue('QNQ', self.spectrogram('a'), 1)
+        self.assertFalse(self.queue._wake.is_set())
+        self.queue.enqueue('QNQ', self.spectrogram('b'), 0)
+        self.assertTrue(self.queue._wake.is_set())
+
+    def test_training_replays_earlier_labels(self):
+        first = self.queue.enqueue('QNQ', self.spectrogram('a'), 1)
+        self.assertEqual(self.train('QNQ')[0], 1)
+        self.assertEqual(self.queue.job_status(first)['status'], DONE)
+
+        second = self.queue.enqueue('QNQ', self.spectrogram('b'), 0)
+        trained, fit = self.train('QNQ')
+        _, inputs, labels, new_labels = fit.call_args.args
+        self.assertEqual((trained, len(inputs), new_labels), (1, 2, 1))
+        self.assertEqual(sorted(labels), [0, 1])
+        self.assertEqual(self.queue.job_status(second)['model_version'], 'v0002')
+
+    def test_missing_spectrograms_fail_the_job(self):
+        path = self.spectrogram('a')
+        job_id = self.queue.enqueue('BNB', path, 1)
+        os.remove(path)
+
+        self.assertEqual(self.train('BNB')[0], 0)
+        status = self.queue.job_status(job_id)
+        self.assertEqual(status['status'], FAILED)
+        self.assertIn('exist', status['error'])
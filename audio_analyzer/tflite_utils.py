@@ -0,0 +1,259 @@
+import os
+import json
+import glob
+import random
+import logging
+import threading
+import zlib
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Supported post-training quantization modes for export
+QUANTIZATION_MODES = ['none', 'dynamic', 'float16', 'int8']
+
+# File suffix per quantization mode; full-integer models live next to the float export
+QUANTIZATION_SUFFIXES = {'int8': '_int8'}
+
+# Archived spectrograms used to calibrate int8 models, relative to MEDIA_ROOT.
+# Recursive so it matches both the recording store (<hive>/<date>/<hour>/<hash>.png)
+# and the older <folder>/<name>_spectrogram_<n>.png layout.
+CALIBRATION_GLOB = 'recordings/**/*.png'
+
+# One in HOLDOUT_MODULUS spectrograms is kept out of calibration for evaluation
+HOLDOUT_MODULUS = 5
+
+def tflite_path_for(keras_path, suffix=''):
+    """
+    Return the .tflite path stored next to a .keras model
+
+    :param keras_path: Path to the .keras file
+    :param suffix: Optional variant suffix, e.g. '_int8'
+    """
+    return f"{os.path.splitext(keras_path)[0]}{suffix}.tflite"
+
+def export_info_path(tflite_path):
+    """
+    Return the path of the JSON file recording how a .tflite file was exported
+    """
+    return f"{tflite_path}.json"
+
+def read_export_info(tflite_path):
+    """
+    Return the export settings of a .tflite file, or None if they were not recorded
+    """
+    try:
+        with open(export_info_path(tflite_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def is_holdout(path):
+    """
+    Return True if a spectrogram belongs to the evaluation split
+
+    The split is a stable hash of the file name, so calibration and
+    benchmark runs agree on it without keeping a list around.
+    """
+    return zlib.crc32(os.path.basename(path).encode('utf-8')) % HOLDOUT_MODULUS == 0
+
+def find_spectrograms(pattern=None, split=None):
+    """
+    Return archived spectrogram paths matching a glob
+
+    :param pattern: Glob, relative to MEDIA_ROOT unless absolute; ** matches
+        any number of directories (default: CALIBRATION_GLOB)
+    :param split: None for all files, 'calibration' or 'holdout'
+    """
+    from django.conf import settings
+
+    pattern = pattern or CALIBRATION_GLOB
+    if not os.path.isabs(pattern):
+        pattern = os.path.join(settings.MEDIA_ROOT, pattern)
+    paths = sorted(glob.glob(pattern, recursive=True))
+    if split == 'calibration':
+        paths = [path for path in paths if not is_holdout(path)]
+    elif split == 'holdout':
+        paths = [path for path in paths if is_holdout(path)]
+    return paths
+
+def load_calibration_batch(pattern=None, max_samples=200, seed=0):
+    """
+    Load a representative dataset for full-integer quantization
+
+    :param pattern: Spectrogram glob (default: CALIBRATION_GLOB)
+    :param max_samples: Upper bound on the number of spectrograms used
+    :param seed: Seed for choosing a subset when more files are available
+    :return: float32 array of shape (N, 224, 224, 3)
+    """
+    from .spectrogram_utils import load_spectrogram_batch
+
+    paths = find_spectrograms(pattern, split='calibration')
+    if len(paths) > max_samples:
+        paths = sorted(random.Random(seed).sample(paths, max_samples))
+    logger.info(f"Calibrating with {len(paths)} spectrograms")
+    return load_spectrogram_batch(paths)
+
+def _load_interpreter_class():
+    """
+    Prefer the standalone tflite_runtime package, fall back to TensorFlow
+    """
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+def convert_keras_to_tflite(keras_path, output_path=None, quantization='none', calibration_data=None):
+    """
+    Convert a saved Keras model to a TFLite flatbuffer
+
+    :param keras_path: Path to the .keras file
+    :param output_path: Destination .tflite path (default: next to the .keras
+        file, with the quantization mode's suffix)
+    :param quantization: 'none', 'dynamic' (int8 weights), 'float16' or
+        'int8' (int8 weights, activations, inputs and outputs)
+    :param calibration_data: float32 array of model inputs; required for 'int8'
+    :return: Path of the written .tflite file
+    """
+    import tensorflow as tf
+
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unsupported quantization '{quantization}', expected one of {QUANTIZATION_MODES}")
+    if quantization == 'int8' and (calibration_data is None or len(calibration_data) == 0):
+        raise ValueError("int8 quantization needs calibration data")
+
+    model = tf.keras.models.load_model(keras_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if quantization == 'dynamic':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif quantization == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        def representative_dataset():
+            for sample in calibration_data:
+                yield [np.asarray(sample, dtype=np.float32)[np.newaxis]]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        # Fail the conversion rather than silently keeping float ops
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    tflite_model = converter.convert()
+
+    output_path = output_path or tflite_path_for(keras_path, QUANTIZATION_SUFFIXES.get(quantization, ''))
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(tflite_model)
+    os.replace(tmp_path, output_path)
+
+    # Recorded so the file can be re-exported the same way when the model changes
+    with open(f"{export_info_path(output_path)}.tmp", 'w') as f:
+        json.dump({'source': os.path.abspath(keras_path), 'quantization': quantization}, f)
+    os.replace(f"{export_info_path(output_path)}.tmp", export_info_path(output_path))
+
+    logger.info(f"Exported {keras_path} to {output_path} "
+                f"({len(tflite_model) / 1024:.1f} KiB, quantization={quantization})")
+    return output_path
+
+def refresh_tflite_exports(keras_path):
+    """
+    Re-export the .tflite files next to a Keras model after it was changed
+
+    Only variants that were exported before are refreshed, each with the
+    quantization it was exported with (int8 is calibrated again on the
+    archived spectrograms). Without this a TFLite backend keeps serving the
+    weights the model had when it was last exported.
+
+    :param keras_path: Path to the .keras file
+    :return: List of refreshed .tflite paths
+    """
+    refreshed = []
+    for suffix in ('', QUANTIZATION_SUFFIXES['int8']):
+        tflite_path = tflite_path_for(keras_path, suffix)
+        if not os.path.exists(tflite_path):
+            continue
+        info = read_export_info(tflite_path) or {}
+        quantization = 'int8' if suffix else info.get('quantization', 'none')
+        try:
+            calibration_data = load_calibration_batch() if quantization == 'int8' else None
+            refreshed.append(convert_keras_to_tflite(keras_path, tflite_path, quantization, calibration_data))
+        except Exception as e:
+            logger.error(f"Could not re-export {tflite_path} ({quantization}): {e}")
+    return refreshed
+
+class TFLitePredictor:
+    def __init__(self, model_path, num_threads=None):
+        """
+        Run a .tflite model with preallocated input and output tensors
+
+        Exposes predict_on_batch() so it can stand in for a Keras model in
+        inference.predict_batch. Quantized (int8/uint8) inputs and outputs are
+        converted using the tensor's scale and zero point.
+
+        :param model_path: Path to the .tflite file
+        :param num_threads: Interpreter threads (default: TFLite's choice)
+        """
+        Interpreter = _load_interpreter_class()
+        self.model_path = model_path
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        # The interpreter is not thread-safe; serialize invocations
+        self._lock = threading.Lock()
+
+    @property
+    def input_dtype(self):
+        return self._input['dtype']
+
+    def _resize(self, batch_size):
+        """
+        Reallocate tensors only when the batch size changes
+        """
+        if batch_size == self._batch_size:
+            return
+        shape = list(self._input['shape'])
+        shape[0] = batch_size
+        self.interpreter.resize_tensor_input(self._input['index'], shape)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = batch_size
+
+    def _quantize_input(self, batch):
+        dtype = self._input['dtype']
+        if dtype in (np.int8, np.uint8):
+            scale, zero_point = self._input['quantization']
+            info = np.iinfo(dtype)
+            return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+        return batch.astype(dtype, copy=False)
+
+    def _dequantize_output(self, output):
+        if self._output['dtype'] in (np.int8, np.uint8):
+            scale, zero_point = self._output['quantization']
+            return (output.astype(np.float32) - zero_point) * scale
+        return output
+
+    def predict_on_batch(self, batch):
+        """
+        Run the interpreter on a float32 batch of shape (N, 224, 224, 3)
+
+        :return: float32 array of model outputs, one row per input
+        """
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            self._resize(len(batch))
+            self.interpreter.set_tensor(self._input['index'], self._quantize_input(batch))
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output['index'])
+        return self._dequantize_output(output)
+
+    def predict(self, batch, verbose=0):
+        return self.predict_on_batch(batch)
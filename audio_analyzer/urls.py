@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 
 app_name = 'audio_analyzer'
@@ -16,6 +16,13 @@ urlpatterns = [
     # Spectrogram generation endpoint
     path('spectrogram/', views.generate_spectrogram, name='generate_spectrogram'),
     
+    # On-demand spectrogram of a stored recording (disk-cached)
+    re_path(r'^spectrogram/(?P<recording_id>.+)\.(?P<image_format>png|webp)$', views.recording_spectrogram, name='recording_spectrogram'),
+    
+    # Zoomable spectrogram tile pyramid of a stored recording
+    re_path(r'^spectrogram-tiles/(?P<recording_id>.+)/manifest\.json$', views.spectrogram_tile_manifest, name='spectrogram_tile_manifest'),
+    re_path(r'^spectrogram-tiles/(?P<recording_id>.+)/(?P<level>\d+)/(?P<x>\d+)_(?P<y>\d+)\.png$', views.spectrogram_tile, name='spectrogram_tile'),
+    
     # Analysis results endpoint
     path('analyze/', views.analyze_audio, name='analyze_audio'),
     
@@ -36,10 +43,26 @@ urlpatterns = [
     
     # Model retraining endpoint
     path('audio_analyzer/retrain-model/', views.retrain_model, name='retrain_model'),
+    path('audio_analyzer/retrain-jobs/<str:job_id>/', views.retrain_job_status, name='retrain_job_status'),
     
     # Blynk test endpoint
     path('test-blynk/', views.test_blynk, name='test_blynk'),
     
     # Blynk connection test endpoint
     path('test-blynk-connection/', views.test_blynk_connection, name='test_blynk_connection'),
+    
+    # Model registry endpoints (per worker process)
+    path('models/status/', views.model_status, name='model_status'),
+    path('models/warm/', views.warm_models, name='warm_models'),
+    path('models/unload/', views.unload_models, name='unload_models'),
+    
+    # Continuous audio capture status endpoint
+    path('capture/status/', views.capture_status, name='capture_status'),
+    
+    # Analysis history (keyset-paginated, newest first)
+    path('history/recordings/', views.recording_history, name='recording_history'),
+    path('history/predictions/', views.prediction_history, name='prediction_history'),
+    
+    # Inference micro-batching metrics endpoint
+    path('inference/metrics/', views.inference_metrics, name='inference_metrics'),
 ]
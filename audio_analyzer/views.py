@@ -1,18 +1,16 @@
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend before importing pyplot
-
 import os
 import logging
 import numpy as np
 import sounddevice as sd
-import librosa
-import matplotlib.pyplot as plt
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse
+from django.urls import Resolver404, resolve, reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.conf import settings
+from django.db.models import Prefetch
 from django.views.decorators.csrf import csrf_exempt
 from django.core.files.storage import default_storage
-from scipy.io import wavfile
 import json
 import soundfile as sf
 import re
@@ -21,14 +19,6 @@ import requests
 import time
 from datetime import datetime, timedelta  # Added timedelta for good measure
 
-import tensorflow as tf
-
-import sys
-sys.path.append(os.path.join(settings.BASE_DIR, 'predictors'))
-import BNBpredictor
-import QNQpredictor
-import TOOTpredictor
-
 # Import Discord utilities
 from .discord_utils import send_discord_message
 
@@ -36,7 +26,38 @@ from .discord_utils import send_discord_message
 from .blynk_utils import blynk_connection
 
 # Import Google Sheets utility
-from .sheets_utils import save_frequency_to_sheets
+from .sheets_utils import save_frequency_to_sheets, save_prediction_to_sheets
+
+# Import the lazy model registry shared by the predictors
+from .model_registry import model_registry
+
+# Import spectrogram rendering utilities
+from .audio_features import compute_spectral_features
+from .frequency_stats import classify_activity, frequency_stats_from_file
+from .spectrogram_utils import (
+    compute_spectrogram_db,
+    compute_stft_magnitude,
+    decimate,
+    load_analysis_audio,
+    render_audio_spectrogram,
+    render_spectrogram_rgb,
+    rgb_to_model_input,
+    save_spectrogram_image
+)
+from .spectrogram_renderer import encode_image
+
+# Import batched inference shared by all predictors
+from .inference import PREDICTOR_SPECS, aggregate_window_results, build_input_batch, run_predictors, stage_metrics
+from .inference_scheduler import get_inference_scheduler
+from .model_server import get_model_server_client
+from .prediction_cache import get_prediction_cache
+from .retraining import get_retraining_queue
+from .audio_capture import get_capture_service, record_clip
+from .recording_store import get_recording_store
+from .history import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, filter_history, history_page, parse_time, save_analysis
+from .models import Prediction, Recording
+from .spectrogram_cache import get_spectrogram_cache
+from .spectrogram_tiles import ensure_tile_pyramid, load_manifest, pyramid_dir, start_tile_build, tile_path
 
 logger = logging.getLogger(__name__)
 
@@ -67,34 +88,23 @@ def record_audio(request):
     """
     try:
         # Get device and recording parameters from request
-        device_index = int(request.POST.get('device', 0))
+        device_index = int(request.POST['device']) if request.POST.get('device') not in (None, '') else None
         duration = float(request.POST.get('duration', 5))  # seconds
         sample_rate = int(request.POST.get('sample_rate', 44100))  # Hz
         
-        # Record audio from specified device
-        recording = sd.rec(
-            int(duration * sample_rate), 
-            samplerate=sample_rate, 
-            channels=1, 
-            dtype='float64',
-            device=device_index
-        )
-        sd.wait()
-        
-        # Save recording
-        audio_filename = 'bee_recording.wav'
-        audio_path = os.path.join(settings.MEDIA_ROOT, audio_filename)
+        # Take the clip from the capture buffer, or record it from the specified device
+        recording = capture_audio(duration, sample_rate, device_index)
         
-        # Ensure media directory exists
-        os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
-        
-        # Write audio file using scipy
-        wavfile.write(audio_path, sample_rate, (recording * 32767).astype(np.int16))
+        # Save recording to the recording store (hive/date/hour, content-hash name)
+        store = get_recording_store()
+        record = store.add(recording, sample_rate)
+        audio_filename = os.path.relpath(store.path(record['audio_path']), settings.MEDIA_ROOT).replace(os.sep, '/')
         
         return JsonResponse({
             'status': 'success', 
             'message': 'Audio recorded successfully',
             'filename': audio_filename,
+            'recording': record['id'],
             'device': device_index
         })
     
@@ -164,18 +174,16 @@ def generate_spectrogram(request=None, audio_path=None, predictor_type='BNQ'):
         # Ensure media directory exists
         os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
         
-        # If called from URL route, find the most recent audio file
+        # If called from URL route, use the most recent recording in the store index
         if request is not None:
-            # Find the most recent audio file
-            audio_files = [f for f in os.listdir(settings.MEDIA_ROOT) if f.startswith('bee_recording')]
-            if not audio_files:
+            latest = get_recording_store().latest()
+            if latest is None:
                 return JsonResponse({
                     'status': 'error',
                     'message': 'No audio file found'
                 }, status=404)
             
-            # Use the most recent audio file
-            audio_path = os.path.join(settings.MEDIA_ROOT, max(audio_files, key=lambda f: os.path.getctime(os.path.join(settings.MEDIA_ROOT, f))))
+            audio_path = get_recording_store().path(latest['audio_path'])
         
         # Validate audio path
         if audio_path is None or not os.path.exists(audio_path):
@@ -192,24 +200,17 @@ def generate_spectrogram(request=None, audio_path=None, predictor_type='BNQ'):
         spectrogram_filename = f'BeemoDosSpectrogram_{predictor_type}_{timestamp}.png'
         spectrogram_path = os.path.join(settings.MEDIA_ROOT, spectrogram_filename)
         
-        # Load audio file
-        y, sr = librosa.load(audio_path)
+        # Load audio file (decimated to ANALYSIS_SAMPLE_RATE when set)
+        y, sr = load_analysis_audio(audio_path, getattr(settings, 'ANALYSIS_SAMPLE_RATE', 0))
         
-        # Create spectrogram
-        plt.figure(figsize=(12, 8))
-        librosa.display.specshow(
-            librosa.amplitude_to_db(np.abs(librosa.stft(y)), ref=np.max), 
-            sr=sr, 
-            x_axis='time', 
-            y_axis='hz'
+        # Create and save spectrogram
+        save_spectrogram_image(
+            compute_spectrogram_db(y), 
+            sr, 
+            f'Spectrogram - {predictor_type}', 
+            spectrogram_path, 
+            figsize=(12, 8)
         )
-        plt.colorbar(format='%+2.0f dB')
-        plt.title(f'Spectrogram - {predictor_type}')
-        plt.tight_layout()
-        
-        # Save spectrogram
-        plt.savefig(spectrogram_path)
-        plt.close()
         
         # If called from URL route, return JSON response
         if request is not None:
@@ -234,16 +235,51 @@ def generate_spectrogram(request=None, audio_path=None, predictor_type='BNQ'):
         # If called programmatically, return None
         return None
 
+def capture_audio(duration, sample_rate, device_index=None, fresh=False):
+    """
+    Record a mono clip from the selected input device
+    
+    With AUDIO_CAPTURE_ENABLED the clip is the most recent audio from the
+    continuous capture buffer, returned without waiting for a new recording.
+    
+    Args:
+        duration (float): Recording length in seconds
+        sample_rate (int): Sampling rate in Hz
+        device_index (int, optional): Input device index, defaults to the system default
+        fresh (bool): Wait for new audio instead of returning buffered audio,
+            so consecutive captures are separate takes
+    
+    Returns:
+        np.ndarray: 1-D array of samples
+    """
+    return record_clip(duration, sample_rate, device_index, fresh=fresh)
+
 @csrf_exempt
 def record_and_generate_spectrograms(request):
     """
     Record audio for multiple predictors and generate spectrograms
+    
+    By default a single capture and a single STFT are shared by all
+    predictors. Pass ``"single_capture": false`` to record separately for
+    each predictor; with the capture service each take then waits for new
+    audio, so the takes are consecutive rather than copies of the same
+    buffered clip. Model inputs are built in memory; pass
+    ``"save_spectrograms": false`` (default: settings.SAVE_SPECTROGRAM_IMAGES)
+    to skip writing the PNG files, in which case the returned spectrogram
+    URLs point at the on-demand spectrogram endpoint. Captures are written
+    to the recording store (see recording_store) under ``"hive_id"``
+    (default: settings.RECORDING_DEFAULT_HIVE). The response includes
+    per-stage timings in milliseconds.
     """
     try:
         # Parse request data
         data = json.loads(request.body)
         duration = data.get('duration', 5)  # Default 5 seconds
         device_index = data.get('device_index', None)
+        single_capture = bool(data.get('single_capture', True))
+        save_spectrograms = bool(data.get('save_spectrograms', getattr(settings, 'SAVE_SPECTROGRAM_IMAGES', True)))
+        request_start = time.perf_counter()
+        timings = {'record_ms': 0.0, 'stft_ms': 0.0, 'features_ms': 0.0, 'render_ms': 0.0, 'analysis_ms': 0.0}
 
         # Validate inputs
         if not isinstance(duration, (int, float)) or duration <= 0:
@@ -261,117 +297,96 @@ def record_and_generate_spectrograms(request):
         all_spectrograms = {}
         analysis_results = {}
 
-        # Create directory for this recording session
-        session_timestamp = ""
-        recordings_base_dir = os.path.join(settings.MEDIA_ROOT, 'recordings')
-        session_dir = os.path.join(recordings_base_dir, session_timestamp)
-        os.makedirs(session_dir, exist_ok=True)
-
-        # Ensure proper permissions
-        os.chmod(session_dir, 0o755)
-
-        # Detailed logging of paths
-        print("Path Configuration:")
-        print(f"BASE_DIR: {settings.BASE_DIR}")
-        print(f"MEDIA_ROOT: {settings.MEDIA_ROOT}")
-        print(f"MEDIA_URL: {settings.MEDIA_URL}")
-        print(f"Session Directory: {session_dir}")
-        print(f"Recordings Base Directory: {recordings_base_dir}")
-
-        # Find the most recent recording directory
-        try:
-            # List all subdirectories in the recordings directory
-            existing_sessions = [
-                d for d in os.listdir(recordings_base_dir) 
-                if os.path.isdir(os.path.join(recordings_base_dir, d))
-            ]
-            
-            # Sort sessions by timestamp (newest first)
-            existing_sessions.sort(reverse=True)
-            
-            print("Existing Recording Sessions:", existing_sessions)
-        except Exception as dir_list_error:
-            print(f"Error listing recording sessions: {dir_list_error}")
-            existing_sessions = []
-
-        # Record and process for each predictor
+        # Every capture goes to the recording store under its hive, date, hour and content hash
+        store = get_recording_store()
+        hive_id = data.get('hive_id') or None
+        stored_recordings = []
+
+        # Record and process. In single-capture mode one recording and one
+        # STFT feed every predictor; otherwise each predictor gets its own take.
+        sample_rate = 44100
+        analysis_sample_rate = getattr(settings, 'ANALYSIS_SAMPLE_RATE', 0)
+        capture_targets = ['shared'] if single_capture else predictors
+        input_arrays = []
+        spectral_features = {}
         for predictor in predictors:
-            predictor_recordings = []
-            predictor_spectrograms = []
-
-            for i in range(num_recordings):
-                # Generate unique filenames
-                audio_filename = f'{predictor}_recording_{i+1}.wav'
-                spectrogram_filename = f'{predictor}_spectrogram_{i+1}.png'
-                
-                # Full paths with absolute resolution
-                audio_path = os.path.abspath(os.path.join(session_dir, audio_filename))
-                spectrogram_path = os.path.abspath(os.path.join(session_dir, spectrogram_filename))
+            all_recordings[predictor] = []
+            all_spectrograms[predictor] = []
 
+        for i in range(num_recordings):
+            for target in capture_targets:
                 # Record audio
-                sample_rate = 44100
-                recording = sd.rec(
-                    int(duration * sample_rate), 
-                    samplerate=sample_rate, 
-                    channels=1, 
-                    dtype='float64',
-                    device=device_index
-                )
-                sd.wait()  # Wait for recording to complete
+                stage_start = time.perf_counter()
+                recording = capture_audio(duration, sample_rate, device_index, fresh=not single_capture)
+                timings['record_ms'] += (time.perf_counter() - stage_start) * 1000
 
                 # Save audio file
-                sf.write(audio_path, recording, sample_rate)
-                os.chmod(audio_path, 0o644)
-
-                # Generate spectrogram
-                plt.figure(figsize=(10, 4))
-                librosa.display.specshow(
-                    librosa.amplitude_to_db(
-                        np.abs(librosa.stft(recording.flatten())), 
-                        ref=np.max
-                    ), 
-                    sr=sample_rate, 
-                    x_axis='time', 
-                    y_axis='hz'
-                )
-                plt.colorbar(format='%+2.0f dB')
-                plt.title(f'{predictor} Spectrogram')
-                plt.tight_layout()
-                plt.savefig(spectrogram_path)
-                os.chmod(spectrogram_path, 0o644)
-                plt.close()
+                record = store.add(recording, sample_rate, hive=hive_id)
+                audio_path = store.path(record['audio_path'])
+
+                # Decimate to the analysis rate and compute the STFT once for this capture
+                stage_start = time.perf_counter()
+                analysis_samples, analysis_rate = decimate(recording, sample_rate, analysis_sample_rate)
+                magnitude = compute_stft_magnitude(analysis_samples)
+                spectrogram_db = compute_spectrogram_db(analysis_samples, magnitude=magnitude)
+                timings['stft_ms'] += (time.perf_counter() - stage_start) * 1000
+
+                # Spectral features from the same STFT
+                stage_start = time.perf_counter()
+                spectral_features[target] = compute_spectral_features(analysis_samples, analysis_rate, magnitude=magnitude)
+                timings['features_ms'] += (time.perf_counter() - stage_start) * 1000
+
+                # Build the model input in memory; the PNG is an optional side output
+                stage_start = time.perf_counter()
+                title = 'Spectrogram' if single_capture else f'{target} Spectrogram'
+                rgb = render_spectrogram_rgb(spectrogram_db, analysis_rate, title, figsize=(10, 4))
+                input_arrays.append(rgb_to_model_input(rgb))
+                if save_spectrograms:
+                    record = store.attach_spectrogram(record['id'], encode_image(rgb, 'PNG'))
+                timings['render_ms'] += (time.perf_counter() - stage_start) * 1000
+                stored_recordings.append(record)
 
                 # Relative paths for frontend
-                rel_audio_path = os.path.relpath(audio_path, settings.MEDIA_ROOT)
-                rel_spectrogram_path = os.path.relpath(spectrogram_path, settings.MEDIA_ROOT)
-
-                # Detailed path logging
-                print(f"\nSpectrogram for {predictor}:")
-                print(f"  Full Path: {spectrogram_path}")
-                print(f"  Relative Path: {rel_spectrogram_path}")
-                print(f"  Media URL Path: {settings.MEDIA_URL}{rel_spectrogram_path}")
-                print(f"  File Exists: {os.path.exists(spectrogram_path)}")
-
-                # Store recordings and spectrograms
-                predictor_recordings.append({
-                    'audio_path': rel_audio_path,
-                    'spectrogram_path': rel_spectrogram_path
-                })
-                
-                # Use full media URL
-                predictor_spectrograms.append(f'{settings.MEDIA_URL}{rel_spectrogram_path}')
-
-            # Store for each predictor
-            all_recordings[predictor] = predictor_recordings
-            all_spectrograms[predictor] = predictor_spectrograms
+                rel_audio_path = os.path.relpath(audio_path, settings.MEDIA_ROOT).replace(os.sep, '/')
+                rel_spectrogram_path = None
+                if save_spectrograms:
+                    spectrogram_path = store.path(record['spectrogram_path'])
+                    rel_spectrogram_path = os.path.relpath(spectrogram_path, settings.MEDIA_ROOT).replace(os.sep, '/')
+
+                    # Detailed path logging
+                    print(f"\nSpectrogram for {target}:")
+                    print(f"  Full Path: {spectrogram_path}")
+                    print(f"  Relative Path: {rel_spectrogram_path}")
+                    print(f"  Media URL Path: {settings.MEDIA_URL}{rel_spectrogram_path}")
+                    print(f"  File Exists: {os.path.exists(spectrogram_path)}")
+
+                # Store recordings and spectrograms for every predictor fed by this capture
+                for predictor in (predictors if single_capture else [target]):
+                    all_recordings[predictor].append({
+                        'id': record['id'],
+                        'hive': record['hive'],
+                        'recorded_at': record['recorded_at'],
+                        'audio_path': rel_audio_path,
+                        'recording_id': os.path.splitext(rel_audio_path)[0],
+                        'spectrogram_path': rel_spectrogram_path
+                    })
+                    
+                    # Use full media URL, or render on demand when no PNG was written
+                    if rel_spectrogram_path:
+                        all_spectrograms[predictor].append(f'{settings.MEDIA_URL}{rel_spectrogram_path}')
+                    else:
+                        all_spectrograms[predictor].append(recording_spectrogram_url(audio_path))
 
-        # Collect all spectrogram paths for analysis
+        # Collect all spectrogram paths for analysis (shared captures only once)
         all_spectrogram_paths = []
         for predictor, paths in all_spectrograms.items():
             # Convert from media URL to relative path
             for path in paths:
+                if not path.startswith(settings.MEDIA_URL):
+                    continue
                 rel_path = path.replace(settings.MEDIA_URL, '')
-                all_spectrogram_paths.append(rel_path)
+                if rel_path not in all_spectrogram_paths:
+                    all_spectrogram_paths.append(rel_path)
         
         # Initialize analysis_results with default values
         analysis_results = {
@@ -381,8 +396,8 @@ def record_and_generate_spectrograms(request):
         }
         
         # Analyze the spectrograms and send Discord notification
-        if all_spectrogram_paths:
-            logger.info(f"Calling analyze_audio with {len(all_spectrogram_paths)} spectrograms")
+        if all_spectrogram_paths or input_arrays:
+            logger.info(f"Calling analyze_audio with {len(input_arrays)} in-memory spectrograms")
             
             # Create a mock request with the spectrogram paths in the body
             class MockRequest:
@@ -392,7 +407,15 @@ def record_and_generate_spectrograms(request):
             # Call analyze_audio
             try:
                 logger.info(f"About to call analyze_audio with paths: {all_spectrogram_paths}")
-                analysis_response = analyze_audio(MockRequest())
+                stage_start = time.perf_counter()
+                analysis_response = analyze_audio(
+                    MockRequest(), 
+                    input_arrays=input_arrays, 
+                    features=next(iter(spectral_features.values()), None),
+                    hive_id=hive_id,
+                    recording=stored_recordings[0] if stored_recordings else None
+                )
+                timings['analysis_ms'] = (time.perf_counter() - stage_start) * 1000
                 logger.info(f"analyze_audio response status: {analysis_response.status_code}")
                 
                 # Debug the response content
@@ -409,15 +432,21 @@ def record_and_generate_spectrograms(request):
         else:
             logger.warning("No spectrograms available for analysis")
 
+        timings['total_ms'] = (time.perf_counter() - request_start) * 1000
+        timings = {stage: round(ms, 2) for stage, ms in timings.items()}
+        logger.info(f"Recording pipeline timings: {timings}")
+
         # Return successful response
         return JsonResponse({
             'status': 'success',
+            'single_capture': single_capture,
             'recordings': all_recordings,
             'spectrograms': all_spectrograms,
             'analysis_results': analysis_results,
+            'spectral_features': spectral_features,
+            'timings': timings,
             'debug_info': {
-                'existing_sessions': existing_sessions,
-                'current_session': session_timestamp
+                'stored_recordings': [stored['id'] for stored in stored_recordings]
             }
         })
 
@@ -439,7 +468,34 @@ def predictors_view(request):
     return render(request, 'predictors.html')
 
 @csrf_exempt
-def analyze_audio(request):
+def analyze_audio(request, input_arrays=None, windows=None, hive_id=None, predictions=None, features=None,
+                  recording=None):
+    """
+    Run the BNQ, QNQ and TOOT predictors on spectrograms
+    
+    All spectrograms are decoded once into a single batch and each model is
+    called once for the whole batch.
+    
+    Args:
+        request (HttpRequest): POST with JSON {"spectrograms": [relative paths]}
+        input_arrays (list, optional): Preprocessed model inputs built in memory
+            (see spectrogram_utils.spectrogram_to_model_input). When given they
+            are used instead of decoding the spectrogram files.
+        windows (list, optional): (start_seconds, end_seconds) of each input
+            when they are windows of one recording. Each predictor then gets
+            an 'aggregate' (see inference.aggregate_window_results) and its
+            headline result is the window with the highest positive-class
+            probability.
+        hive_id (str, optional): Hive the audio was recorded at; added to the
+            response and the Discord message
+        predictions (dict, optional): run_predictors results for input_arrays
+            when the caller already predicted them, e.g. batched with other hives
+        features (dict, optional): audio_features.compute_spectral_features of
+            the recording, used for the Discord frequency summary instead of
+            reading the WAV file again
+        recording (dict, optional): recording_store record of the analysed
+            audio, stored with the results in the analysis history
+    """
     try:
         # Ensure Django settings are imported at the top of the function
         from django.conf import settings
@@ -452,82 +508,140 @@ def analyze_audio(request):
         spectrograms = data.get('spectrograms', [])
 
         # Validate input
-        if not spectrograms:
+        if not spectrograms and not input_arrays:
             return JsonResponse({'error': 'No spectrograms provided'}, status=400)
 
+        # Resolve every spectrogram path relative to the media root
+        spectrogram_paths = [
+            path if os.path.isabs(path) else os.path.join(settings.MEDIA_ROOT, path)
+            for path in spectrograms
+        ]
+
+        # Build one input batch and run each predictor once over all of it
+        spectrogram_count = 0
+        try:
+            if not input_arrays:
+                # Ensure the files exist before prediction
+                missing_paths = [path for path in spectrogram_paths if not os.path.exists(path)]
+                for path in missing_paths:
+                    logger.error(f"Spectrogram file not found: {path}")
+                spectrogram_paths = [path for path in spectrogram_paths if path not in missing_paths]
+                if not spectrogram_paths:
+                    raise FileNotFoundError(f"Spectrogram file not found: {missing_paths[0]}")
+
+            batch = build_input_batch(spectrogram_paths, input_arrays)
+            spectrogram_count = len(batch)
+            source_names = [os.path.basename(path) for path in spectrogram_paths]
+            if len(source_names) != len(batch):
+                source_names = None
+            logger.info(f"Predicting {len(batch)} spectrogram(s) with {len(PREDICTOR_SPECS)} models")
+            if predictions is not None:
+                batch_results = predictions
+            else:
+                batch_results = run_predictors(batch, source_names)
+        except Exception as e:
+            logger.error(f"Error preparing spectrogram batch: {e}")
+            source_names = None
+            batch_results = {spec['name']: e for spec in PREDICTOR_SPECS}
+
         # Perform analysis for each predictor
         analysis_results = {}
 
-        # Predictor configurations with more robust error handling
-        predictors = [
-            {
-                'name': 'BNQ',
-                'function': BNBpredictor.predict_and_display,
-                'labels': ['No Bees Detected', 'Bees Detected']
-            },
-            {
-                'name': 'QNQ',
-                'function': QNQpredictor.QNQpredictor,
-                'labels': ['No Queen Detected', 'Queen Detected']
-            },
-            {
-                'name': 'TOOT',
-                'function': TOOTpredictor.predict_and_display,
-                'labels': ['No Tooting', 'Tooting']
-            }
-        ]
-
-        # Process each predictor
-        for predictor in predictors:
-            try:
-                # Convert relative path to absolute path if needed
-                spectrogram_path = spectrograms[0]
-                if not os.path.isabs(spectrogram_path):
-                    spectrogram_path = os.path.join(settings.MEDIA_ROOT, spectrogram_path)
-                
-                # Ensure the file exists before prediction
-                if not os.path.exists(spectrogram_path):
-                    logger.error(f"Spectrogram file not found: {spectrogram_path}")
-                    raise FileNotFoundError(f"Spectrogram file not found: {spectrogram_path}")
-                
-                logger.info(f"Predicting {predictor['name']} using file: {spectrogram_path}")
-                result = predictor['function'](spectrogram_path)
-                
-                # Log raw result for debugging
-                logger.info(f"{predictor['name']} Raw Result: {result}")
-                
-                # Safely extract prediction details with extensive error checking
-                if not isinstance(result, (list, tuple)) or len(result) < 2:
-                    logger.error(f"{predictor['name']} returned invalid result: {result}")
-                    raise ValueError(f"Invalid prediction result for {predictor['name']}")
-                
-                # Handle different return formats (4 or 2 elements)
-                if len(result) == 4:
-                    predicted_class, confidence, f1, precision = result
-                else:
-                    predicted_class, confidence = result
-                    f1, precision = 0.0, 0.0
-                
+        for predictor in PREDICTOR_SPECS:
+            results = batch_results.get(predictor['name'])
+            if isinstance(results, Exception) or not results:
+                error = results if isinstance(results, Exception) else 'No prediction returned'
+                logger.error(f"{predictor['name']} prediction error: {error}")
+                analysis_results[predictor['name']] = {
+                    'predicted_class': 0,
+                    'confidence': 0.0,  # Keep as 0.0 for failed predictions
+                    'label': 'Prediction Failed',
+                    'error': str(error)
+                }
+                continue
+
+            entries = []
+            for i, result in enumerate(results):
+                if result is None:
+                    # Skipped by the inference cascade (confident "No Bees Detected")
+                    gate = predictor['skip_if']
+                    gate_result = batch_results[gate['predictor']][i]
+                    gate_label = next(
+                        spec['labels'][gate['predicted_class']] for spec in PREDICTOR_SPECS
+                        if spec['name'] == gate['predictor']
+                    )
+                    entries.append({
+                        'predicted_class': 0,
+                        'confidence': 0.0,
+                        'label': f"Skipped ({gate_label})",
+                        'f1_score': 0.0,
+                        'precision': 0.0,
+                        'skipped': True,
+                        'skip_reason': (
+                            f"{gate['predictor']} predicted {gate_label} "
+                            f"with {gate_result[1] * 100:.1f}% confidence"
+                        ),
+                        'raw_result': None
+                    })
+                    continue
+
+                predicted_class, confidence, f1, precision = result
                 # Log detailed prediction information
                 logger.info(f"{predictor['name']} Prediction - Class: {predicted_class}, Raw Confidence: {confidence}")
-                
-                # Store results with explicit type conversion
-                analysis_results[predictor['name']] = {
+                entries.append({
                     'predicted_class': int(predicted_class),
                     'confidence': float(confidence) * 100,  # Multiply by 100 for frontend display
                     'label': predictor['labels'][int(predicted_class)],
                     'f1_score': float(f1),
                     'precision': float(precision),
-                    'raw_result': list(result)  # Ensure full result is preserved
-                }
-            except Exception as e:
-                logger.error(f"{predictor['name']} prediction error: {e}")
-                analysis_results[predictor['name']] = {
-                    'predicted_class': 0,
-                    'confidence': 0.0,  # Keep as 0.0 for failed predictions
-                    'label': 'Prediction Failed',
-                    'error': str(e)
-                }
+                    'raw_result': [predicted_class, confidence, f1, precision],
+                    'skipped': False
+                })
+
+            if windows and len(windows) == len(entries):
+                # Windows of one recording: report the strongest window and the aggregates
+                aggregate = aggregate_window_results(results)
+                analysis_results[predictor['name']] = dict(entries[aggregate['peak_window']], aggregate=aggregate)
+                analysis_results[predictor['name']]['per_window'] = [
+                    dict(entry, start_seconds=windows[i][0], end_seconds=windows[i][1])
+                    for i, entry in enumerate(entries)
+                ]
+                continue
+
+            # The first spectrogram keeps the existing response shape; every
+            # spectrogram in the request is listed when more than one was sent
+            analysis_results[predictor['name']] = dict(entries[0])
+            if len(entries) > 1:
+                analysis_results[predictor['name']]['per_spectrogram'] = [
+                    dict(entry, file=source_names[i] if source_names else None)
+                    for i, entry in enumerate(entries)
+                ]
+
+        # Keep the results in the analysis history (Recording, Prediction, FeatureVector)
+        if getattr(settings, 'ANALYSIS_HISTORY_ENABLED', True):
+            try:
+                save_analysis(
+                    analysis_results, hive=hive_id, recording=recording, features=features,
+                    spectrogram_path=spectrogram_paths[0] if spectrogram_paths else None
+                )
+            except Exception as history_error:
+                logger.error(f"Error saving analysis history: {history_error}")
+
+        # One Sheets row per predictor for the recording, not one per window or spectrogram
+        if recording is not None:
+            sheet_filename = os.path.basename(recording['audio_path'])
+        else:
+            sheet_filename = source_names[0] if source_names else (hive_id or 'recording')
+        for predictor in PREDICTOR_SPECS:
+            result = analysis_results[predictor['name']]
+            if 'error' in result or result.get('skipped'):
+                continue
+            save_prediction_to_sheets(predictor['sheet_type'], {
+                'model': predictor['name'],
+                'filename': sheet_filename,
+                'prediction': result['label'],
+                'confidence': result['confidence'] / 100
+            })
 
         # Trigger Blynk event with analysis results
         try:
@@ -568,6 +682,10 @@ def analyze_audio(request):
             def get_blynk_result(predictor_key):
                 predictor_result = safe_analysis_results.get(predictor_key, {})
                 confidence = predictor_result.get('confidence', 0)
+
+                # A stage skipped by the cascade has no result to act on
+                if predictor_result.get('skipped'):
+                    return predictor_result['label']
                 
                 # Determine positive or negative message based on confidence
                 action_type = 'positive' if confidence > 50 else 'negative'
@@ -620,7 +738,7 @@ def analyze_audio(request):
         # Send notification to Discord with analysis results
         try:
             # Format the message with prediction results in JSON-like format
-            message = "**BeemoDos Analysis Results**\n"
+            message = "**BeemoDos Analysis Results**" + (f" - Hive {hive_id}" if hive_id else "") + "\n"
             message += "```json\n{"
             
             # Add BNB result if available
@@ -667,96 +785,49 @@ def analyze_audio(request):
             
             # Try to extract frequency information if available
             try:
+                if features is not None:
+                    # Reuse the spectral features computed from this request's STFT
+                    avg_freq = round(features['mean_frequency'], 2)
+                    peak_freq = round(features['dominant_frequency'], 2)
+                    activity = classify_activity(avg_freq, features['rms'])
+                    message += "Frequency Data: Average " + str(avg_freq) + "Hz, Peak " + str(peak_freq) + "Hz\n"
+                    message += "Activity Level: " + activity + " Activity\n"
+                    logger.info(f"Frequency analysis complete: Avg={avg_freq}Hz, Peak={peak_freq}Hz, Activity={activity}")
                 # Calculate frequency information from the audio file
-                if spectrograms and len(spectrograms) > 0:
+                elif spectrograms and len(spectrograms) > 0:
                     # Get the audio file path from the spectrogram path
                     spectrogram_path = spectrograms[0]
                     logger.info(f"Attempting frequency analysis for spectrogram: {spectrogram_path}")
                     
-                    # Extract session directory from spectrogram path
-                    # Format appears to be: recordings/20250313_152709/BNQ_spectrogram_1.png
-                    match = re.match(r'recordings/(\d+_\d+)/', spectrogram_path)
-                    if match:
-                        session_dir = match.group(1)
-                        audio_dir = os.path.join(settings.MEDIA_ROOT, 'recordings', session_dir)
-                        logger.info(f"Looking for audio files in: {audio_dir}")
+                    # Find the recording the spectrogram was stored with in the recording index
+                    store = get_recording_store()
+                    if not os.path.isabs(spectrogram_path):
+                        spectrogram_path = os.path.join(settings.MEDIA_ROOT, spectrogram_path)
+                    record = store.find_by_spectrogram(os.path.relpath(spectrogram_path, store.root).replace(os.sep, '/'))
+                    if record is not None:
+                        audio_path = store.path(record['audio_path'])
+                        logger.info(f"Using audio file for analysis: {audio_path}")
+                        
+                        # Welch PSD over fixed-size segments, streamed from the file
+                        stats = frequency_stats_from_file(audio_path)
                         
-                        # Look for WAV files in the session directory
-                        if os.path.exists(audio_dir):
-                            audio_files = [f for f in os.listdir(audio_dir) if f.endswith('.wav')]
-                            logger.info(f"Found audio files in {audio_dir}: {audio_files}")
+                        # Compute frequency statistics
+                        if stats is not None:
+                            avg_freq = stats['average_frequency']
+                            peak_freq = stats['peak_frequency']
+                            activity = stats['activity']
                             
-                            if audio_files:
-                                # Use the first audio file found
-                                audio_path = os.path.join(audio_dir, audio_files[0])
-                                logger.info(f"Using audio file for analysis: {audio_path}")
-                                
-                                # Load the audio file
-                                sample_rate, samples = wavfile.read(audio_path)
-                                
-                                # Convert stereo to mono if needed
-                                if len(samples.shape) > 1 and samples.shape[1] > 1:
-                                    samples = np.mean(samples, axis=1)
-                                
-                                # Perform FFT
-                                fft_data = np.fft.fft(samples)
-                                frequencies = np.fft.fftfreq(len(samples), 1/sample_rate)
-                                
-                                # Filter out low-frequency noise (below 20 Hz)
-                                MIN_FREQUENCY = 20
-                                mask = np.abs(frequencies) >= MIN_FREQUENCY
-                                filtered_freqs = frequencies[mask]
-                                filtered_fft = np.abs(fft_data[mask])
-                                
-                                # Compute frequency statistics
-                                if len(filtered_freqs) > 0 and len(filtered_fft) > 0:
-                                    # Find the index of the maximum amplitude in the filtered FFT data
-                                    max_idx = np.argmax(filtered_fft)
-                                    peak_freq = filtered_freqs[max_idx]
-                                    avg_freq = np.mean(np.abs(filtered_freqs))
-                                    
-                                    # Compute RMS amplitude for activity classification
-                                    rms_amplitude = np.sqrt(np.mean(samples**2)) / 32768.0
-                                    
-                                    # Classify activity level based on frequency and amplitude
-                                    if avg_freq < 100:
-                                        base_level = "Low"
-                                    elif 100 <= avg_freq <= 300:
-                                        base_level = "Normal"
-                                    elif 300 < avg_freq <= 500:
-                                        base_level = "High"
-                                    else:
-                                        base_level = "Chaotic"
-                                    
-                                    # Amplitude-based refinement
-                                    if rms_amplitude < 0.1:
-                                        activity = f"Very {base_level}"
-                                    elif 0.1 <= rms_amplitude < 0.3:
-                                        activity = f"{base_level}"
-                                    elif 0.3 <= rms_amplitude < 0.6:
-                                        activity = f"Intense {base_level}"
-                                    else:
-                                        activity = f"Extremely {base_level}"
-                                    
-                                    # Add frequency information to the message
-                                    message += "Frequency Data: Average " + str(avg_freq) + "Hz, Peak " + str(peak_freq) + "Hz\n"
-                                    message += "Activity Level: " + activity + " Activity\n"
-                                    
-                                    logger.info(f"Frequency analysis complete: Avg={avg_freq}Hz, Peak={peak_freq}Hz, Activity={activity}")
-                                else:
-                                    logger.warning("No valid frequency data found after filtering")
-                                    message += "Frequency Data: No valid frequency data found\n"
-                                    message += "Activity Level: Unknown\n"
-                            else:
-                                logger.warning(f"No audio files found in directory: {audio_dir}")
-                                message += "Frequency Data: No audio files found\n"
-                                message += "Activity Level: Unknown\n"
+                            # Add frequency information to the message
+                            message += "Frequency Data: Average " + str(avg_freq) + "Hz, Peak " + str(peak_freq) + "Hz\n"
+                            message += "Activity Level: " + activity + " Activity\n"
+                            
+                            logger.info(f"Frequency analysis complete: Avg={avg_freq}Hz, Peak={peak_freq}Hz, Activity={activity}")
                         else:
-                            logger.warning(f"Audio directory not found: {audio_dir}")
-                            message += "Frequency Data: Audio directory not found\n"
+                            logger.warning("No valid frequency data found after filtering")
+                            message += "Frequency Data: No valid frequency data found\n"
                             message += "Activity Level: Unknown\n"
                     else:
-                        logger.warning(f"Could not extract session directory from path: {spectrogram_path}")
+                        logger.warning(f"No stored recording found for spectrogram: {spectrogram_path}")
                         message += "Frequency Data: Could not locate audio file\n"
                         message += "Activity Level: Unknown\n"
                 else:
@@ -844,6 +915,8 @@ def analyze_audio(request):
 
             # Combine all notification messages
             full_notification_message = "\n\n".join(notification_messages.values())
+            if hive_id:
+                full_notification_message = f"**Hive {hive_id}**\n\n{full_notification_message}"
 
             # Send the message to Discord
             discord_result = send_discord_message(full_notification_message, spectrogram_path)
@@ -877,10 +950,12 @@ def analyze_audio(request):
         
         response_data = {
             'success': True,
-            'recording_count': 1,  # Assuming single recording
+            'recording_count': spectrogram_count,
             'status': 'Processed successfully',
             'analysis_results': serializable_results
         }
+        if hive_id:
+            response_data['hive_id'] = hive_id
 
         # Log the entire response for verification
         logger.info(f"Complete Response: {json.dumps(response_data, indent=2)}")
@@ -904,7 +979,8 @@ def retrain_model(request):
     Expects JSON payload with:
     - model_type: 'bnq', 'qnq', or 'toot'
     - true_label: 0 or 1
-    - spectrogram_path: relative path to the spectrogram image from media directory
+    - spectrogram_path: relative path to the spectrogram image from media directory,
+      or the on-demand spectrogram URL of a stored recording
     """
     # Use Django's settings to get the media root path
     MEDIA_BASE_PATH = settings.MEDIA_ROOT
@@ -933,6 +1009,7 @@ def retrain_model(request):
                 from urllib.parse import urlparse
                 parsed_url = urlparse(spectrogram_path)
                 spectrogram_path = parsed_url.path
+            on_demand_url = spectrogram_path.split('?', 1)[0]
 
             # Remove '/media/' prefix if present
             if spectrogram_path.startswith('/media/'):
@@ -957,6 +1034,14 @@ def retrain_model(request):
             # Construct full local path
             full_spectrogram_path = os.path.join(MEDIA_BASE_PATH, spectrogram_path)
 
+            # Spectrograms served on demand have no file yet: render one for training
+            if spectrogram_path and not os.path.exists(full_spectrogram_path):
+                try:
+                    full_spectrogram_path = stored_spectrogram_file(on_demand_url) or full_spectrogram_path
+                except Exception as e:
+                    logger.error(f"Could not render spectrogram for {on_demand_url}: {e}")
+                    errors.append(f"Could not render spectrogram for {on_demand_url}: {e}")
+
             # Validate file existence
             if not os.path.exists(full_spectrogram_path):
                 errors.append(f"Spectrogram file not found: {full_spectrogram_path}")
@@ -973,57 +1058,32 @@ def retrain_model(request):
                     'details': errors
                 }, status=400)
 
-            # Dynamically import the correct retraining function
+            # Queue the label; the background trainer fine-tunes in mini-batches
             try:
-                # Select retraining function based on model type
-                if model_type == 'bnq':
-                    from predictors.BNBpredictor import manual_set_true_label_and_retrain as retrain_func
-                elif model_type == 'qnq':
-                    from predictors.QNQpredictor import manual_set_true_label_and_retrain as retrain_func
-                elif model_type == 'toot':
-                    from predictors.TOOTpredictor import manual_set_true_label_and_retrain as retrain_func
-                else:
-                    raise ValueError(f"Unsupported model type: {model_type}")
+                model_name = {spec['name'].lower(): spec['model'] for spec in PREDICTOR_SPECS}[model_type]
+                retraining_queue = get_retraining_queue()
+                job_id = retraining_queue.enqueue(model_name, full_spectrogram_path, true_label)
+                if getattr(settings, 'RETRAIN_IN_PROCESS', True):
+                    retraining_queue.start()
 
-                # Perform retraining
-                retrain_func(true_label, full_spectrogram_path)
-                
-                # Optional: Send Discord notification about model retraining
-                try:
-                    notification_message = (
-                        f"🔄 Model Retraining Completed\n"
-                        f"Model: {model_type.upper()}\n"
-                        f"True Label: {true_label}\n"
-                        f"Spectrogram: {spectrogram_path}"
-                    )
-                    send_discord_message(notification_message)
-                except Exception as discord_error:
-                    logger.warning(f"Failed to send Discord notification for model retraining: {discord_error}")
-                
                 return JsonResponse({
                     'status': 'success', 
-                    'message': f'{model_type.upper()} model retrained successfully',
+                    'message': f'{model_type.upper()} feedback queued for retraining',
+                    'job_id': job_id,
                     'details': {
                         'model_type': model_type,
                         'true_label': true_label,
-                        'spectrogram_path': full_spectrogram_path
+                        'spectrogram_path': full_spectrogram_path,
+                        'pending_labels': retraining_queue.pending_count(model_name)
                     }
-                })
-            
-            except ImportError as import_error:
-                logger.error(f"Import error for {model_type} retraining: {import_error}")
-                return JsonResponse({
-                    'status': 'error', 
-                    'message': f'Failed to import retraining module for {model_type}',
-                    'details': str(import_error)
-                }, status=500)
+                }, status=202)
             
-            except Exception as retraining_error:
-                logger.error(f"Retraining error: {str(retraining_error)}")
+            except Exception as queue_error:
+                logger.error(f"Retraining queue error: {str(queue_error)}")
                 return JsonResponse({
                     'status': 'error', 
-                    'message': 'Failed to retrain model',
-                    'details': str(retraining_error)
+                    'message': 'Failed to queue model retraining',
+                    'details': str(queue_error)
                 }, status=500)
 
         else:
@@ -1147,6 +1207,396 @@ def test_blynk_connection(request):
             'message': str(e)
         }, status=500)
 
+def model_status(request):
+    """
+    Report which predictor models this worker has loaded, with load time and memory use
+    """
+    return JsonResponse({
+        'status': 'success',
+        'registry': model_registry.status()
+    })
+
+@csrf_exempt
+def warm_models(request):
+    """
+    Load predictor models into this worker ahead of the first analysis
+    
+    Optional JSON payload: {"models": ["BNB", "QNQ", "TOOT"]}
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Only POST method is allowed'}, status=405)
+
+    try:
+        data = json.loads(request.body or b'{}')
+        names = data.get('models') or None
+
+        unknown = [name for name in (names or []) if name not in model_registry.registered_names()]
+        if unknown:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'Unknown models: {unknown}'
+            }, status=400)
+
+        return JsonResponse({
+            'status': 'success',
+            'registry': model_registry.warm(names)
+        })
+    except Exception as e:
+        logger.error(f"Error warming models: {e}")
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+@csrf_exempt
+def unload_models(request):
+    """
+    Release predictor models held by this worker
+    
+    Optional JSON payload: {"models": ["QNQ"]}; all loaded models by default
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Only POST method is allowed'}, status=405)
+
+    try:
+        data = json.loads(request.body or b'{}')
+        unloaded = model_registry.unload(data.get('models') or None)
+        return JsonResponse({
+            'status': 'success',
+            'unloaded': unloaded,
+            'registry': model_registry.status()
+        })
+    except Exception as e:
+        logger.error(f"Error unloading models: {e}")
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+def inference_metrics(request):
+    """
+    Report micro-batching, prediction cache and cascade stage statistics for this worker
+    """
+    cache = get_prediction_cache()
+    response = {
+        'status': 'success',
+        'enabled': getattr(settings, 'INFERENCE_MICRO_BATCHING', False),
+        'scheduler': get_inference_scheduler().metrics(),
+        'prediction_cache': cache.stats() if cache is not None else None,
+        'stages': stage_metrics()
+    }
+
+    # Include the shared model server's view when one is configured
+    if getattr(settings, 'MODEL_SERVER_ENABLED', False):
+        try:
+            response['model_server'] = get_model_server_client().status()
+        except Exception as e:
+            response['model_server'] = {'status': 'unavailable', 'error': str(e)}
+
+    return JsonResponse(response)
+
+# Audio formats a spectrogram can be rendered from, in lookup order
+RECORDING_EXTENSIONS = ('.wav', '.flac')
+
+def find_recording(recording_id):
+    """
+    Resolve a recording id (audio path under MEDIA_ROOT without extension) to a file
+
+    :return: Absolute audio path, or None if there is no such recording
+    """
+    media_root = os.path.realpath(settings.MEDIA_ROOT)
+    base_path = os.path.realpath(os.path.join(media_root, recording_id))
+    if not base_path.startswith(media_root + os.sep):
+        return None
+    for extension in RECORDING_EXTENSIONS:
+        if os.path.isfile(base_path + extension):
+            return base_path + extension
+    return None
+
+def recording_spectrogram_url(audio_path):
+    """
+    URL of the on-demand spectrogram of an audio file under MEDIA_ROOT
+    """
+    recording_id = os.path.splitext(os.path.relpath(audio_path, settings.MEDIA_ROOT))[0].replace(os.sep, '/')
+    return reverse('audio_analyzer:recording_spectrogram', kwargs={'recording_id': recording_id, 'image_format': 'png'})
+
+def stored_spectrogram_file(spectrogram_url):
+    """
+    Spectrogram PNG file for an on-demand spectrogram URL (see recording_spectrogram_url)
+
+    Recordings saved without SAVE_SPECTROGRAM_IMAGES only have a URL; the
+    image is rendered like record_and_generate_spectrograms renders it and
+    attached to the recording in the store, so retraining gets a file.
+
+    :return: Absolute PNG path, or None if the URL is not a stored recording's spectrogram
+    """
+    try:
+        match = resolve('/' + spectrogram_url.lstrip('/'))
+    except Resolver404:
+        return None
+    if match.url_name != 'recording_spectrogram':
+        return None
+    audio_path = find_recording(match.kwargs['recording_id'])
+    if audio_path is None:
+        return None
+
+    store = get_recording_store()
+    relative_audio_path = os.path.relpath(audio_path, store.root).replace(os.sep, '/')
+    record = store.find_by_audio(relative_audio_path)
+    if record is None:
+        return None
+    if not record['spectrogram_path'] or not os.path.exists(store.path(record['spectrogram_path'])):
+        samples, sample_rate = sf.read(audio_path, dtype='float32', always_2d=True)
+        analysis_samples, analysis_rate = decimate(
+            samples.mean(axis=1), sample_rate, getattr(settings, 'ANALYSIS_SAMPLE_RATE', 0)
+        )
+        rgb = render_spectrogram_rgb(compute_spectrogram_db(analysis_samples), analysis_rate, 'Spectrogram', figsize=(10, 4))
+        record = store.attach_spectrogram(record['id'], encode_image(rgb, 'PNG'))
+    return store.path(record['spectrogram_path'])
+
+def recording_spectrogram(request, recording_id, image_format):
+    """
+    Render a recording's spectrogram on demand, e.g.
+    GET /spectrogram/recordings/hive-1/2025-03-13/15/3f2a9c1e7b4d8a60.png?w=1000&h=400&fmin=0&fmax=4000&axes=1
+
+    Images are kept in the size-bounded disk cache (SPECTROGRAM_CACHE_DIR)
+    and served with an ETag and Last-Modified, so unchanged recordings are
+    answered with 304 Not Modified.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
+
+    audio_path = find_recording(recording_id)
+    if audio_path is None:
+        return JsonResponse({'status': 'error', 'message': f'Recording not found: {recording_id}'}, status=404)
+
+    try:
+        width = int(request.GET.get('w', 1000))
+        height = int(request.GET.get('h', 400))
+        fmin = float(request.GET['fmin']) if request.GET.get('fmin') else None
+        fmax = float(request.GET['fmax']) if request.GET.get('fmax') else None
+        axes = request.GET.get('axes', '1') not in ('0', 'false', 'False')
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': f'Invalid parameter: {e}'}, status=400)
+    if not (16 <= width <= 4096 and 16 <= height <= 4096):
+        return JsonResponse({'status': 'error', 'message': 'w and h must be between 16 and 4096'}, status=400)
+
+    params = {
+        'w': width, 'h': height, 'fmin': fmin, 'fmax': fmax, 'axes': axes,
+        'renderer': getattr(settings, 'SPECTROGRAM_RENDERER', 'fast'),
+        'analysis_sample_rate': getattr(settings, 'ANALYSIS_SAMPLE_RATE', 0)
+    }
+    cache = get_spectrogram_cache()
+    key = cache.make_key(audio_path, params)
+    etag = f'"{key}"'
+    last_modified = int(os.path.getmtime(audio_path))
+
+    # Answer conditional requests before touching the image
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    data = cache.get(key, image_format)
+    cache_status = 'hit'
+    if data is None:
+        cache_status = 'miss'
+        try:
+            data = render_audio_spectrogram(
+                audio_path, width, height, fmin, fmax, axes,
+                image_format='WEBP' if image_format == 'webp' else 'PNG'
+            )
+        except ValueError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        except Exception as e:
+            logger.error(f"Spectrogram rendering failed for {recording_id}: {e}")
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+        cache.put(key, image_format, data)
+
+    response = HttpResponse(data, content_type=f'image/{image_format}')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Browsers revalidate with the ETag; a recording written again under the same id gets a new one
+    response['Cache-Control'] = 'no-cache'
+    response['X-Spectrogram-Cache'] = cache_status
+    return response
+
+def spectrogram_tile_manifest(request, recording_id):
+    """
+    Describe a recording's spectrogram tile pyramid (levels, sizes, tile URL pattern)
+
+    A missing or outdated pyramid is built first: synchronously for recordings
+    up to SPECTROGRAM_TILES_SYNC_SECONDS long, otherwise in the background
+    while this returns 202 with "status": "building".
+    """
+    audio_path = find_recording(recording_id)
+    if audio_path is None:
+        return JsonResponse({'status': 'error', 'message': f'Recording not found: {recording_id}'}, status=404)
+
+    try:
+        manifest = load_manifest(pyramid_dir(recording_id))
+        stat = os.stat(audio_path)
+        if manifest is None or manifest.get('version') != f"{stat.st_size}-{stat.st_mtime_ns}":
+            duration = sf.info(audio_path).duration
+            if duration > getattr(settings, 'SPECTROGRAM_TILES_SYNC_SECONDS', 600):
+                start_tile_build(recording_id, audio_path)
+                return JsonResponse({'status': 'building', 'duration': duration}, status=202)
+            manifest = ensure_tile_pyramid(recording_id, audio_path)
+    except Exception as e:
+        logger.error(f"Could not build spectrogram tiles for {recording_id}: {e}")
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+    tile_url = reverse('audio_analyzer:spectrogram_tile', kwargs={
+        'recording_id': recording_id, 'level': 0, 'x': 0, 'y': 0
+    }).replace('/0/0_0.png', '/{level}/{x}_{y}.png')
+    return JsonResponse({
+        'status': 'success',
+        'recording_id': recording_id,
+        'tile_url': f"{tile_url}?v={manifest['version']}",
+        **manifest
+    })
+
+def spectrogram_tile(request, recording_id, level, x, y):
+    """
+    Serve one tile of a recording's spectrogram pyramid (built by the manifest endpoint)
+    """
+    if find_recording(recording_id) is None:
+        return JsonResponse({'status': 'error', 'message': f'Recording not found: {recording_id}'}, status=404)
+    output_dir = pyramid_dir(recording_id)
+    path = tile_path(output_dir, int(level), int(x), int(y))
+    manifest = load_manifest(output_dir)
+    if manifest is None or not os.path.isfile(path):
+        return JsonResponse({'status': 'error', 'message': 'Tile not found'}, status=404)
+
+    etag = f'"{manifest["version"]}-{level}-{x}-{y}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    response = FileResponse(open(path, 'rb'), content_type='image/png')
+    response['ETag'] = etag
+    # Tile URLs carry the pyramid version, so a tile never changes under its URL
+    response['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+def capture_status(request):
+    """
+    Report the continuous audio capture service of this worker (buffered seconds, overflows)
+    """
+    service = get_capture_service(start=False)
+    return JsonResponse({
+        'status': 'success',
+        'enabled': service is not None,
+        'capture': service.status() if service is not None else None
+    })
+
+def retrain_job_status(request, job_id):
+    """
+    Report the state of a queued retraining job (queued, training, done or failed)
+    """
+    job = get_retraining_queue().job_status(job_id)
+    if job is None:
+        return JsonResponse({'status': 'error', 'message': f'Unknown job: {job_id}'}, status=404)
+    return JsonResponse({'status': 'success', 'job': job})
+
+def _history_rows(request, queryset, by_model=False):
+    """
+    Filter a history queryset by the request's hive, model, start and end, and page it
+
+    :return: (rows, next_cursor)
+    :raises ValueError: If limit, start, end or cursor is invalid
+    """
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('Invalid limit: expected a positive integer')
+    if limit < 1:
+        raise ValueError('Invalid limit: expected a positive integer')
+    start = request.GET.get('start')
+    end = request.GET.get('end')
+    queryset = filter_history(
+        queryset,
+        hive=request.GET.get('hive'),
+        start=parse_time(start) if start else None,
+        end=parse_time(end) if end else None,
+        model=request.GET.get('model') if by_model else None
+    )
+    return history_page(queryset, request.GET.get('cursor'), min(limit, MAX_PAGE_SIZE))
+
+def _prediction_json(prediction):
+    return {
+        'id': prediction.id,
+        'recording': prediction.recording_id,
+        'hive': prediction.hive,
+        'recorded_at': prediction.recorded_at.isoformat(),
+        'model': prediction.model,
+        'predicted_class': prediction.predicted_class,
+        'label': prediction.label,
+        'confidence': prediction.confidence,
+        'skipped': prediction.skipped,
+        'window_start': prediction.window_start,
+        'window_end': prediction.window_end
+    }
+
+def prediction_history(request):
+    """
+    Stored predictions, newest first, e.g.
+    GET /history/predictions/?hive=hive-1&model=QNQ&start=2025-03-01T00:00:00Z&end=2025-03-08T00:00:00Z&limit=100
+
+    start (inclusive) and end (exclusive) are ISO 8601 or Unix seconds.
+    Pages are keyset-paginated: pass the response's next_cursor as cursor
+    to get the following page; it is null on the last page.
+    """
+    try:
+        rows, next_cursor = _history_rows(request, Prediction.objects.all(), by_model=True)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({
+        'status': 'success',
+        'results': [_prediction_json(row) for row in rows],
+        'next_cursor': next_cursor
+    })
+
+def recording_history(request):
+    """
+    Stored recordings with their predictions and spectral features, newest first, e.g.
+    GET /history/recordings/?hive=hive-1&start=1741564800&limit=50
+
+    Takes the same hive, start, end, limit and cursor parameters as
+    prediction_history.
+    """
+    try:
+        rows, next_cursor = _history_rows(
+            request, Recording.objects.select_related('features').prefetch_related(
+                Prefetch('predictions', queryset=Prediction.objects.order_by('id'))
+            )
+        )
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    results = []
+    for row in rows:
+        features = getattr(row, 'features', None)
+        recording_id = os.path.splitext(row.audio_path)[0] if row.audio_path else None
+        results.append({
+            'id': row.id,
+            'hive': row.hive,
+            'recorded_at': row.recorded_at.isoformat(),
+            'duration': row.duration,
+            'sample_rate': row.sample_rate,
+            'recording_id': recording_id,
+            'audio_url': f'{settings.MEDIA_URL}{row.audio_path}' if row.audio_path else None,
+            'spectrogram_url': (
+                f'{settings.MEDIA_URL}{row.spectrogram_path}' if row.spectrogram_path
+                else recording_spectrogram_url(os.path.join(settings.MEDIA_ROOT, row.audio_path)) if row.audio_path
+                else None
+            ),
+            'predictions': [_prediction_json(prediction) for prediction in row.predictions.all()],
+            'features': None if features is None else {
+                'spectral_centroid': features.spectral_centroid,
+                'spectral_bandwidth': features.spectral_bandwidth,
+                'spectral_rolloff': features.spectral_rolloff,
+                'dominant_frequency': features.dominant_frequency,
+                'mean_frequency': features.mean_frequency,
+                'rms': features.rms,
+                'band_energies': features.band_energies
+            }
+        })
+    return JsonResponse({'status': 'success', 'results': results, 'next_cursor': next_cursor})
+
 import json
 import logging
 from .blynk_utils import blynk_connection  # Import the global Blynk connection
@@ -1305,60 +1755,55 @@ def record_and_analyze_audio(request):
     """
     Record audio from the first available input device and analyze it.
     
-    Provides comprehensive error handling and device detection.
+    Provides comprehensive error handling and device detection. With
+    AUDIO_CAPTURE_ENABLED the clip comes from the continuous capture buffer.
     """
     try:
-        # Diagnose available audio devices
-        input_devices, device_details = diagnose_audio_devices()
-        
-        # Check if any input devices are available
-        if not input_devices:
-            error_message = "No audio input devices detected. Please connect a microphone or audio input device."
-            logger.error(error_message)
-            return JsonResponse({
-                'status': 'error', 
-                'message': error_message,
-                'diagnostic_info': {
-                    'total_devices': len(sd.query_devices()),
-                    'input_devices': device_details
-                }
-            }, status=400)
-        
-        # Use the first available input device (prioritizing USB)
-        device_index = input_devices[0]
-        logger.info(f"Using audio input device: {device_details[0]['name']} (Index: {device_index})")
-        
-        # Rest of the existing recording logic remains the same
-        duration = request.POST.get('duration', 5)  # Default 5 seconds
-        sample_rate = request.POST.get('sample_rate', 44100)  # Default 44.1 kHz
+        duration = float(request.POST.get('duration', 5))  # Default 5 seconds
+        sample_rate = int(request.POST.get('sample_rate', 44100))  # Default 44.1 kHz
+
+        # The continuous capture service already has its device open
+        capture_service = get_capture_service(start=False)
+        if capture_service is not None:
+            device_index = capture_service.device
+        else:
+            # Diagnose available audio devices
+            input_devices, device_details = diagnose_audio_devices()
+            
+            # Check if any input devices are available
+            if not input_devices:
+                error_message = "No audio input devices detected. Please connect a microphone or audio input device."
+                logger.error(error_message)
+                return JsonResponse({
+                    'status': 'error', 
+                    'message': error_message,
+                    'diagnostic_info': {
+                        'total_devices': len(sd.query_devices()),
+                        'input_devices': device_details
+                    }
+                }, status=400)
+            
+            # Use the first available input device (prioritizing USB)
+            device_index = input_devices[0]
+            logger.info(f"Using audio input device: {device_details[0]['name']} (Index: {device_index})")
         
         # Record audio from specified device
-        recording = sd.rec(
-            int(duration * sample_rate), 
-            samplerate=sample_rate, 
-            channels=1, 
-            dtype='float64',
-            device=device_index
-        )
-        sd.wait()
-        
-        # Save recording
-        audio_filename = f'bee_recording_{""}.wav'
-        audio_path = os.path.join(settings.MEDIA_ROOT, audio_filename)
-        
-        # Ensure media directory exists
-        os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+        recording = capture_audio(duration, sample_rate, device_index)
         
-        # Write audio file using scipy
-        wavfile.write(audio_path, sample_rate, (recording * 32767).astype(np.int16))
+        # Save recording to the recording store
+        store = get_recording_store()
+        record = store.add(recording, sample_rate)
+        audio_path = store.path(record['audio_path'])
+        audio_filename = os.path.relpath(audio_path, settings.MEDIA_ROOT).replace(os.sep, '/')
         
-        # Perform frequency analysis
-        frequency_results = analyze_audio_frequency(audio_path, sample_rate)
+        # Perform frequency analysis on the recording in memory
+        frequency_results = analyze_audio_frequency(audio_path, sample_rate, samples=recording)
         
         return JsonResponse({
             'status': 'success', 
             'message': 'Audio recorded and analyzed successfully',
             'filename': audio_filename,
+            'recording': record['id'],
             'device': device_index,
             'frequency_analysis': frequency_results
         })
@@ -1370,43 +1815,39 @@ def record_and_analyze_audio(request):
             'message': str(e)
         }, status=500)
 
-def analyze_audio_frequency(audio_path, sample_rate):
+def analyze_audio_frequency(audio_path, sample_rate, samples=None):
     """
     Perform frequency analysis on the recorded audio
     
+    All statistics come from a single STFT (see audio_features).
+    
     :param audio_path: Path to the audio file
     :param sample_rate: Sampling rate of the audio
+    :param samples: The recording already in memory; the file is not read again when given
     :return: Dictionary of frequency analysis results
     """
     try:
-        # Load audio file
-        y, sr = librosa.load(audio_path)
-        
-        # Compute spectral features
-        spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-        spectral_bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr)[0]
-        spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
-        
-        # Compute dominant frequency
-        fft = np.fft.fft(y)
-        frequencies = np.fft.fftfreq(len(y), 1/sr)
-        
-        # Filter out low-frequency noise (below 20 Hz)
-        MIN_FREQUENCY = 20
-        mask = np.abs(frequencies) >= MIN_FREQUENCY
-        filtered_freqs = frequencies[mask]
-        filtered_fft = np.abs(fft[mask])
+        # Load audio file (decimated to ANALYSIS_SAMPLE_RATE when set)
+        analysis_sample_rate = getattr(settings, 'ANALYSIS_SAMPLE_RATE', 0)
+        if samples is not None:
+            y, sr = decimate(np.asarray(samples, dtype=np.float32).ravel(), sample_rate, analysis_sample_rate)
+        else:
+            y, sr = load_analysis_audio(audio_path, analysis_sample_rate)
         
-        # Compute frequency range
-        frequency_range = (np.min(frequencies[frequencies > 0]), np.max(frequencies))
+        # Compute every spectral feature from one STFT
+        features = compute_spectral_features(y, sr)
+        frequency_range = features['frequency_range']
         
         # Prepare frequency data for Google Sheets
         frequency_data = {
-            'dominant_frequency': round(np.max(filtered_freqs), 2),
+            'dominant_frequency': round(features['dominant_frequency'], 2),
             'frequency_range': f"{round(frequency_range[0], 2)} - {round(frequency_range[1], 2)}",
-            'spectral_centroid': round(np.mean(spectral_centroid), 2),
-            'spectral_bandwidth': round(np.mean(spectral_bandwidth), 2),
-            'spectral_rolloff': round(np.mean(spectral_rolloff), 2)
+            'spectral_centroid': round(features['spectral_centroid'], 2),
+            'spectral_bandwidth': round(features['spectral_bandwidth'], 2),
+            'spectral_rolloff': round(features['spectral_rolloff'], 2),
+            'mean_frequency': round(features['mean_frequency'], 2),
+            'band_energies': {band: round(value, 4) for band, value in features['band_energies'].items()},
+            'rms': round(features['rms'], 5)
         }
         
         # Save frequency data to Google Sheets
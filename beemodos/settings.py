@@ -105,6 +105,108 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Machine Learning Model Path
 ML_MODEL_PATH = BASE_DIR / 'ml_models' / 'bee_behavior_model.keras'
 
+# Predictor inference backend: 'keras', 'tflite' or 'tflite_int8' (see 'manage.py export_tflite')
+PREDICTOR_BACKEND = os.getenv('PREDICTOR_BACKEND', 'keras')
+
+# Serve BNB, QNQ and TOOT from the fused multi-head model (see 'manage.py build_fused_model')
+PREDICTOR_FUSED = os.getenv('PREDICTOR_FUSED', 'False') == 'True'
+
+# Inference micro-batching: concurrent requests in one worker share model calls
+INFERENCE_MICRO_BATCHING = os.getenv('INFERENCE_MICRO_BATCHING', 'False') == 'True'
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv('INFERENCE_MAX_BATCH_SIZE', '8'))
+INFERENCE_MAX_WAIT_MS = float(os.getenv('INFERENCE_MAX_WAIT_MS', '20'))
+INFERENCE_TIMEOUT_SECONDS = 30
+# Largest number of spectrograms passed to a model in one call
+INFERENCE_MODEL_BATCH_SIZE = int(os.getenv('INFERENCE_MODEL_BATCH_SIZE', '64'))
+
+# Shared model server: one process owns the models for all gunicorn workers
+MODEL_SERVER_ENABLED = os.getenv('MODEL_SERVER_ENABLED', 'False') == 'True'
+MODEL_SERVER_SOCKET = os.getenv('MODEL_SERVER_SOCKET', '/tmp/beemodos_model_server.sock')
+MODEL_SERVER_TIMEOUT_SECONDS = 30
+
+# How often each process checks for newly published model versions (0 disables hot reload)
+MODEL_RELOAD_INTERVAL_SECONDS = float(os.getenv('MODEL_RELOAD_INTERVAL_SECONDS', '10'))
+
+# A model that failed to load is retried after this long, or as soon as its file changes
+MODEL_LOAD_RETRY_SECONDS = float(os.getenv('MODEL_LOAD_RETRY_SECONDS', '30'))
+
+# Continuous audio capture: keep the input device open and buffer the last
+# AUDIO_CAPTURE_BUFFER_SECONDS so recordings are snapshots instead of sd.rec calls
+AUDIO_CAPTURE_ENABLED = os.getenv('AUDIO_CAPTURE_ENABLED', 'False') == 'True'
+AUDIO_CAPTURE_DEVICE = int(os.getenv('AUDIO_CAPTURE_DEVICE')) if os.getenv('AUDIO_CAPTURE_DEVICE') else None
+AUDIO_CAPTURE_SAMPLE_RATE = int(os.getenv('AUDIO_CAPTURE_SAMPLE_RATE', '44100'))
+AUDIO_CAPTURE_CHANNELS = 1
+AUDIO_CAPTURE_BUFFER_SECONDS = float(os.getenv('AUDIO_CAPTURE_BUFFER_SECONDS', '300'))
+# Memory-mapped buffer file written by 'manage.py run_capture_service' and read by
+# every worker and the hourly command (empty: each process opens the device itself)
+AUDIO_CAPTURE_SHARED_PATH = os.getenv('AUDIO_CAPTURE_SHARED_PATH', '')
+
+# One USB microphone per hive: "hive-1:2,hive-2:3" maps hive ids to input device indexes
+HIVE_DEVICES = {
+    hive.split(':')[0].strip(): int(hive.split(':')[1])
+    for hive in os.getenv('HIVE_DEVICES', '').split(',') if ':' in hive
+}
+
+# Sample rate audio is decimated to before the STFT, features and spectrograms
+# (e.g. 8000 keeps everything below 4 kHz; 0 analyses at the capture rate).
+# The models were trained on full-band spectrograms: retrain them on
+# decimated spectrograms before enabling this for predictions.
+ANALYSIS_SAMPLE_RATE = int(os.getenv('ANALYSIS_SAMPLE_RATE', '0'))
+
+# Sliding-window analysis of long recordings (run_hourly_analysis): windows of
+# ANALYSIS_WINDOW_SECONDS starting every ANALYSIS_WINDOW_HOP_SECONDS (0 disables)
+ANALYSIS_WINDOW_SECONDS = float(os.getenv('ANALYSIS_WINDOW_SECONDS', '10'))
+ANALYSIS_WINDOW_HOP_SECONDS = float(os.getenv('ANALYSIS_WINDOW_HOP_SECONDS', '5'))
+
+# Spectrogram drawing: 'fast' maps dB values through a colormap lookup table onto
+# a cached matplotlib overlay (axes, title, colorbar); 'matplotlib' draws every
+# figure with librosa.display.specshow
+SPECTROGRAM_RENDERER = os.getenv('SPECTROGRAM_RENDERER', 'fast')
+
+# Spectrogram images: the multi-record endpoint writes a PNG per capture unless
+# SAVE_SPECTROGRAM_IMAGES is False; /spectrogram/<recording>.png renders any
+# recording on demand into a disk cache pruned to SPECTROGRAM_CACHE_MAX_BYTES
+SAVE_SPECTROGRAM_IMAGES = os.getenv('SAVE_SPECTROGRAM_IMAGES', 'True') == 'True'
+SPECTROGRAM_CACHE_DIR = os.getenv('SPECTROGRAM_CACHE_DIR', str(MEDIA_ROOT / 'spectrogram_cache'))
+SPECTROGRAM_CACHE_MAX_BYTES = int(os.getenv('SPECTROGRAM_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+# Recording store: captures are written to RECORDING_STORE_DIR/<hive>/<date>/<hour>/
+# under content-hash names and indexed in the RECORDING_INDEX_PATH SQLite file
+RECORDING_STORE_DIR = os.getenv('RECORDING_STORE_DIR', str(MEDIA_ROOT / 'recordings'))
+RECORDING_INDEX_PATH = os.getenv('RECORDING_INDEX_PATH', str(BASE_DIR / 'recordings.sqlite3'))
+RECORDING_DEFAULT_HIVE = os.getenv('RECORDING_DEFAULT_HIVE', 'default')
+
+# Analysis history: every analysis is stored as Recording, Prediction and
+# FeatureVector rows in DATABASES, served by /history/recordings/ and /history/predictions/
+ANALYSIS_HISTORY_ENABLED = os.getenv('ANALYSIS_HISTORY_ENABLED', 'True') == 'True'
+
+# Zoomable tile pyramids (/spectrogram-tiles/<recording>/manifest.json); recordings
+# longer than SPECTROGRAM_TILES_SYNC_SECONDS are tiled in the background
+SPECTROGRAM_TILE_DIR = os.getenv('SPECTROGRAM_TILE_DIR', str(MEDIA_ROOT / 'spectrogram_tiles'))
+SPECTROGRAM_TILES_SYNC_SECONDS = float(os.getenv('SPECTROGRAM_TILES_SYNC_SECONDS', '600'))
+
+# Inference cascade: skip QNQ and TOOT for spectrograms where BNB predicts
+# "No Bees Detected" with at least INFERENCE_CASCADE_SKIP_CONFIDENCE
+INFERENCE_CASCADE = os.getenv('INFERENCE_CASCADE', 'False') == 'True'
+INFERENCE_CASCADE_SKIP_CONFIDENCE = float(os.getenv('INFERENCE_CASCADE_SKIP_CONFIDENCE', '0.9'))
+
+# Prediction cache keyed by spectrogram content and model version
+PREDICTION_CACHE_ENABLED = os.getenv('PREDICTION_CACHE_ENABLED', 'True') == 'True'
+PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv('PREDICTION_CACHE_MAX_ENTRIES', '1024'))
+# Optional SQLite file to keep cached predictions across restarts (empty: memory only)
+PREDICTION_CACHE_PATH = os.getenv('PREDICTION_CACHE_PATH', '')
+
+# Feedback retraining: labels go to a replay buffer and are trained on in the background
+RETRAIN_BUFFER_PATH = BASE_DIR / 'training_models' / 'replay_buffer.sqlite3'
+# Run the trainer thread in the web workers (set False when using 'manage.py run_retraining_worker')
+RETRAIN_IN_PROCESS = os.getenv('RETRAIN_IN_PROCESS', 'True') == 'True'
+RETRAIN_MIN_SAMPLES = int(os.getenv('RETRAIN_MIN_SAMPLES', '8'))
+RETRAIN_INTERVAL_SECONDS = int(os.getenv('RETRAIN_INTERVAL_SECONDS', '300'))
+RETRAIN_REPLAY_SAMPLES = 32
+RETRAIN_EPOCHS = 1
+RETRAIN_BATCH_SIZE = 16
+RETRAIN_LEARNING_RATE = 0.001
+
 # Logging Configuration
 LOGGING = {
     'version': 1,
@@ -470,6 +470,12 @@ document.addEventListener('DOMContentLoaded', function() {
                     // Ensure the path starts with a forward slash
                     imgElement.src = spectrogramPath.startsWith('/') ? spectrogramPath : `/${spectrogramPath}`;
 
+                    // Remember the recording so the enlarged view can open the zoomable tile viewer
+                    const recording = (data.recordings && data.recordings[predictor] || [])[0];
+                    if (recording && recording.recording_id) {
+                        imgElement.dataset.recordingId = recording.recording_id;
+                    }
+
                     // Update analysis results if available
                     if (analysisContainer && data.analysis_results) {
                         console.log('Full Analysis Results:', JSON.stringify(data.analysis_results, null, 2));
@@ -641,8 +647,8 @@ document.addEventListener('DOMContentLoaded', function() {
                 console.groupEnd();
 
                 if (data.status === 'success') {
-                    console.log(`${modelType.toUpperCase()} model retrained successfully`);
-                    alert(`${modelType.toUpperCase()} model retrained successfully`);
+                    console.log(`${modelType.toUpperCase()} retraining job queued:`, data.job_id);
+                    alert(data.message);
                 } else {
                     console.error(`Model retraining failed: ${data.message}`);
                     // Display details if available
@@ -1078,17 +1084,235 @@ document.addEventListener('DOMContentLoaded', function() {
         return String(value);
     }
 
+    // Zoomable spectrogram viewer: draws only the visible tiles of a recording's
+    // tile pyramid (see /spectrogram-tiles/<recording>/manifest.json)
+    function createSpectrogramTileViewer(canvas, infoElement) {
+        const context = canvas.getContext('2d');
+        const tileCache = new Map();
+        const maxCachedTiles = 256;
+        let manifest = null;
+        let secondsPerPixel = 0;
+        let startSeconds = 0;
+        let drag = null;
+        let drawScheduled = false;
+
+        function formatSeconds(seconds) {
+            const minutes = Math.floor(seconds / 60);
+            return `${minutes}:${(seconds - minutes * 60).toFixed(1).padStart(4, '0')}`;
+        }
+
+        function scheduleDraw() {
+            if (!drawScheduled) {
+                drawScheduled = true;
+                requestAnimationFrame(draw);
+            }
+        }
+
+        // Tiles are fetched on first use and kept in a small LRU of images
+        function tileImage(level, x, y) {
+            const url = manifest.tile_url.replace('{level}', level).replace('{x}', x).replace('{y}', y);
+            let image = tileCache.get(url);
+            if (image) {
+                tileCache.delete(url);
+            } else {
+                image = new Image();
+                image.onload = scheduleDraw;
+                image.src = url;
+            }
+            tileCache.set(url, image);
+            if (tileCache.size > maxCachedTiles) {
+                tileCache.delete(tileCache.keys().next().value);
+            }
+            return image;
+        }
+
+        function clampView() {
+            const maxSecondsPerPixel = manifest.duration / canvas.width;
+            const minSecondsPerPixel = manifest.levels[0].seconds_per_pixel / 4;
+            secondsPerPixel = Math.min(Math.max(secondsPerPixel, minSecondsPerPixel), maxSecondsPerPixel);
+            startSeconds = Math.min(Math.max(startSeconds, 0), Math.max(0, manifest.duration - canvas.width * secondsPerPixel));
+        }
+
+        // Draw the tiles of one level that overlap the visible time range
+        function drawLevel(level) {
+            const tileSize = manifest.tile_size;
+            const scale = level.seconds_per_pixel / secondsPerPixel;
+            const firstPixel = startSeconds / level.seconds_per_pixel;
+            const lastPixel = firstPixel + canvas.width / scale;
+            const yScale = canvas.height / level.height;
+            const firstColumn = Math.max(0, Math.floor(firstPixel / tileSize));
+            const lastColumn = Math.min(level.columns - 1, Math.floor(lastPixel / tileSize));
+            for (let x = firstColumn; x <= lastColumn; x++) {
+                for (let y = 0; y < level.rows; y++) {
+                    const image = tileImage(level.level, x, y);
+                    if (image.complete && image.naturalWidth) {
+                        context.drawImage(
+                            image,
+                            (x * tileSize - firstPixel) * scale,
+                            y * tileSize * yScale,
+                            image.naturalWidth * scale,
+                            image.naturalHeight * yScale
+                        );
+                    }
+                }
+            }
+        }
+
+        function draw() {
+            drawScheduled = false;
+            if (!manifest) {
+                return;
+            }
+            const ratio = window.devicePixelRatio || 1;
+            const width = Math.round(canvas.clientWidth * ratio);
+            const height = Math.round(canvas.clientHeight * ratio);
+            if (!width || !height) {
+                return;
+            }
+            if (canvas.width !== width || canvas.height !== height) {
+                canvas.width = width;
+                canvas.height = height;
+            }
+            if (!secondsPerPixel) {
+                secondsPerPixel = manifest.duration / canvas.width;
+            }
+            clampView();
+
+            // Coarsest level first as a backdrop, then the finest level that is
+            // not sharper than the screen, so nothing finer than needed is fetched
+            context.imageSmoothingEnabled = false;
+            context.clearRect(0, 0, canvas.width, canvas.height);
+            const levels = manifest.levels;
+            let level = levels[0];
+            levels.forEach(candidate => {
+                if (candidate.seconds_per_pixel <= secondsPerPixel) {
+                    level = candidate;
+                }
+            });
+            drawLevel(levels[levels.length - 1]);
+            if (level !== levels[levels.length - 1]) {
+                drawLevel(level);
+            }
+
+            const endSeconds = Math.min(manifest.duration, startSeconds + canvas.width * secondsPerPixel);
+            infoElement.textContent = `${formatSeconds(startSeconds)} - ${formatSeconds(endSeconds)} of ` +
+                `${formatSeconds(manifest.duration)}, 0 - ${Math.round(manifest.max_frequency)} Hz ` +
+                `(level ${level.level}). Scroll to zoom, drag to pan.`;
+        }
+
+        canvas.addEventListener('wheel', event => {
+            if (!manifest) {
+                return;
+            }
+            event.preventDefault();
+            const ratio = window.devicePixelRatio || 1;
+            const pointer = event.offsetX * ratio;
+            const pointerSeconds = startSeconds + pointer * secondsPerPixel;
+            secondsPerPixel *= event.deltaY > 0 ? 1.25 : 0.8;
+            clampView();
+            startSeconds = pointerSeconds - pointer * secondsPerPixel;
+            scheduleDraw();
+        }, { passive: false });
+
+        canvas.addEventListener('mousedown', event => {
+            drag = { x: event.clientX, startSeconds: startSeconds };
+            canvas.style.cursor = 'grabbing';
+        });
+
+        window.addEventListener('mousemove', event => {
+            if (drag && manifest) {
+                const ratio = window.devicePixelRatio || 1;
+                startSeconds = drag.startSeconds - (event.clientX - drag.x) * ratio * secondsPerPixel;
+                scheduleDraw();
+            }
+        });
+
+        window.addEventListener('mouseup', () => {
+            drag = null;
+            canvas.style.cursor = 'grab';
+        });
+
+        // Redraw when the canvas gets its size, e.g. once the modal is shown
+        if (window.ResizeObserver) {
+            new ResizeObserver(scheduleDraw).observe(canvas);
+        }
+
+        function open(recordingId) {
+            close();
+            infoElement.textContent = 'Loading spectrogram tiles...';
+            const manifestUrl = `/spectrogram-tiles/${recordingId}/manifest.json`;
+
+            function load() {
+                fetch(manifestUrl)
+                    .then(response => {
+                        if (response.status === 202) {
+                            // Long recordings are tiled in the background
+                            infoElement.textContent = 'Building spectrogram tiles...';
+                            setTimeout(load, 2000);
+                            return null;
+                        }
+                        if (!response.ok) {
+                            throw new Error(`HTTP error! status: ${response.status}`);
+                        }
+                        return response.json();
+                    })
+                    .then(data => {
+                        if (data) {
+                            manifest = data;
+                            scheduleDraw();
+                        }
+                    })
+                    .catch(error => {
+                        console.error('Error loading spectrogram tiles:', error);
+                        infoElement.textContent = `Could not load spectrogram tiles: ${error.message}`;
+                    });
+            }
+            load();
+        }
+
+        function close() {
+            manifest = null;
+            secondsPerPixel = 0;
+            startSeconds = 0;
+            tileCache.clear();
+        }
+
+        return { open: open, close: close };
+    }
+
     // Add spectrogram zoom functionality
     function setupSpectrogramZoom() {
         const predictors = ['BNQ', 'QNQ', 'TOOT'];
         const enlargedSpectrogramImage = document.getElementById('enlargedSpectrogramImage');
+        const tileViewerElement = document.getElementById('spectrogramTileViewer');
+        const tileViewer = tileViewerElement ? createSpectrogramTileViewer(
+            document.getElementById('spectrogramTileCanvas'),
+            document.getElementById('spectrogramTileInfo')
+        ) : null;
+
+        // Show a recording in the zoomable tile viewer instead of the fixed image
+        function openTileViewer(recordingId) {
+            enlargedSpectrogramImage.style.display = 'none';
+            tileViewerElement.style.display = 'block';
+            tileViewer.open(recordingId);
+            $('#spectrogramModal').modal('show');
+        }
         
         predictors.forEach(predictor => {
             const spectrogramImage = document.getElementById(`spectrogramImage-${predictor}-1`);
             
             if (spectrogramImage) {
                 spectrogramImage.addEventListener('click', function() {
+                    if (tileViewer && this.dataset.recordingId) {
+                        openTileViewer(this.dataset.recordingId);
+                        return;
+                    }
+
                     // Set the enlarged image source to the current spectrogram
+                    enlargedSpectrogramImage.style.display = '';
+                    if (tileViewerElement) {
+                        tileViewerElement.style.display = 'none';
+                    }
                     enlargedSpectrogramImage.src = this.src;
                     
                     // Use Bootstrap's modal to show the enlarged image
@@ -1096,6 +1320,17 @@ document.addEventListener('DOMContentLoaded', function() {
                 });
             }
         });
+
+        if (tileViewer) {
+            document.getElementById('spectrogramModal').addEventListener('hidden.bs.modal', tileViewer.close);
+
+            // Viewer mode: /?recording=<recording id> opens that recording directly,
+            // e.g. /?recording=recordings/hive-1/2025-03-13/15/3f2a9c1e7b4d8a60
+            const requestedRecording = new URLSearchParams(window.location.search).get('recording');
+            if (requestedRecording) {
+                openTileViewer(requestedRecording);
+            }
+        }
     }
 
     // Persistent Model Retraining Section
@@ -0,0 +1,117 @@
+import os
+import numpy as np
+import logging
+import sys
+import traceback
+from audio_analyzer.model_registry import model_registry
+from audio_analyzer.model_versions import read_current
+from audio_analyzer.spectrogram_utils import load_spectrogram_batch
+
+# Add project root to path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, project_root)
+
+# Configure logging
+logger = logging.getLogger("FUSEDpredictor")
+
+# Suppress TensorFlow and absl logs
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+# Model path (built by 'manage.py build_fused_model'; there is no placeholder)
+model_path = os.path.join(project_root, 'training_models', 'FUSED_model.keras')
+
+# The fused model has one shared backbone and a head per task. Its single
+# output is the heads' outputs side by side; the published manifest records
+# which columns belong to which head, e.g. {"BNB": [0, 2], "QNQ": [2, 4], ...}
+MODEL_NAME = 'FUSED'
+model_registry.register(MODEL_NAME, model_path)
+
+# Class names per head, as in the single-task predictors
+CLASS_NAMES = {
+    'BNB': ['No Bees Detected', 'Bees Detected'],
+    'QNQ': ['No Queen Detected', 'Queen Detected'],
+    'TOOT': ['No Tooting', 'Tooting']
+}
+
+def is_available():
+    """
+    Return True once a fused model has been built and published
+    """
+    return read_current(model_path) is not None
+
+def head_layout():
+    """
+    Return {head name: (start column, end column)} for the current version
+    """
+    manifest = read_current(model_path)
+    if manifest is None or 'heads' not in manifest:
+        raise RuntimeError(f"No published fused model at {model_path}. Run 'manage.py build_fused_model'.")
+    return {head: tuple(columns) for head, columns in manifest['heads'].items()}
+
+# Function to get the shared, lazily loaded model (Keras or TFLite per settings.PREDICTOR_BACKEND)
+def get_model():
+    return model_registry.get(MODEL_NAME)
+
+def predict_heads(batch):
+    """
+    Run one forward pass and split the output per head
+
+    :param batch: float32 array of shape (N, 224, 224, 3)
+    :return: Dictionary of head name -> (N, units) array
+    """
+    model = get_model()
+    if model is None:
+        raise RuntimeError("No fused model available for prediction")
+    output = np.asarray(model.predict_on_batch(batch))
+    return {head: output[:, start:end] for head, (start, end) in head_layout().items()}
+
+def interpret_head(pred_row):
+    # Robust confidence calculation, as in the single-task predictors
+    pred_row = np.ravel(pred_row)
+    if pred_row.size > 1:
+        # Multi-class prediction (softmax output)
+        confidence = float(np.max(pred_row))
+        predicted_class = int(np.argmax(pred_row))
+    else:
+        # Binary classification
+        confidence = float(pred_row[0])
+        predicted_class = 1 if confidence > 0.5 else 0
+
+    # Ensure confidence is between 0 and 1
+    confidence = max(0.0, min(1.0, confidence))
+
+    # Placeholder metrics
+    f1 = confidence
+    precision = confidence
+    return predicted_class, confidence, f1, precision
+
+# Function to predict every head for a specific image
+def predict_and_display(img_path, output_box=None, img_array=None):
+    """
+    Predict all tasks for a spectrogram image with a single forward pass.
+
+    If img_array (a preprocessed (1, 224, 224, 3) batch) is given it is used
+    directly and img_path is only used for logging.
+
+    :return: Dictionary of head name ('BNB', 'QNQ', 'TOOT') ->
+        (predicted_class, confidence, f1, precision)
+    """
+    try:
+        # Load and preprocess the specific image unless it was built in memory
+        if img_array is None:
+            img_array = load_spectrogram_batch([img_path])
+        source_name = os.path.basename(img_path) if img_path else 'in-memory spectrogram'
+
+        results = {}
+        for head, preds in predict_heads(img_array).items():
+            results[head] = interpret_head(preds[0])
+            predicted_class, confidence = results[head][0], results[head][1]
+            logger.info(f'{head} File: {source_name}, '
+                        f'Predicted: {CLASS_NAMES.get(head, [0, 1])[predicted_class]}, '
+                        f'Confidence: {confidence * 100:.2f}%')
+        return results
+
+    except Exception as e:
+        logger.error(f"Fused prediction error for {img_path}: {e}")
+        logger.error(traceback.format_exc())
+        return {head: (0, 0.0, 0.0, 0.0) for head in CLASS_NAMES}
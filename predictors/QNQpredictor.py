@@ -2,11 +2,10 @@ import os
 import numpy as np
 import logging
 import sys
-from tensorflow.keras.preprocessing import image
-from tensorflow.keras.models import load_model
-from tensorflow.keras.optimizers import Adam
 from sklearn.metrics import f1_score, precision_score
 from audio_analyzer.sheets_utils import save_prediction_to_sheets
+from audio_analyzer.model_registry import model_registry
+from audio_analyzer.model_versions import publish_model_version
 
 # Add project root to path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -23,37 +22,34 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 base_dir = os.path.dirname(os.path.abspath(__file__))
 model_path = os.path.join(project_root, 'training_models', 'QNQ_model.keras')
 
-# Check if model exists, if not create a placeholder
-try:
-    if not os.path.exists(model_path):
-        logger.warning(f"Model file not found at {model_path}. Creating a placeholder model.")
-        
-        # Create a simple placeholder model
-        from tensorflow.keras.models import Sequential
-        from tensorflow.keras.layers import Dense, Flatten, Conv2D, MaxPooling2D
-        
-        model = Sequential([
-            Conv2D(32, (3, 3), activation='relu', input_shape=(224, 224, 3)),
-            MaxPooling2D((2, 2)),
-            Flatten(),
-            Dense(64, activation='relu'),
-            Dense(2, activation='softmax')  # Binary classification
-        ])
-        
-        model.compile(
-            optimizer=Adam(learning_rate=0.01), 
-            loss='categorical_crossentropy', 
-            metrics=['accuracy']
-        )
-        
-        # Save the placeholder model
-        model.save(model_path)
-        logger.info(f"Placeholder model saved to {model_path}")
-    else:
-        model = load_model(model_path)
-except Exception as e:
-    logger.error(f"Error creating/loading model: {e}")
-    model = None
+# Build a placeholder model when no trained model file exists yet
+def build_placeholder_model():
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Dense, Flatten, Conv2D, MaxPooling2D
+    from tensorflow.keras.optimizers import Adam
+
+    model = Sequential([
+        Conv2D(32, (3, 3), activation='relu', input_shape=(224, 224, 3)),
+        MaxPooling2D((2, 2)),
+        Flatten(),
+        Dense(64, activation='relu'),
+        Dense(2, activation='softmax')  # Binary classification
+    ])
+    
+    model.compile(
+        optimizer=Adam(learning_rate=0.01), 
+        loss='categorical_crossentropy', 
+        metrics=['accuracy']
+    )
+    return model
+
+# Register the model lazily; it is only loaded the first time get_model() is called
+MODEL_NAME = 'QNQ'
+model_registry.register(MODEL_NAME, model_path, build_placeholder_model)
+
+# Function to get the shared, lazily loaded Keras model (used for retraining)
+def get_model():
+    return model_registry.get(MODEL_NAME, backend='keras')
 
 # Function to load and preprocess images
 def load_and_preprocess_image(img_path):
@@ -63,6 +59,7 @@ def load_and_preprocess_image(img_path):
     if not os.path.exists(img_path):
         logger.error(f"Image file does not exist: {img_path}")
         raise FileNotFoundError(f"Image file does not exist: {img_path}")
+    from tensorflow.keras.preprocessing import image
     img = image.load_img(img_path, target_size=(224, 224))  # Adjust size as per your model's input
     img_array = image.img_to_array(img)
     img_array = np.expand_dims(img_array, axis=0)  # Add batch dimension
@@ -70,18 +67,27 @@ def load_and_preprocess_image(img_path):
     return img_array
 
 # Function to predict and display results for a specific image
-def QNQpredictor(img_path, output_box=None):
+def QNQpredictor(img_path, output_box=None, img_array=None):
+    """
+    Predict the class of a spectrogram image.
+
+    If img_array (a preprocessed (1, 224, 224, 3) batch) is given it is used
+    directly and img_path is only used for logging.
+    """
     # Define class names
     class_names = ['No Queen Detected', 'Queen Detected']
 
     # Check if model is available
+    model = get_model()
     if model is None:
         logger.error("No model available for prediction")
         return 0, 0.0, 0.0, 0.0
 
     try:
-        # Load and preprocess the specific image
-        img_array = load_and_preprocess_image(img_path)
+        # Load and preprocess the specific image unless it was built in memory
+        if img_array is None:
+            img_array = load_and_preprocess_image(img_path)
+        source_name = os.path.basename(img_path) if img_path else 'in-memory spectrogram'
 
         # Predict the class of the image
         pred = model.predict(img_array)
@@ -100,14 +106,14 @@ def QNQpredictor(img_path, output_box=None):
         confidence = max(0.0, min(1.0, confidence))
 
         # Logging
-        logger.info(f'File: {os.path.basename(img_path)}, '
+        logger.info(f'File: {source_name}, '
                     f'Predicted: {class_names[predicted_class]}, '
                     f'Confidence: {confidence * 100:.2f}%')
 
         # Save prediction to Google Sheets
         prediction_data = {
             'model': 'QNQ',
-            'filename': os.path.basename(img_path),
+            'filename': source_name,
             'prediction': class_names[predicted_class],
             'confidence': float(confidence)
         }
@@ -135,17 +141,20 @@ def collect_new_data_and_labels(true_label, img_path):
 
 # Function to retrain the model incrementally
 def retrain_model(model, new_data, new_labels):
+    from tensorflow.keras.optimizers import Adam
+
     logger.info("Starting retraining of QNQ model...")
     model.compile(optimizer=Adam(learning_rate=0.01), loss='categorical_crossentropy', metrics=['accuracy'])
     model.fit(new_data, new_labels, epochs=1, verbose=0)
-    model.save(model_path)  # Save the updated model
+    manifest = publish_model_version(model_path, model=model, source='manual retraining')  # Save the updated model as a new version
+    model_registry.mark_updated(MODEL_NAME, manifest=manifest)  # Invalidates cached predictions
     logger.info(f"QNQ model retrained and saved to {model_path}")
 
 # Function to manually set true label and retrain if incorrect
 def manual_set_true_label_and_retrain(true_label, img_path):
     logger.info(f"Manual setting of true label: {true_label} for image: {img_path}")
     new_data, new_labels = collect_new_data_and_labels(true_label, img_path)
-    retrain_model(model, new_data, new_labels)
+    retrain_model(get_model(), new_data, new_labels)
     predicted_class, confidence, f1, precision = QNQpredictor(img_path, output_box=None)
     
     # Save results to Google Sheets (if available)